@@ -27,6 +27,10 @@ import config as config_
 import dnf.dnf_config as dnf
 from dnf.stronger import skill_util as skill_util
 from dnf.abyss.det_result import DetResult
+from dnf.detection import DetAnalyser, boxes_to_numpy, draw_boxes
+from dnf.inference import FastPredictor, warmup
+from dnf.inference_worker import InferenceWorker
+from dnf.onnx_backend import OnnxDetector, load_detector, use_onnx_backend
 from dnf.stronger.method import (
     detect_try_again_button,
     find_densest_monster_cluster,
@@ -51,11 +55,12 @@ from dnf.stronger.player import (
     process_mystery_shop,
     activity_live,
     do_recognize_fatigue,
+    FATIGUE_ROI,
     receive_mail, match_and_click,
     close_new_day_dialog,
     detect_aolakou,
 )
-from dnf.stronger.skill_util import get_skill_initial_images
+from dnf.stronger.skill_util import get_skill_initial_images, SKILL_BAR_ROI
 from logger_config import logger
 from dnf.stronger.role_config_manager import get_role_config_list_from_json as get_role_config_list
 from utils import keyboard_utils as kbu
@@ -63,8 +68,12 @@ from utils import mouse_utils as mu
 from utils import window_utils as window_utils
 from utils.custom_thread_pool_executor import SingleTaskThreadPool
 from utils.keyboard_move_controller import MovementController
-from utils.utilities import plot_one_box
 from utils.window_utils import WindowCapture, capture_window_image
+from utils.frame_source import ReplayFrameSource
+from utils.session_recorder import SessionRecorder
+from utils.capture_thread import CaptureThread
+from utils.roi_capture import RegionCapture
+from utils.frame_change import FrameChangeDetector
 from utils.utilities import match_template_by_roi
 from utils.mail_sender import EmailSender
 from dnf.mail_config import config as mail_config
@@ -107,6 +116,42 @@ buy_catalyst = 7  # buy_type: 0不买，1传说，2史诗，3太初，4传说+
 enable_uniform_pl = False
 uniform_default_fatigue_reserved = 17
 
+# 录制会话回放目录，不为None时用录制的帧代替实时截图（基准测试/回归测试用）
+replay_session_dir = None
+
+# 录制最近的帧和检测结果（内存映射环形文件，不做图像编码），卡住/死亡时导出到 recordings 目录
+record_session = False
+record_capacity = 600  # 保留的帧数，1067*600的帧约1.9MB/帧
+
+# 以下后台线程、推理加速的开关默认关闭，在实机上逐个开启验证后再改默认值
+
+# 后台线程持续截图，打怪循环直接取最新帧，截图与推理重叠执行
+capture_in_background = False
+capture_fps = 30  # 后台截图的最大帧率
+
+# 技能栏/疲劳值只截取对应区域，区域的刷新频率（0 表示每次都重新截取）
+skill_bar_fps = 20
+
+# 画面没有变化时（结算、商店、加载、站在门口）复用上一次的检测结果，跳过模型推理
+skip_static_frames = False
+static_frame_max_age = 10  # 最多连续复用的帧数
+
+# 推理输入尺寸，640 表示正方形输入（与原来一致）；(384, 640) 为 (高, 宽)，按 1067x600 画面比例对齐到32的倍数，减少填充
+# 换尺寸前用 python -m dnf.inference compare <模型> <录制目录> 对比耗时和门/掉落物召回率
+inference_imgsz = 640
+
+# 推理后端: 'torch' / 'onnx' / 'onnx-int8' / 'auto'（没有可用 GPU 且安装了 onnxruntime 时，导出 ONNX 并用 ONNX Runtime 推理）
+# 'onnx-int8' 使用 python -m dnf.quantize 在录制帧上校准生成的 INT8 模型，不存在时退回 FP32
+inference_backend = 'torch'
+onnx_threads = 0  # ONNX Runtime 单个模型的线程数，0 表示按核心数自动选择
+
+# 预热后直接调用网络推理（预分配输入张量、固定阈值 NMS），绕过 model.predict 每次调用的开销，只对 torch 后端生效
+fast_predictor = False
+
+# 模型放到独立进程推理，帧和检测框通过共享内存传递，避免与键盘监听、小地图分析、界面抢 GIL 造成单帧耗时尖峰
+# 开启前用 python -m dnf.inference_worker <模型> 对比本进程和独立进程推理的单帧延迟 p50/p99
+inference_in_worker = False
+
 from model_loader import get_abyss_model_path
 weights = get_abyss_model_path()  # 模型存放的位置
 # <<<<<<<<<<<<<<<< 运行时相关的参数 <<<<<<<<<<<<<<<<
@@ -202,16 +247,25 @@ def get_model():
         device, device_name = _select_best_gpu()
         logger.info(f"选择计算设备: {device} ({device_name})")
         
-        # 加载主模型并移动到指定设备
-        logger.info("正在加载深渊推理模型...")
-        model = YOLO(weights)
-        model.to(device)
-        
-        # 模型预热，让首次推理更快
-        logger.info("模型预热中...")
-        import numpy as np
-        dummy_img = np.zeros((640, 640, 3), dtype=np.uint8)
-        model.predict(source=dummy_img, device=device, verbose=False)
+        if use_onnx_backend(inference_backend, device):
+            logger.info("使用 ONNX Runtime 推理")
+
+        if inference_in_worker:
+            # 子进程中完成加载和预热
+            logger.info("正在启动推理进程...")
+            model = InferenceWorker(weights, device, inference_imgsz, inference_backend, onnx_threads,
+                                    fast_predictor, conf=0.7, iou=0.2).start()
+        else:
+            # 加载主模型并移动到指定设备
+            logger.info("正在加载深渊推理模型...")
+            model = load_detector(weights, device, inference_imgsz, inference_backend, onnx_threads)
+
+            # 模型预热，让首次推理更快（预热尺寸与推理输入一致）
+            logger.info("模型预热中...")
+            warmup(model, device, inference_imgsz)
+            if fast_predictor and not isinstance(model, OnnxDetector):
+                # 取出预热后的网络直接调用，predict() 用法不变
+                model = FastPredictor(model, device, inference_imgsz, conf=0.7, iou=0.2)
         logger.info(f"模型加载完成，使用设备: {device} ({device_name})，耗时: {_time.time()-t0:.1f}秒")
     return model, device
 
@@ -222,6 +276,8 @@ def _release_models():
     import gc
     
     if model is not None:
+        if isinstance(model, InferenceWorker):
+            model.close()
         del model
         model = None
     
@@ -259,6 +315,7 @@ monster_h = 57  # 普通怪高度处理
 em_h = 100  # 精英怪高度处理
 door_h = 32  # 门高度处理
 loot_h = 0  # 掉落物高度处理
+det_analyser = DetAnalyser(names, monster_h, door_h, loot_h)  # 检测框整理
 
 attack_x = 200  # 打怪命中范围，x轴距离
 attack_y = 80  # 打怪命中范围，y轴距离
@@ -273,6 +330,8 @@ executor = SingleTaskThreadPool()
 img_executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
 tool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
 mail_sender = EmailSender(mail_config)  # 初始化邮件发送器
+recorder = None  # 会话录制器
+capture_thread = None  # 后台截图线程
 
 
 def adjust_stutter_alarm(start_time, role_name, role_no, fight_count, handle):
@@ -318,6 +377,8 @@ def adjust_stutter_alarm(start_time, role_name, role_no, fight_count, handle):
             # 再次释放确保干净
             mover._release_all_keys()
             time.sleep(0.2)
+            # 导出卡住前的录制帧
+            tool_executor.submit(_dump_recording, 'stuck')
             # 用pynput按键，和技能按键一样的方式
             kbu.do_press_with_time(dnf.Key_collect_role, 300, 200)
             logger.info(f'已按下 numpad_7 键，返回上一地图')
@@ -347,6 +408,18 @@ def adjust_stutter_alarm(start_time, role_name, role_no, fight_count, handle):
             return
 
 
+def _dump_recording(reason):
+    """导出录制的最近帧，卡住/死亡后用 ReplayFrameSource 回放分析"""
+    if recorder is None:
+        return
+    try:
+        dump_dir = recorder.dump(reason)
+        if dump_dir:
+            logger.warning(f"已导出最近的录制帧: {dump_dir}")
+    except Exception as e:
+        logger.error(f"导出录制失败: {e}")
+
+
 # 创建一个队列，用于主线程和展示线程之间的通信（maxsize=2避免堆积）
 result_queue = queue.Queue(maxsize=2)
 
@@ -616,143 +689,14 @@ def start_keyboard_listener():
 def analyse_det_result(results, hero_height, img) -> DetResult:
     global show
     if results is not None and len(results):
-        boss_xywh_list = []
-        monster_xywh_list = []
-        elite_monster_xywh_list = []
-
-        loot_xywh_list = []
-        gold_xywh_list = []
-        door_xywh_list = []
-        door_boss_xywh_list = []
-
-        hero_conf = -1
-        hero_xywh = None
-
-        card_num = 0
-        continue_exist = False
-        shop_exist = False
-        shop_mystery_exist = False
-        menu_exist = False
-        sss_exist = False
-
-        forward_exists = False
-        ball_xywh_list = []
-        hole_xywh_list = []
-
-        result = results[0]
-        for box in result.boxes:
-            cls = int(box.cls)
-            xywh = box.xywh[0].tolist()
-            xyxy = box.xyxy[0].tolist()
-            conf = box.conf[0]
-
-            # 高度处理
-            if names[cls] == "hero":
-                xywh[1] += hero_height
-
-                if conf > hero_conf:  # 找一个置信度最大的hero,记录索引
-                    hero_conf = conf
-                    hero_xywh = xywh
-
-            if names[cls] == "boss":
-                # xywh[1] += b_h
-                xywh[1] = xyxy[3] - 20
-
-                boss_xywh_list.append(xywh)
-
-            if names[cls] == "monster":
-                xywh[1] += monster_h
-
-                monster_xywh_list.append(xywh)
-
-            if names[cls] == "elite-monster":
-                # xywh[1] += em_h
-                xywh[1] = xyxy[3] - 20
+        # 检测框只拷回主机一次，按类别整体计算
+        data = boxes_to_numpy(results[0].boxes.data)
+        res = det_analyser.analyse(data, hero_height, DetResult())
+        hero_xywh = res.hero_xywh
 
-                elite_monster_xywh_list.append(xywh)
-
-            if names[cls] == "door":
-                xywh[1] += door_h
-
-                door_xywh_list.append(xywh)
-
-            if names[cls] == "door-boss":
-                xywh[1] += door_h
-
-                door_boss_xywh_list.append(xywh)
-
-            if names[cls] == "loot":
-                xywh[1] += loot_h
-                # 处理半拉子框的情况
-                if xywh[2] > 111 and xywh[3] < 110:
-                    if (xyxy[1] + 60) > xywh[1]:
-                        xywh[1] = xyxy[1] + 60
-                loot_xywh_list.append(xywh)
-
-            if names[cls] == 'gold':
-                xywh[1] += loot_h
-                if xywh[2] > 111 and xywh[3] < 110:
-                    if (xyxy[1] + 60) > xywh[1]:
-                        xywh[1] = xyxy[1] + 60
-
-                gold_xywh_list.append(xywh)
-
-            if names[cls] == "continue":
-                continue_exist = True
-
-            if names[cls] == "card":
-                card_num = card_num + 1
-
-            if names[cls] == "shop":
-                shop_exist = True
-
-            if names[cls] == "shop-mystery":
-                shop_mystery_exist = True
-
-            if names[cls] == "menu":
-                menu_exist = True
-
-            if names[cls] == "sss":
-                sss_exist = True
-
-            if names[cls] == "forward":
-                forward_exists = True
-
-            if names[cls] == "ball":
-                xywh[1] = xyxy[3] + 50
-                ball_xywh_list.append(xywh)
-
-            if names[cls] == "hole":
-                xywh[1] += door_h
-                hole_xywh_list.append(xywh)
-
-            # 在原图上画框
-            if show and img is not None:
-                label = '%s %.2f' % (names[int(cls)], conf)
-                plot_one_box(box.xyxy[0], img, label=label, color=colors[int(cls)], line_thickness=2)
-
-        res = DetResult()
-        res.monster_xywh_list = monster_xywh_list
-        res.elite_monster_xywh_list = elite_monster_xywh_list
-        res.boss_xywh_list = boss_xywh_list
-        res.loot_xywh_list = loot_xywh_list
-        res.gold_xywh_list = gold_xywh_list
-        res.door_xywh_list = door_xywh_list
-        res.door_boss_xywh_list = door_boss_xywh_list
-
-        res.hero_xywh = hero_xywh
-        # res.hero_conf = hero_conf
-
-        res.card_num = card_num
-        res.continue_exist = continue_exist
-        res.shop_exist = shop_exist
-        res.shop_mystery_exist = shop_mystery_exist
-        res.menu_exist = menu_exist
-        res.sss_exist = sss_exist
-
-        res.forward_exists = forward_exists
-        res.ball_xywh_list = ball_xywh_list
-        res.hole_xywh_list = hole_xywh_list
+        # 在原图上画框
+        if show and img is not None:
+            draw_boxes(img, data, names, colors)
 
         # 给角色绘制定位圆点,方便查看
         if show:
@@ -789,7 +733,7 @@ def analyse_det_result(results, hero_height, img) -> DetResult:
 
 
 def main_script():
-    global x, y, handle, show, stop_be_pressed
+    global x, y, handle, show, stop_be_pressed, recorder, capture_thread
     # ################### 主流程开始 ###############################
     start_time = datetime.now()
     logger.info("_____________________准备_____________________")
@@ -820,9 +764,19 @@ def main_script():
         # 释放模型显存，防止内存泄漏
         _release_models()
 
+        # 停止后台截图
+        if capture_thread is not None:
+            capture_thread.stop()
+            capture_thread = None
+
+        # 关闭会话录制
+        if recorder is not None:
+            recorder.close()
+            recorder = None
+
 
 def _run_main_script():
-    global x, y, handle, show, stop_be_pressed
+    global x, y, handle, show, stop_be_pressed, recorder, capture_thread
     
     # 获取游戏窗口的位置，和大小
     handle = window_utils.get_window_handle(dnf.window_title)
@@ -830,7 +784,29 @@ def _run_main_script():
     logger.info("获取游戏窗口位置和大小...{},{},{},{}", x, y, width, height)
     window_utils.resize_window(handle)
     logger.warning("矫正窗口大小:1067*600")
-    capturer = WindowCapture(handle)
+    if replay_session_dir:
+        capturer = ReplayFrameSource(replay_session_dir)
+        logger.warning(f"使用录制会话回放代替实时截图: {replay_session_dir}")
+    else:
+        # 后台截图时多一个槽位给截图线程持有的最新帧
+        capturer = WindowCapture(handle, ring_slots=4 if capture_in_background else 3)
+
+    # 后台截图
+    if capture_in_background and capture_thread is None:
+        capture_thread = CaptureThread(capturer, capture_fps)
+        capture_thread.start()
+        logger.info(f"后台截图已开启，最大{capture_fps}帧/秒")
+
+    # 小区域截图，不必整窗截图
+    regions = RegionCapture(capturer)
+    regions.add('skill_bar', SKILL_BAR_ROI, skill_bar_fps)
+    regions.add('fatigue', FATIGUE_ROI)
+
+    # 会话录制
+    if record_session and recorder is None:
+        recorder = SessionRecorder(os.path.join(config_.project_base_path, 'recordings', 'live_abyss'),
+                                   capturer.width, capturer.height, record_capacity)
+        logger.info(f"会话录制已开启，保留最近{record_capacity}帧")
 
     # 获取角色配置列表
     role_list = get_role_config_list(account_code)
@@ -887,7 +863,7 @@ def _run_main_script():
         logger.info(f'设置的拥有疲劳值: {role.fatigue_all}')
 
         # ocr_fatigue = do_ocr_fatigue_retry(handle, x, y, reader, 5)
-        ocr_fatigue = do_recognize_fatigue(capturer.capture())
+        ocr_fatigue = do_recognize_fatigue(regions.grab('fatigue'), FATIGUE_ROI[:2])
         logger.info(f'识别的拥有疲劳值: {ocr_fatigue}')
         if ocr_fatigue is not None:
             if role.fatigue_all != ocr_fatigue:
@@ -914,7 +890,7 @@ def _run_main_script():
             # 默认是站在赛丽亚房间
 
             # 获取技能栏截图
-            skill_images = get_skill_initial_images(capturer.capture())
+            skill_images = get_skill_initial_images(regions.grab('skill_bar'), SKILL_BAR_ROI[:2])
 
             # N 点第一个
             logger.info("传送到风暴门口,选地图...")
@@ -1032,6 +1008,10 @@ def _run_main_script():
             boss_appeared = False
             die_time = 0
             delay_break = 0
+            last_frame_seq = -1  # 后台截图时上一次处理的帧序号
+            frame_ref = None  # 本轮处理的帧，处理期间一直持有
+            frame_gate = FrameChangeDetector(max_age=static_frame_max_age) if skip_static_frames else None
+            last_results = None  # 上一次推理的检测结果，画面没有变化时复用
 
             # frame = 0
             while True:  # 循环打怪过图，过房间
@@ -1042,25 +1022,46 @@ def _run_main_script():
                 
                 pause_event.wait()  # 暂停
 
-                # 截图
-                img0 = capturer.capture()
+                # 截图，本轮处理期间持有该帧，识别线程另外持有一次，避免被后续截图覆盖
+                if frame_ref is not None:
+                    frame_ref.release()
+                    frame_ref = None
+                if capture_thread is not None:
+                    # 直接取推理期间截好的最新帧
+                    frame_ref = capture_thread.get_latest(last_frame_seq, timeout=1.0)
+                    if frame_ref is None:
+                        continue
+                    last_frame_seq = frame_ref.seq
+                else:
+                    frame_ref = capturer.acquire()
+                img0 = frame_ref.img
                 # 识别
                 cv_det_task = None
                 if boss_appeared or hole_appeared or ball_appeared:
                     cv_det_task = img_executor.submit(object_detection_cv, img0)
+                    cv_det_task.add_done_callback(frame_ref.retain().release)
                 img4show = img0.copy()
                 # frame = frame + 1
                 # print('截图ing，，，', frame)
-                # 执行推理（使用延迟加载的模型）
-                _model, _device = get_model()
-                results = _model.predict(
-                    source=img0,
-                    device=_device,
-                    imgsz=640,
-                    conf=0.7,
-                    iou=0.2,
-                    verbose=False
-                )
+                if frame_gate is not None and not frame_gate.should_infer(img0) and last_results is not None:
+                    # 画面没有变化，复用上一次的检测结果
+                    results = last_results
+                else:
+                    # 执行推理（使用延迟加载的模型）
+                    _model, _device = get_model()
+                    results = _model.predict(
+                        source=img0,
+                        device=_device,
+                        imgsz=inference_imgsz,
+                        conf=0.7,
+                        iou=0.2,
+                        verbose=False
+                    )
+                    last_results = results
+
+                # 录制原始帧和检测框（深渊没有房间信息）
+                if recorder is not None:
+                    recorder.record(img0, results[0].boxes.data if results else None, None, h_h)
 
                 if results is None or len(results) == 0 or len(results[0].boxes) == 0:
                     # logger.info('模型没有识别到物体')
@@ -1122,6 +1123,7 @@ def _run_main_script():
                         if time.time() - die_time > 11:
                             die_time = time.time()
                             logger.warning(f"死亡提醒!!")
+                            tool_executor.submit(_dump_recording, 'death')
 
                             # 声音提醒
                             tool_executor.submit(lambda: (
@@ -1638,6 +1640,8 @@ def _run_main_script():
                     continue
                 # 逻辑处理-什么都没有<<<<<<<<<<<<<<<<<<<<<<<<<<<<<
             # todo 循环打怪过图 循环结束////////////////////////////////
+            if frame_ref is not None:
+                frame_ref.release()
             logger.warning("循环打怪过图 循环结束////////////////////////////////")
 
             pause_event.wait()  # 暂停
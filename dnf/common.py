@@ -10,6 +10,8 @@ import queue
 import random
 import threading
 import time
+from functools import lru_cache
+from types import SimpleNamespace
 from typing import List, Tuple, Optional, Any
 
 import cv2
@@ -23,7 +25,7 @@ import dnf.dnf_config as dnf
 from utils import mouse_utils as mu
 from utils import window_utils as window_utils
 from utils.keyboard_move_controller import MovementController
-from utils.utilities import plot_one_box
+from dnf.detection import DetAnalyser, boxes_to_numpy, default_class_specs, draw_boxes
 
 # 颜色常量
 COLOR_RED = (0, 0, 255)
@@ -39,6 +41,9 @@ ELITE_MONSTER_HEIGHT = 100
 DOOR_HEIGHT = 32
 LOOT_HEIGHT = 0
 
+# 只有在 extra_classes 中指定时才处理的类别
+_OPTIONAL_CLASSES = ('obstacle', 'forward', 'ball', 'hole')
+
 
 class KeyboardController:
     """键盘监听控制器"""
@@ -152,6 +157,14 @@ class DisplayThread:
         cv2.destroyAllWindows()
 
 
+@lru_cache(maxsize=8)
+def _get_common_analyser(names: Tuple[str, ...], extra_classes: Tuple[str, ...]) -> DetAnalyser:
+    """按类别名和额外类别编译规则表，同一模型只编译一次"""
+    specs = [spec for spec in default_class_specs(MONSTER_HEIGHT, DOOR_HEIGHT, LOOT_HEIGHT)
+             if spec.name not in _OPTIONAL_CLASSES or spec.name in extra_classes]
+    return DetAnalyser(names, specs=specs)
+
+
 def analyse_det_result_common(
     results,
     hero_height: int,
@@ -205,90 +218,18 @@ def analyse_det_result_common(
             elif cls_name in ['ball', 'hole']:
                 result_dict[f'{cls_name}_xywh_list'] = []
     
-    result = results[0]
-    for box in result.boxes:
-        cls = int(box.cls)
-        xywh = box.xywh[0].tolist()
-        xyxy = box.xyxy[0].tolist()
-        conf = float(box.conf[0])
-        
-        cls_name = names[cls] if cls < len(names) else 'unknown'
-        
-        # 高度处理
-        if cls_name == "hero":
-            xywh[1] += hero_height
-            if conf > result_dict['hero_conf']:
-                result_dict['hero_conf'] = conf
-                result_dict['hero_xywh'] = xywh
-
-        elif cls_name == "boss":
-            xywh[1] = xyxy[3] - 20
-            result_dict['boss_xywh_list'].append(xywh)
-
-        elif cls_name == "monster":
-            xywh[1] += MONSTER_HEIGHT
-            result_dict['monster_xywh_list'].append(xywh)
-
-        elif cls_name == "elite-monster":
-            xywh[1] = xyxy[3] - 20
-            result_dict['elite_monster_xywh_list'].append(xywh)
-
-        elif cls_name == "door":
-            xywh[1] += DOOR_HEIGHT
-            result_dict['door_xywh_list'].append(xywh)
-
-        elif cls_name == "door-boss":
-            xywh[1] += DOOR_HEIGHT
-            result_dict['door_boss_xywh_list'].append(xywh)
-
-        elif cls_name == "loot":
-            xywh[1] += LOOT_HEIGHT
-            if xywh[2] > 111 and xywh[3] < 110:
-                if (xyxy[1] + 60) > xywh[1]:
-                    xywh[1] = xyxy[1] + 60
-            result_dict['loot_xywh_list'].append(xywh)
-
-        elif cls_name == 'gold':
-            xywh[1] += LOOT_HEIGHT
-            if xywh[2] > 111 and xywh[3] < 110:
-                if (xyxy[1] + 60) > xywh[1]:
-                    xywh[1] = xyxy[1] + 60
-            result_dict['gold_xywh_list'].append(xywh)
-
-        elif cls_name == "continue":
-            result_dict['continue_exist'] = True
-
-        elif cls_name == "card":
-            result_dict['card_num'] += 1
-
-        elif cls_name == "shop":
-            result_dict['shop_exist'] = True
-
-        elif cls_name == "shop-mystery":
-            result_dict['shop_mystery_exist'] = True
-
-        elif cls_name == "menu":
-            result_dict['menu_exist'] = True
-
-        elif cls_name == "sss":
-            result_dict['sss_exist'] = True
-
-        elif cls_name == "forward" and extra_classes and 'forward' in extra_classes:
-            result_dict['forward_exists'] = True
-
-        elif cls_name == "ball" and extra_classes and 'ball' in extra_classes:
-            xywh[1] = xyxy[3] + 50
-            result_dict['ball_xywh_list'].append(xywh)
-
-        elif cls_name == "hole" and extra_classes and 'hole' in extra_classes:
-            xywh[1] += DOOR_HEIGHT
-            result_dict['hole_xywh_list'].append(xywh)
-
-        # 绘制检测框
-        if show and img is not None:
-            label = f'{cls_name} {conf:.2f}'
-            color = colors[cls] if cls < len(colors) else (255, 255, 255)
-            plot_one_box(box.xyxy[0], img, label=label, color=color, line_thickness=2)
+    # 检测框只拷回主机一次，按规则表整理
+    data = boxes_to_numpy(results[0].boxes.data)
+    analyser = _get_common_analyser(tuple(names), tuple(extra_classes or ()))
+    res = analyser.analyse(data, hero_height, SimpleNamespace(**result_dict))
+    result_dict.update(vars(res))
+    hero_id = names.index('hero') if 'hero' in names else -1
+    if res.hero_xywh is not None:
+        result_dict['hero_conf'] = float(data[data[:, 5] == hero_id, 4].max())
+
+    # 绘制检测框
+    if show and img is not None:
+        draw_boxes(img, data, names, colors)
     
     return result_dict
 
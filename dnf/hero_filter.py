@@ -0,0 +1,153 @@
+# -*- coding:utf-8 -*-
+"""
+角色位置滤波模块 - 平滑 hero_xywh 的抖动，并把位置外推到按键真正生效的时刻
+
+检测到的位置是截图时刻的，等推理、决策完成再按键时角色已经走出一段距离，
+在门口、掉落物旁边容易走过头再折返。这里用 alpha-beta 滤波估计位置和速度，
+速度同时参考 MovementController 当前的方向和走/跑模式，换方向时能更快跟上。
+流水线推理时 update() 在推理线程、predict() 在决策线程调用，两者用同一把锁保护。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 各方向的单位向量（屏幕坐标，y 向下）
+_DIRECTION_VECTORS = {
+    'UP': (0, -1),
+    'DOWN': (0, 1),
+    'LEFT': (-1, 0),
+    'RIGHT': (1, 0),
+    'LEFT_UP': (-1, -1),
+    'LEFT_DOWN': (-1, 1),
+    'RIGHT_UP': (1, -1),
+    'RIGHT_DOWN': (1, 1),
+}
+
+
+class HeroFilter:
+    """
+    角色位置 alpha-beta 滤波
+
+    Args:
+        alpha: 位置修正系数，越大越相信本次检测
+        beta: 速度修正系数
+        control_gain: 速度向按键方向对应速度靠拢的比例，0 表示不参考按键
+        walk_speed: 走路速度 (x, y)，像素/秒
+        run_speed: 跑步速度 (x, y)，像素/秒
+        jump: 检测位置与预测位置相差超过它（像素）时直接重置（闪现、位移技能、换房间）
+        reset_after: 超过多少秒没有检测到角色时重置
+    """
+
+    def __init__(self, alpha: float = 0.5, beta: float = 0.3, control_gain: float = 0.3,
+                 walk_speed: Tuple[float, float] = (220.0, 150.0), run_speed: Tuple[float, float] = (440.0, 150.0),
+                 jump: float = 150.0, reset_after: float = 0.5):
+        self.alpha = alpha
+        self.beta = beta
+        self.control_gain = control_gain
+        self.walk_speed = np.asarray(walk_speed, dtype=np.float64)
+        self.run_speed = np.asarray(run_speed, dtype=np.float64)
+        self.jump = jump
+        self.reset_after = reset_after
+        self.position: Optional[np.ndarray] = None  # 滤波后的中心点
+        self.velocity = np.zeros(2)
+        self.size: Optional[List[float]] = None  # 最近一次检测的宽高
+        self.timestamp = 0.0
+        self._lock = threading.Lock()
+
+    def command_velocity(self, direction: Optional[str], mode: Optional[str]) -> np.ndarray:
+        """按键方向和走/跑模式对应的速度，没有按方向键时为0"""
+        vec = _DIRECTION_VECTORS.get(direction)
+        if vec is None:
+            return np.zeros(2)
+        speed = self.run_speed if mode == 'running' else self.walk_speed
+        return np.asarray(vec, dtype=np.float64) * speed
+
+    def reset(self):
+        with self._lock:
+            self.position = None
+            self.velocity = np.zeros(2)
+            self.size = None
+
+    def update(self, xywh: Sequence[float], timestamp: float, direction: Optional[str] = None,
+               mode: Optional[str] = None):
+        """
+        加入一次检测
+
+        Args:
+            xywh: 检测到的角色坐标（已做高度处理）
+            timestamp: 帧的截图时间（time.monotonic）
+            direction: MovementController 当前方向
+            mode: MovementController 当前模式 'walking' / 'running'
+        """
+        measured = np.asarray(xywh[:2], dtype=np.float64)
+        command = self.command_velocity(direction, mode)
+        with self._lock:
+            self._update(measured, list(xywh[2:4]), timestamp, command)
+
+    def _update(self, measured: np.ndarray, size: List[float], timestamp: float, command: np.ndarray):
+        self.size = size
+        dt = timestamp - self.timestamp
+        if self.position is None or dt > self.reset_after:
+            self.position = measured
+            self.velocity = command
+            self.timestamp = timestamp
+            return
+        if dt <= 0:
+            # 同一帧的结果（画面静止时复用）不重复修正
+            return
+
+        predicted = self.position + self.velocity * dt
+        residual = measured - predicted
+        if np.hypot(*residual) > self.jump:
+            self.position = measured
+            self.velocity = command
+            self.timestamp = timestamp
+            return
+
+        self.position = predicted + self.alpha * residual
+        velocity = self.velocity + self.beta * residual / dt
+        self.velocity = (1 - self.control_gain) * velocity + self.control_gain * command
+        self.timestamp = timestamp
+
+    def predict(self, timestamp: float) -> Optional[List[float]]:
+        """
+        外推到 timestamp 时刻（一般是 time.monotonic() + 按键生效延迟）
+
+        Returns:
+            与 hero_xywh 同格式的坐标，还没有检测到角色时返回None
+        """
+        with self._lock:
+            if self.position is None:
+                return None
+            if timestamp - self.timestamp > self.reset_after:
+                return None
+            position = self.position + self.velocity * max(0.0, timestamp - self.timestamp)
+            return [float(position[0]), float(position[1])] + self.size
+
+
+if __name__ == '__main__':
+    # 模拟角色走向门口：30 FPS 截图，推理+决策 60ms，检测有 ±4px 抖动，中途换方向
+    rng = np.random.default_rng(0)
+    fps, latency = 30.0, 0.06
+    hero_filter = HeroFilter()
+    raw_err, filtered_err = [], []
+    pos = np.array([200.0, 400.0])
+    for f in range(120):
+        t = f / fps
+        direction = 'RIGHT' if f < 60 else 'RIGHT_UP'
+        mode = 'running' if f < 60 else 'walking'
+        vel = hero_filter.command_velocity(direction, mode) * 0.8  # 实际速度与预设速度不完全一致
+        pos = pos + vel / fps
+        measured = [pos[0] + rng.normal(0, 4), pos[1] + rng.normal(0, 4), 50.0, 110.0]
+        hero_filter.update(measured, t, direction, mode)
+        truth_at_action = pos + vel * latency  # 按键生效时角色的真实位置
+        if f > 5:
+            raw_err.append(np.hypot(*(np.asarray(measured[:2]) - truth_at_action)))
+            filtered_err.append(np.hypot(*(np.asarray(hero_filter.predict(t + latency)[:2]) - truth_at_action)))
+    print(f'按键时刻的位置误差: 直接用检测结果 均值 {np.mean(raw_err):.1f}px 最大 {np.max(raw_err):.1f}px, '
+          f'滤波外推 均值 {np.mean(filtered_err):.1f}px 最大 {np.max(filtered_err):.1f}px')
@@ -0,0 +1,430 @@
+# -*- coding:utf-8 -*-
+"""
+推理模块 - 主模型与障碍物模型在同一帧上并发推理，障碍物检测降频复用
+
+两个模型串行执行时单帧延迟是两者之和。PyTorch 推理时会释放 GIL，GPU 上两个模型的内核可以重叠；
+CPU 上每个模型都会用满 torch 的线程池，并发只会互相抢核心，所以默认只在 CUDA 上并发。
+障碍物不会移动，只在换房间或每隔 N 帧重新检测，其余帧按镜头滚动平移上一次的检测框。
+游戏画面是 16:9，正方形输入有近一半是填充，可以用按画面比例对齐到 stride 的矩形输入。
+FastPredictor 绕过 model.predict 每次调用时的参数合并、数据源封装，直接调用网络并做 NMS。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from ultralytics.engine.results import Results
+from ultralytics.utils import ops
+
+from dnf.detection import box_iou, boxes_to_numpy
+from dnf.onnx_backend import imgsz_hw, letterbox, parse_imgsz
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+
+def rect_imgsz(frame_size: Tuple[int, int] = (1067, 600), long_side: int = 640, stride: int = 32) -> Tuple[int, int]:
+    """
+    按画面比例计算矩形推理输入尺寸
+
+    Args:
+        frame_size: 画面尺寸 (宽, 高)
+        long_side: 长边尺寸
+        stride: 模型最大步长，两边都向上对齐到它的倍数
+
+    Returns:
+        (高, 宽)，1067x600 的画面为 (384, 640)
+    """
+    w, h = frame_size
+    scale = long_side / max(w, h)
+
+    def _align(v: float) -> int:
+        return int(np.ceil(round(v * scale, 6) / stride) * stride)
+
+    return _align(h), _align(w)
+
+
+def warmup(model, device, imgsz: Any = 640):
+    """用与推理输入同尺寸的空图预热模型，避免首帧重新分配显存/选择卷积算法"""
+    h, w = (imgsz, imgsz) if isinstance(imgsz, int) else imgsz
+    dummy_img = np.zeros((h, w, 3), dtype=np.uint8)
+    model.predict(source=dummy_img, device=device, imgsz=imgsz, verbose=False)
+
+
+def compare_input_sizes(model, frames: Sequence[np.ndarray], sizes: Sequence[Any], device=None,
+                        conf: float = 0.7, iou: float = 0.2, classes: Optional[Sequence[str]] = None,
+                        match_iou: float = 0.5) -> List[Dict[str, Any]]:
+    """
+    对比不同输入尺寸的推理耗时和召回率
+
+    以 sizes[0] 的检测结果为基准，统计其它尺寸在同一帧上找回的同类别框（IoU >= match_iou）的比例。
+
+    Args:
+        model: ultralytics YOLO 模型
+        frames: BGR 帧（如录制目录中的帧）
+        sizes: 输入尺寸列表，第一个为基准，如 [640, (384, 640), (352, 608)]
+        device: 推理设备
+        conf: 置信度阈值
+        iou: NMS 的 IoU 阈值
+        classes: 统计召回率的类别名，None 表示全部类别
+        match_iou: 认为找回的最小 IoU
+
+    Returns:
+        每个尺寸一项 {'imgsz', 'ms', 'recall': {类别名: 召回率}}，基准帧中没有该类别时召回率为None
+    """
+    names = model.names
+    if classes is None:
+        classes = list(names.values()) if isinstance(names, dict) else list(names)
+    name_to_id = {v: k for k, v in (names.items() if isinstance(names, dict) else enumerate(names))}
+
+    per_size = []
+    for imgsz in sizes:
+        warmup(model, device, imgsz)
+        boxes, elapsed = [], 0.0
+        for frame in frames:
+            t0 = time.perf_counter()
+            results = model.predict(source=frame, device=device, imgsz=imgsz, conf=conf, iou=iou, verbose=False)
+            elapsed += time.perf_counter() - t0
+            boxes.append(boxes_to_numpy(results[0].boxes.data))
+        per_size.append((imgsz, elapsed / max(len(frames), 1) * 1000, boxes))
+
+    reference = per_size[0][2]
+    report = []
+    for imgsz, ms, boxes in per_size:
+        recall = {}
+        for cls_name in classes:
+            cls_id = name_to_id.get(cls_name)
+            total = found = 0
+            for ref, pred in zip(reference, boxes):
+                ref = ref[ref[:, 5] == cls_id]
+                pred = pred[pred[:, 5] == cls_id]
+                total += len(ref)
+                if len(ref) and len(pred):
+                    found += int((box_iou(ref, pred).max(axis=1) >= match_iou).sum())
+            recall[cls_name] = found / total if total else None
+        report.append({'imgsz': imgsz, 'ms': ms, 'recall': recall})
+    return report
+
+
+class FastPredictor:
+    """
+    直接调用网络的推理封装，predict() 与 YOLO.predict() 的调用方式和返回值兼容
+
+    model.predict 每次调用都要合并参数、封装数据源、逐帧预处理，小模型上这部分 Python 开销
+    占单帧耗时的很大比例。这里在创建时取出预热后的网络，letterbox 直接写进预先分配的
+    （GPU 时为锁页）内存，拷到设备上预先分配的输入张量里做 BGR->RGB 和归一化，再用固定阈值做 NMS。
+
+    Args:
+        model: 已加载的 ultralytics YOLO，没有预热过时会先预热
+        device: 推理设备
+        imgsz: 输入尺寸，int 或 (高, 宽)
+        conf: 置信度阈值
+        iou: NMS 的 IoU 阈值
+        max_det: 最多保留的框数
+    """
+
+    def __init__(self, model, device=None, imgsz: Any = 640, conf: float = 0.7, iou: float = 0.2,
+                 max_det: int = 300):
+        if not TORCH_AVAILABLE:
+            raise ImportError("FastPredictor 需要安装 torch")
+        if getattr(model, 'predictor', None) is None:
+            warmup(model, device, imgsz)
+        self.backend = model.predictor.model  # 预热时创建的 AutoBackend（已融合 Conv+BN）
+        self.names = model.names
+        self.device = self.backend.device
+        self.imgsz = imgsz_hw(imgsz)
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+
+        h, w = self.imgsz
+        cuda = self.device.type == 'cuda'
+        self._host = torch.empty((h, w, 3), dtype=torch.uint8, pin_memory=cuda)
+        self._canvas = self._host.numpy()  # letterbox 直接写进这块内存
+        self._device_u8 = torch.empty((h, w, 3), dtype=torch.uint8, device=self.device)
+        dtype = torch.float16 if getattr(self.backend, 'fp16', False) else torch.float32
+        self._input = torch.empty((1, 3, h, w), dtype=dtype, device=self.device)
+        # 异步拷贝完成前不能改写锁页内存
+        self._copied = torch.cuda.Event() if cuda else None
+
+    def to(self, device):
+        return self
+
+    def predict(self, source: np.ndarray, device=None, imgsz: Any = None, conf: Optional[float] = None,
+                iou: Optional[float] = None, verbose: bool = False, **kwargs) -> List[Any]:
+        """
+        推理一帧，device/imgsz 被忽略（创建时确定）
+
+        Returns:
+            [Results]，只有一项
+        """
+        conf = self.conf if conf is None else conf
+        iou = self.iou if iou is None else iou
+        if self._copied is not None:
+            self._copied.synchronize()
+        letterbox(source, self.imgsz, self._canvas)
+        with torch.inference_mode():
+            self._device_u8.copy_(self._host, non_blocking=True)
+            if self._copied is not None:
+                self._copied.record()
+            # HWC BGR uint8 -> CHW RGB float [0, 1]
+            self._input[0].copy_(self._device_u8.permute(2, 0, 1).flip(0)).div_(255)
+            preds = self.backend(self._input)
+            det = ops.non_max_suppression(preds, conf, iou, max_det=self.max_det)[0]
+            det[:, :4] = ops.scale_boxes(self.imgsz, det[:, :4], source.shape[:2])
+        return [Results(orig_img=source, path='', names=self.names, boxes=det)]
+
+
+class DualModelRunner:
+    """
+    双模型并发推理
+
+    主模型在调用线程推理，障碍物模型在专用线程推理，两者都完成后返回。
+    每个模型同一时间只被一个线程使用，不需要额外加锁。
+    CPU 上两个模型共用 torch 的线程池（torch.set_num_threads 是进程级的，不能按模型划分），
+    并发时线程数翻倍、互相抢核心，默认串行执行。
+
+    Args:
+        model: 主模型（ultralytics YOLO）
+        model_obstacle: 障碍物模型，None 时只运行主模型
+        device: 推理设备
+        imgsz: 输入尺寸
+        conf: 主模型置信度阈值
+        obstacle_conf: 障碍物模型置信度阈值
+        iou: NMS 的 IoU 阈值
+        concurrent: 是否并发执行，None 表示只在 CUDA 设备上并发
+    """
+
+    def __init__(self, model, model_obstacle=None, device=None, imgsz: Any = 640, conf: float = 0.7,
+                 obstacle_conf: float = 0.5, iou: float = 0.2, concurrent: Optional[bool] = None):
+        if concurrent is None:
+            concurrent = getattr(device, 'type', str(device)).startswith('cuda')
+        self.model = model
+        self.model_obstacle = model_obstacle
+        self.device = device
+        self.imgsz = imgsz
+        self.conf = conf
+        self.obstacle_conf = obstacle_conf
+        self.iou = iou
+        self.concurrent = concurrent
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='obstacle') \
+            if concurrent and model_obstacle is not None else None
+
+    def warmup(self):
+        """按推理输入尺寸预热两个模型"""
+        warmup(self.model, self.device, self.imgsz)
+        if self.model_obstacle is not None:
+            warmup(self.model_obstacle, self.device, self.imgsz)
+
+    def predict_main(self, img: np.ndarray):
+        return self.model.predict(source=img, device=self.device, imgsz=self.imgsz,
+                                  conf=self.conf, iou=self.iou, verbose=False)
+
+    def predict_obstacle(self, img: np.ndarray):
+        if self.model_obstacle is None:
+            return None
+        return self.model_obstacle.predict(source=img, device=self.device, imgsz=self.imgsz,
+                                           conf=self.obstacle_conf, iou=self.iou, verbose=False)
+
+    def predict(self, img: np.ndarray, with_obstacle: bool = True) -> Tuple[Any, Optional[Any]]:
+        """
+        推理一帧
+
+        Args:
+            img: BGR 图像
+            with_obstacle: 是否同时运行障碍物模型
+
+        Returns:
+            (主模型结果, 障碍物模型结果或None)
+        """
+        if not with_obstacle or self.model_obstacle is None:
+            return self.predict_main(img), None
+        if self._executor is None:
+            return self.predict_main(img), self.predict_obstacle(img)
+
+        obstacle_future = self._executor.submit(self.predict_obstacle, img)
+        try:
+            results = self.predict_main(img)
+        finally:
+            # 主模型出错也要等障碍物线程结束，避免它继续读取已被释放的帧
+            results_obstacle = obstacle_future.result()
+        return results, results_obstacle
+
+    def shutdown(self):
+        """停止障碍物推理线程，可重复调用"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class ObstacleScheduler:
+    """
+    障碍物检测降频调度
+
+    换房间（小地图当前房间变化）或距上次检测满 interval 帧时需要重新检测，
+    其余帧用相位相关估计镜头相对上次检测帧的滚动量，把上次的检测框整体平移后复用。
+
+    Args:
+        interval: 重新检测的帧间隔
+        downscale: 估计滚动量时的缩小倍数
+        min_response: 相位相关的最小响应值，低于它认为估计不可靠，需要重新检测
+    """
+
+    def __init__(self, interval: int = 15, downscale: int = 4, min_response: float = 0.1):
+        self.interval = interval
+        self.downscale = downscale
+        self.min_response = min_response
+        self.age = 0  # 距上次检测的帧数
+        self.room: Optional[Tuple[int, int]] = None
+        self._results = None  # 上次检测的 Results
+        self._reference: Optional[np.ndarray] = None
+        self._window: Optional[np.ndarray] = None
+
+    def _digest(self, img: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(img[::self.downscale, ::self.downscale], cv2.COLOR_BGR2GRAY)
+        gray = gray.astype(np.float32)
+        if self._window is None or self._window.shape != gray.shape:
+            self._window = cv2.createHanningWindow(gray.shape[::-1], cv2.CV_32F)
+        return gray
+
+    def need_update(self, room: Optional[Tuple[int, int]] = None) -> bool:
+        """
+        是否需要重新运行障碍物模型
+
+        Args:
+            room: 小地图识别的当前房间，(-1, -1) 或 None 表示未识别，不视为换房间
+        """
+        if self._results is None or self.age >= self.interval:
+            return True
+        return room is not None and room != (-1, -1) and room != self.room
+
+    def update(self, results_obstacle, img: np.ndarray, room: Optional[Tuple[int, int]] = None):
+        """记录新的检测结果和对应的帧"""
+        self._results = results_obstacle[0] if results_obstacle else None
+        self._reference = self._digest(img)
+        self.age = 0
+        if room is not None and room != (-1, -1):
+            self.room = room
+
+    def shifted(self, img: np.ndarray):
+        """
+        按镜头滚动平移上次的检测框
+
+        Returns:
+            与 model.predict 返回格式一致的 [Results]，滚动量估计不可靠时返回None
+        """
+        if self._results is None:
+            return None
+        self.age += 1
+        if len(self._results.boxes) == 0:
+            return [self._results]
+        (dx, dy), response = cv2.phaseCorrelate(self._reference, self._digest(img), self._window)
+        if response < self.min_response:
+            return None
+        dx, dy = dx * self.downscale, dy * self.downscale
+        data = self._results.boxes.data
+        data = data.clone() if hasattr(data, 'clone') else data.copy()
+        data[:, 0] += dx
+        data[:, 2] += dx
+        data[:, 1] += dy
+        data[:, 3] += dy
+        result = self._results.new()
+        result.update(boxes=data)
+        return [result]
+
+    def reset(self):
+        """清除缓存，下一帧一定重新检测（进入新地图时调用）"""
+        self._results = None
+        self._reference = None
+        self.room = None
+        self.age = 0
+
+
+if __name__ == '__main__':
+    import sys
+
+    import torch
+    from ultralytics import YOLO
+
+    if sys.argv[1] == 'compare':
+        # 用法: python -m dnf.inference compare <模型> <录制目录> [尺寸...]
+        # 在录制的帧上对比不同输入尺寸的耗时和门/掉落物召回率，尺寸写作 640 或 384x640
+        from utils.session_recorder import RecordingReader
+
+        reader = RecordingReader(sys.argv[3])
+        frames = [np.array(reader.frame(i)) for i in range(len(reader))]
+        sizes = [parse_imgsz(t) for t in sys.argv[4:]] or [640] + [rect_imgsz(long_side=s) for s in (640, 608, 576)]
+        yolo = YOLO(sys.argv[2])
+        dev = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+        for row in compare_input_sizes(yolo, frames, sizes, dev,
+                                       classes=('door', 'door-boss', 'loot', 'gold', 'hero')):
+            recall = ', '.join(f'{k} {v:.3f}' if v is not None else f'{k} -' for k, v in row['recall'].items())
+            print(f'imgsz={row["imgsz"]}: {row["ms"]:.1f}ms/帧, 召回率: {recall}')
+        sys.exit(0)
+
+    if sys.argv[1] == 'fast':
+        # 用法: python -m dnf.inference fast <模型> [图片]
+        # 对比 model.predict 与 FastPredictor 的单帧耗时，以及去掉的 Python 开销
+        yolo = YOLO(sys.argv[2])
+        img = cv2.imread(sys.argv[3]) if len(sys.argv) > 3 else np.random.randint(0, 255, (600, 1067, 3), np.uint8)
+        dev = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+        size = rect_imgsz()
+        fast = FastPredictor(yolo, dev, size)
+        n = 100
+
+        def _timed(fn):
+            for _ in range(5):
+                fn()
+            if dev.type == 'cuda':
+                torch.cuda.synchronize()
+            t0 = time.perf_counter()
+            for _ in range(n):
+                out = fn()
+            if dev.type == 'cuda':
+                torch.cuda.synchronize()
+            return (time.perf_counter() - t0) / n * 1000, out
+
+        slow_ms, slow_res = _timed(lambda: yolo.predict(source=img, device=dev, imgsz=size, conf=0.7, iou=0.2,
+                                                        verbose=False))
+        fast_ms, fast_res = _timed(lambda: fast.predict(img))
+        with torch.inference_mode():
+            net_ms, _ = _timed(lambda: fast.backend(fast._input))
+        a, b = boxes_to_numpy(slow_res[0].boxes.data), boxes_to_numpy(fast_res[0].boxes.data)
+        same = len(a) == len(b) and (len(a) == 0 or np.abs(a - b).max() < 1.0)
+        print(f'model.predict: {slow_ms:.2f}ms, FastPredictor: {fast_ms:.2f}ms, 网络本身: {net_ms:.2f}ms')
+        print(f'去掉的开销: {slow_ms - fast_ms:.2f}ms/帧，检测框一致: {same}')
+        sys.exit(0)
+
+    # 用法: python -m dnf.inference <主模型> <障碍物模型> [图片]
+    # 在 CPU 上对比串行、并发、并发且每个模型只用一半线程时的单帧延迟
+    main_weights, obstacle_weights = sys.argv[1], sys.argv[2]
+    if len(sys.argv) > 3:
+        import cv2
+        frame = cv2.imread(sys.argv[3])
+    else:
+        frame = np.random.randint(0, 255, (600, 1067, 3), dtype=np.uint8)
+
+    cpu = torch.device('cpu')
+    m1, m2 = YOLO(main_weights), YOLO(obstacle_weights)
+    n = 30
+    threads = torch.get_num_threads()
+    for concurrent_mode, num_threads in ((False, threads), (True, threads), (True, max(1, threads // 2))):
+        torch.set_num_threads(num_threads)
+        runner = DualModelRunner(m1, m2, cpu, concurrent=concurrent_mode)
+        for _ in range(3):
+            runner.predict(frame)  # 预热
+        t0 = time.perf_counter()
+        for _ in range(n):
+            runner.predict(frame)
+        ms = (time.perf_counter() - t0) / n * 1000
+        runner.shutdown()
+        print(f'{"并发" if concurrent_mode else "串行"} torch线程{num_threads}: {ms:.1f}ms/帧 ({1000 / ms:.1f} FPS)')
+    torch.set_num_threads(threads)
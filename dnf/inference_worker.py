@@ -0,0 +1,334 @@
+# -*- coding:utf-8 -*-
+"""
+独立进程推理模块 - YOLO 在单独的进程中推理，帧和检测框通过共享内存传递
+
+键盘监听、小地图/技能栏的 OpenCV 分析、loguru 日志和 Qt 界面与推理共用一个解释器时，
+推理前后处理里的 Python 代码要和它们抢 GIL，单帧耗时会出现尖峰。
+InferenceWorker 把模型放进子进程：帧写入共享内存槽位，检测框写回另一组共享内存槽位，
+管道里只传 (槽位, 序号, 框数) 这样的小元组，不序列化图像。
+predict() 与 YOLO.predict() 的调用方式和返回值兼容，可以直接交给 DualModelRunner。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import multiprocessing as mp
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from dnf.detection import boxes_to_numpy
+from utils.shm_ring import SharedArrayRing
+
+
+def load_worker_predictor(weights: str, device: str = 'cpu', imgsz: Any = (384, 640), backend: str = 'auto',
+                          threads: int = 0, fast: bool = True, conf: float = 0.7, iou: float = 0.2):
+    """
+    在子进程中加载并预热模型（默认的加载函数）
+
+    Args:
+        与 load_detector / FastPredictor 的参数一致
+    """
+    from dnf.inference import FastPredictor, warmup
+    from dnf.onnx_backend import OnnxDetector, load_detector
+
+    model = load_detector(weights, device, imgsz, backend, threads)
+    warmup(model, device, imgsz)
+    if fast and not isinstance(model, OnnxDetector):
+        model = FastPredictor(model, device, imgsz, conf=conf, iou=iou)
+    return model
+
+
+def _worker_main(conn, frame_spec: Tuple, box_spec: Tuple, loader: Callable, loader_kwargs: Dict[str, Any],
+                 imgsz: Any, device: str):
+    """子进程入口：加载模型后循环处理 (槽位, 序号, 高, 宽, conf, iou) 请求，收到None退出"""
+    frames = SharedArrayRing.attach(*frame_spec)
+    boxes = SharedArrayRing.attach(*box_spec)
+    max_det = boxes.shape[0]
+    try:
+        predictor = loader(**loader_kwargs)
+    except Exception as e:
+        conn.send(('error', f'模型加载失败: {e}'))
+        return
+    conn.send(('ready', getattr(predictor, 'names', None)))
+    try:
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            slot, seq, h, w, conf, iou = msg
+            t0 = time.perf_counter()
+            try:
+                results = predictor.predict(source=frames[slot][:h, :w], device=device, imgsz=imgsz,
+                                            conf=conf, iou=iou, verbose=False)
+                data = boxes_to_numpy(results[0].boxes.data) if results else np.empty((0, 6), np.float32)
+            except Exception as e:
+                conn.send(('error', slot, seq, str(e)))
+                continue
+            n = min(len(data), max_det)
+            boxes[slot][:n] = data[:n]
+            conn.send(('done', slot, seq, n, time.perf_counter() - t0))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        frames.close()
+        boxes.close()
+
+
+class InferenceWorker:
+    """
+    独立进程推理
+
+    子进程以 spawn 方式启动，会重新导入启动脚本，启动脚本的入口需要放在 if __name__ == '__main__' 之下。
+
+    Args:
+        weights: 模型路径
+        device: 推理设备
+        imgsz: 输入尺寸
+        backend: 推理后端（同 load_detector）
+        threads: ONNX Runtime 线程数
+        fast: torch 后端使用 FastPredictor
+        conf: 默认置信度阈值
+        iou: 默认 NMS 的 IoU 阈值
+        frame_shape: 帧槽位的形状，不超过它的帧都可以推理
+        slots: 槽位数，>1 时 submit() 可以在上一帧推理期间提交下一帧
+        max_det: 每帧最多返回的框数
+        loader: 子进程中加载模型的函数（需可被 pickle 的模块级函数），默认 load_worker_predictor
+        loader_kwargs: 传给 loader 的参数，None 时由上面的参数组成
+    """
+
+    def __init__(self, weights: Optional[str] = None, device: Any = 'cpu', imgsz: Any = (384, 640),
+                 backend: str = 'auto', threads: int = 0, fast: bool = True, conf: float = 0.7, iou: float = 0.2,
+                 frame_shape: Sequence[int] = (600, 1067, 3), slots: int = 2, max_det: int = 300,
+                 loader: Optional[Callable] = None, loader_kwargs: Optional[Dict[str, Any]] = None):
+        self.device = str(device)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.loader = loader or load_worker_predictor
+        self.loader_kwargs = loader_kwargs if loader_kwargs is not None else dict(
+            weights=weights, device=self.device, imgsz=imgsz, backend=backend, threads=threads,
+            fast=fast, conf=conf, iou=iou)
+        self.names = None
+        self._frames = SharedArrayRing(slots, frame_shape, np.uint8)
+        self._boxes = SharedArrayRing(slots, (max_det, 6), np.float32)
+        self._free = list(range(slots))
+        self._done: Dict[int, Tuple[np.ndarray, float]] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._process = None
+        self.infer_time = 0.0  # 最近一帧在子进程中的推理耗时（秒）
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def start(self, timeout: float = 300.0) -> 'InferenceWorker':
+        """启动子进程并等待模型加载完成"""
+        if self._process is not None:
+            return self
+        ctx = mp.get_context('spawn')
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(target=_worker_main, name='InferenceWorker', daemon=True,
+                                    args=(child_conn, self._frames.spec, self._boxes.spec, self.loader,
+                                          self.loader_kwargs, self.imgsz, self.device))
+        self._process.start()
+        child_conn.close()
+        msg = self._recv(timeout)
+        if msg[0] != 'ready':
+            self.close()
+            raise RuntimeError(f"推理进程启动失败: {msg[1]}")
+        self.names = msg[1]
+        return self
+
+    def to(self, device):
+        return self
+
+    def _recv(self, timeout: Optional[float]):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._conn.poll(0.1):
+            if not self._process.is_alive():
+                raise RuntimeError(f"推理进程已退出，退出码 {self._process.exitcode}")
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("等待推理进程超时")
+        return self._conn.recv()
+
+    def _receive_one(self, timeout: Optional[float]):
+        """收一条推理结果，拷出检测框并归还槽位（调用方持有 self._lock）"""
+        msg = self._recv(timeout)
+        if msg[0] == 'error':
+            _, slot, seq, error = msg
+            self._free.append(slot)
+            self._done[seq] = (None, error)
+            return
+        _, slot, seq, n, elapsed = msg
+        self._done[seq] = (self._boxes[slot][:n].copy(), elapsed)
+        self._free.append(slot)
+
+    def submit(self, img: np.ndarray, conf: Optional[float] = None, iou: Optional[float] = None,
+               timeout: Optional[float] = 10.0) -> int:
+        """
+        把一帧写入共享内存并提交推理，没有空闲槽位时先等一帧完成（可以从多个线程调用）
+
+        Returns:
+            序号，传给 collect() 取结果
+        """
+        h, w = img.shape[:2]
+        fh, fw = self._frames.shape[:2]
+        if h > fh or w > fw or img.shape[2:] != self._frames.shape[2:]:
+            raise ValueError(f"帧尺寸 {img.shape} 超出共享内存槽位 {self._frames.shape}")
+        with self._lock:
+            while not self._free:
+                self._receive_one(timeout)
+            slot = self._free.pop()
+            self._frames[slot][:h, :w] = img
+            seq = self._seq
+            self._seq += 1
+            self._conn.send((slot, seq, h, w, self.conf if conf is None else conf,
+                             self.iou if iou is None else iou))
+        return seq
+
+    def collect(self, seq: int, timeout: Optional[float] = 10.0) -> np.ndarray:
+        """
+        取 submit() 提交的一帧的检测框（可以从多个线程调用，收到的别的序号的结果留给对应的调用方）
+
+        Returns:
+            (N, 6) float32 检测框，与 results[0].boxes.data 布局一致
+        """
+        with self._lock:
+            while seq not in self._done:
+                self._receive_one(timeout)
+            data, info = self._done.pop(seq)
+        if data is None:
+            raise RuntimeError(f"推理进程处理出错: {info}")
+        self.infer_time = info
+        return data
+
+    def detect(self, img: np.ndarray, conf: Optional[float] = None, iou: Optional[float] = None) -> np.ndarray:
+        """同步推理一帧，返回 (N, 6) 检测框"""
+        return self.collect(self.submit(img, conf, iou))
+
+    def predict(self, source: np.ndarray, device=None, imgsz: Any = None, conf: Optional[float] = None,
+                iou: Optional[float] = None, verbose: bool = False, **kwargs) -> List[Any]:
+        """
+        与 YOLO.predict() 兼容的推理入口，device/imgsz 被忽略（子进程启动时确定）
+
+        Returns:
+            [Results]，只有一项
+        """
+        from ultralytics.engine.results import Results
+
+        data = self.detect(source, conf, iou)
+        return [Results(orig_img=source, path='', names=self.names, boxes=data)]
+
+    def close(self, timeout: float = 5.0):
+        """通知子进程退出并删除共享内存，可重复调用"""
+        if self._process is not None:
+            try:
+                self._conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join(1.0)
+            self._conn.close()
+            self._process = None
+        self._frames.unlink()
+        self._boxes.unlink()
+
+
+class _SyntheticPredictor:
+    """基准测试用的模拟模型：一部分耗时释放 GIL（卷积/矩阵运算），一部分持有 GIL（Python 前后处理）"""
+
+    names = {0: 'hero'}
+
+    def __init__(self, native_ms: float = 15.0, python_ms: float = 5.0):
+        self.native_ms = native_ms
+        self.python_ms = python_ms
+
+    def predict(self, source, conf=0.7, **kwargs):
+        time.sleep(self.native_ms / 1000)  # 原生代码执行期间不持有 GIL
+        end = time.perf_counter() + self.python_ms / 1000
+        while time.perf_counter() < end:
+            pass
+        data = np.tile(np.array([[100, 200, 150, 300, conf, 0]], dtype=np.float32), (5, 1))
+        return [SimpleNamespace(boxes=SimpleNamespace(data=data))]
+
+
+def _synthetic_loader(**kwargs):
+    return _SyntheticPredictor()
+
+
+def latency_percentiles(latencies: Sequence[float]) -> Tuple[float, float]:
+    """(p50, p99)，单位毫秒"""
+    values = np.asarray(latencies) * 1000
+    return float(np.percentile(values, 50)), float(np.percentile(values, 99))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # 用法: python -m dnf.inference_worker <模型.pt 或 synthetic> [--frames 200] [--load-threads 2] [--recording 目录]
+    # 后台开几个线程模拟小地图分析、日志、界面等持有 GIL 的 Python 负载，
+    # 对比模型在本进程推理和在独立进程推理时的单帧延迟 p50/p99
+    parser = argparse.ArgumentParser(description='独立进程推理的单帧延迟对比')
+    parser.add_argument('weights')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--load-threads', type=int, default=2)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--imgsz', default='384x640')
+    parser.add_argument('--recording', default=None)
+    args = parser.parse_args()
+
+    synthetic = args.weights == 'synthetic'
+    imgsz = tuple(int(v) for v in args.imgsz.split('x'))
+    if args.recording:
+        from utils.session_recorder import RecordingReader
+        reader = RecordingReader(args.recording)
+        frames = [np.array(reader.frame(i % len(reader))) for i in range(min(args.frames, len(reader)))]
+    else:
+        frames = [np.random.default_rng(0).integers(0, 255, (600, 1067, 3), dtype=np.uint8)]
+
+    stop = threading.Event()
+
+    def python_load():
+        # 模拟持有 GIL 的 Python 代码：逐像素循环、日志格式化等
+        while not stop.is_set():
+            sum(i * i for i in range(20000))
+            time.sleep(0.001)
+
+    def run(detect: Callable[[np.ndarray], np.ndarray]) -> Tuple[float, float]:
+        """两种方式都以拿到 (N, 6) 检测框为准计时"""
+        detect(frames[0])
+        latencies = []
+        for i in range(args.frames):
+            t0 = time.perf_counter()
+            detect(frames[i % len(frames)])
+            latencies.append(time.perf_counter() - t0)
+        return latency_percentiles(latencies)
+
+    loader = _synthetic_loader if synthetic else load_worker_predictor
+    loader_kwargs = {} if synthetic else dict(weights=args.weights, device=args.device, imgsz=imgsz)
+    workers = [threading.Thread(target=python_load, daemon=True) for _ in range(args.load_threads)]
+    for t in workers:
+        t.start()
+    try:
+        model = loader(**loader_kwargs)
+        p50, p99 = run(lambda img: boxes_to_numpy(model.predict(
+            source=img, device=args.device, imgsz=imgsz, conf=0.7, iou=0.2, verbose=False)[0].boxes.data))
+        print(f'本进程推理:   p50 {p50:.1f}ms  p99 {p99:.1f}ms')
+        del model
+        with InferenceWorker(device=args.device, imgsz=imgsz, loader=loader, loader_kwargs=loader_kwargs) as worker:
+            p50, p99 = run(worker.detect)
+        print(f'独立进程推理: p50 {p50:.1f}ms  p99 {p99:.1f}ms')
+    finally:
+        stop.set()
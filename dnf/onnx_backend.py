@@ -0,0 +1,313 @@
+# -*- coding:utf-8 -*-
+"""
+ONNX Runtime 推理后端 - 没有可用 GPU 时代替 ultralytics+torch 在 CPU 上推理
+
+把 weights/*.pt 导出为固定输入尺寸的 ONNX 模型，用 ONNX Runtime 推理，
+预处理（letterbox）和 NMS 与 ultralytics 一致，返回同样的 [Results]，
+analyse_det_result、检测框合并、障碍物降频复用都不需要改动。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import ast
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+from ultralytics.engine.results import Results
+
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+
+MAX_WH = 7680  # 按类别做 NMS 时各类别框的坐标偏移，与 ultralytics 一致
+
+
+def imgsz_hw(imgsz: Any) -> Tuple[int, int]:
+    return (imgsz, imgsz) if isinstance(imgsz, int) else (int(imgsz[0]), int(imgsz[1]))
+
+
+def parse_imgsz(text: str) -> Any:
+    """命令行参数的输入尺寸：'640' -> 640，'384x640' -> (384, 640)"""
+    if 'x' in text:
+        h, w = text.split('x')
+        return int(h), int(w)
+    return int(text)
+
+
+def onnx_path_for(weights: str, imgsz: Any = 640, int8: bool = False) -> str:
+    """导出的 ONNX 文件路径，文件名带输入尺寸（换尺寸后会重新导出），INT8 模型带 _int8 后缀"""
+    h, w = imgsz_hw(imgsz)
+    return f'{os.path.splitext(weights)[0]}_{h}x{w}{"_int8" if int8 else ""}.onnx'
+
+
+def export_onnx(weights: str, imgsz: Any = 640, opset: int = 12, force: bool = False) -> str:
+    """
+    把 ultralytics 的 .pt 模型导出为 ONNX（固定输入尺寸、batch=1）
+
+    Args:
+        weights: .pt 模型路径
+        imgsz: 输入尺寸，int 或 (高, 宽)
+        opset: ONNX opset 版本
+        force: 已存在且比 .pt 新时也重新导出
+
+    Returns:
+        ONNX 文件路径
+    """
+    target = onnx_path_for(weights, imgsz)
+    if not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(weights):
+        return target
+
+    from ultralytics import YOLO
+
+    logger.info(f"导出ONNX模型: {weights} -> {target}")
+    exported = YOLO(weights).export(format='onnx', imgsz=list(imgsz_hw(imgsz)), opset=opset,
+                                    simplify=True, dynamic=False, device='cpu')
+    if os.path.abspath(exported) != os.path.abspath(target):
+        os.replace(exported, target)
+    return target
+
+
+def default_threads() -> int:
+    """默认线程数：逻辑核心数的一半（近似物理核心数），超线程对卷积几乎没有收益"""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def letterbox(img: np.ndarray, new_shape: Tuple[int, int], out: Optional[np.ndarray] = None
+              ) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    等比缩放并用灰色(114)填充到 new_shape，与 ultralytics LetterBox(auto=False) 一致
+
+    Args:
+        img: BGR 图像
+        new_shape: (高, 宽)
+        out: 复用的输出缓冲 (高, 宽, 3)，None 时新建
+
+    Returns:
+        (填充后的图像, 缩放比例, (左侧填充, 顶部填充))
+    """
+    h0, w0 = img.shape[:2]
+    h, w = new_shape
+    r = min(h / h0, w / w0)
+    new_unpad = (int(round(w0 * r)), int(round(h0 * r)))
+    dw, dh = (w - new_unpad[0]) / 2, (h - new_unpad[1]) / 2
+    top, left = int(round(dh - 0.1)), int(round(dw - 0.1))
+
+    if out is None:
+        out = np.empty((h, w, 3), dtype=np.uint8)
+    out[...] = 114
+    if (w0, h0) != new_unpad:
+        img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
+    out[top:top + new_unpad[1], left:left + new_unpad[0]] = img
+    return out, r, (left, top)
+
+
+def preprocess(img: np.ndarray, imgsz: Tuple[int, int], canvas: Optional[np.ndarray] = None,
+               out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    BGR 帧转为模型输入：letterbox、BGR HWC uint8 -> RGB CHW float32 [0, 1]
+
+    Args:
+        img: BGR 图像
+        imgsz: 输入尺寸 (高, 宽)
+        canvas: 复用的 letterbox 缓冲 (高, 宽, 3)
+        out: 复用的输入缓冲 (1, 3, 高, 宽)
+
+    Returns:
+        (模型输入, 缩放比例, (左侧填充, 顶部填充))
+    """
+    canvas, ratio, pad = letterbox(img, imgsz, canvas)
+    if out is None:
+        out = np.empty((1, 3, *imgsz), dtype=np.float32)
+    np.multiply(canvas[..., ::-1].transpose(2, 0, 1), 1 / 255.0, out=out[0], casting='unsafe')
+    return out, ratio, pad
+
+
+def postprocess(pred: np.ndarray, conf: float, iou: float, ratio: float, pad: Tuple[int, int],
+                orig_shape: Tuple[int, int], max_det: int = 300) -> np.ndarray:
+    """
+    YOLOv8/11 检测头输出解码 + 按类别 NMS，坐标还原到原图
+
+    Args:
+        pred: 模型输出 (4 + 类别数, 锚点数)，前4行为 cx, cy, w, h
+        conf: 置信度阈值
+        iou: NMS 的 IoU 阈值
+        ratio: letterbox 缩放比例
+        pad: letterbox (左侧填充, 顶部填充)
+        orig_shape: 原图 (高, 宽)
+        max_det: 最多保留的框数
+
+    Returns:
+        (N, 6) float32 的 x1, y1, x2, y2, conf, cls，按置信度降序
+    """
+    pred = pred.T
+    scores_all = pred[:, 4:]
+    cls = scores_all.argmax(axis=1)
+    scores = scores_all[np.arange(len(cls)), cls]
+    keep = scores > conf
+    if not keep.any():
+        return np.zeros((0, 6), dtype=np.float32)
+    boxes, scores, cls = pred[keep, :4], scores[keep], cls[keep]
+
+    xyxy = np.empty_like(boxes)
+    xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+    xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+
+    # 各类别的框平移到互不重叠的区域，一次 NMS 完成按类别抑制
+    shifted = xyxy + (cls * MAX_WH)[:, None]
+    nms_boxes = np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1)
+    idx = cv2.dnn.NMSBoxes(nms_boxes.tolist(), scores.tolist(), conf, iou, top_k=max_det)
+    idx = np.asarray(idx, dtype=np.int64).reshape(-1)[:max_det]
+
+    xyxy = xyxy[idx]
+    xyxy[:, [0, 2]] -= pad[0]
+    xyxy[:, [1, 3]] -= pad[1]
+    xyxy /= ratio
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, orig_shape[1])
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, orig_shape[0])
+    return np.concatenate([xyxy, scores[idx, None], cls[idx, None].astype(np.float32)], axis=1).astype(np.float32)
+
+
+class OnnxDetector:
+    """
+    ONNX Runtime 检测模型，predict() 与 ultralytics YOLO.predict() 的调用方式和返回值兼容
+
+    Args:
+        onnx_path: 导出的 ONNX 模型
+        intra_op_threads: 单个算子使用的线程数，0 表示按物理核心数自动选择
+        names: 类别名，None 时读取导出时写入的元数据
+    """
+
+    def __init__(self, onnx_path: str, intra_op_threads: int = 0, names: Optional[Dict[int, str]] = None):
+        if not ORT_AVAILABLE:
+            raise ImportError("未安装 onnxruntime，请执行 pip install onnxruntime")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads or default_threads()
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = tuple(self.session.get_inputs()[0].shape[2:4])
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = names if names is not None else ast.literal_eval(meta.get('names', '{}'))
+        # 输入缓冲只分配一次
+        self._canvas = np.empty((*self.imgsz, 3), dtype=np.uint8)
+        self._input = np.empty((1, 3, *self.imgsz), dtype=np.float32)
+
+    def to(self, device):
+        """与 YOLO.to() 兼容，ONNX Runtime 只在 CPU 上运行"""
+        return self
+
+    def infer(self, img: np.ndarray, conf: float = 0.25, iou: float = 0.7) -> np.ndarray:
+        """
+        推理一帧
+
+        Returns:
+            (N, 6) 检测框，与 results[0].boxes.data 布局一致
+        """
+        inputs, ratio, pad = preprocess(img, self.imgsz, self._canvas, self._input)
+        pred = self.session.run(None, {self.input_name: inputs})[0][0]
+        return postprocess(pred, conf, iou, ratio, pad, img.shape[:2])
+
+    def predict(self, source: np.ndarray, device=None, imgsz: Any = None, conf: float = 0.25,
+                iou: float = 0.7, verbose: bool = False, **kwargs) -> List[Any]:
+        """
+        与 YOLO.predict() 兼容的推理入口，device/imgsz 被忽略（输入尺寸在导出时确定）
+
+        Returns:
+            [Results]，只有一项
+        """
+        data = self.infer(source, conf, iou)
+        return [Results(orig_img=source, path='', names=self.names, boxes=data)]
+
+
+def load_onnx_model(weights: str, imgsz: Any = 640, intra_op_threads: int = 0, int8: bool = False) -> OnnxDetector:
+    """
+    导出（如需要）并加载 ONNX 模型
+
+    Args:
+        int8: 加载 python -m dnf.quantize 生成的 INT8 模型，不存在时退回 FP32 模型
+    """
+    if int8:
+        quantized = onnx_path_for(weights, imgsz, int8=True)
+        if os.path.exists(quantized):
+            return OnnxDetector(quantized, intra_op_threads)
+        logger.warning(f"没有找到INT8模型 {quantized}，使用FP32模型（先运行 python -m dnf.quantize 生成）")
+    return OnnxDetector(export_onnx(weights, imgsz), intra_op_threads)
+
+
+def use_onnx_backend(backend: str, device) -> bool:
+    """
+    是否使用 ONNX Runtime 推理
+
+    Args:
+        backend: 'torch' / 'onnx' / 'onnx-int8' / 'auto'（设备为 CPU 且安装了 onnxruntime 时使用）
+        device: 选定的 torch 设备
+    """
+    if backend in ('onnx', 'onnx-int8'):
+        return True
+    return backend == 'auto' and getattr(device, 'type', str(device)) == 'cpu' and ORT_AVAILABLE
+
+
+def load_detector(weights: str, device, imgsz: Any = 640, backend: str = 'auto', intra_op_threads: int = 0):
+    """
+    按推理后端加载检测模型
+
+    Returns:
+        OnnxDetector 或已移动到 device 的 ultralytics YOLO，两者 predict() 用法相同；
+        ONNX 模型导出或加载失败时返回 YOLO，调用方用 isinstance(model, OnnxDetector) 判断
+    """
+    if use_onnx_backend(backend, device):
+        try:
+            return load_onnx_model(weights, imgsz, intra_op_threads, int8=backend == 'onnx-int8')
+        except Exception as e:
+            # 导出需要 onnx/onnxslim，权重目录也可能不可写；失败时照常用 torch 推理
+            logger.error(f"加载ONNX模型失败，改用torch推理: {e}")
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    model.to(device)
+    return model
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    import torch
+    from ultralytics import YOLO
+
+    from dnf.detection import box_iou, boxes_to_numpy
+
+    # 用法: python -m dnf.onnx_backend <模型.pt> [图片] [线程数]
+    # 在 CPU 上对比 torch 与 ONNX Runtime 的单帧耗时和检测框
+    pt_weights = sys.argv[1]
+    frame = cv2.imread(sys.argv[2]) if len(sys.argv) > 2 else np.random.randint(0, 255, (600, 1067, 3), np.uint8)
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    size = (384, 640)
+    n = 30
+
+    torch_model = YOLO(pt_weights)
+    onnx_model = load_onnx_model(pt_weights, size, threads)
+    timings = {}
+    outputs = {}
+    for name, m in (('torch', torch_model), ('onnxruntime', onnx_model)):
+        for _ in range(3):
+            m.predict(source=frame, device='cpu', imgsz=size, conf=0.7, iou=0.2, verbose=False)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            res = m.predict(source=frame, device='cpu', imgsz=size, conf=0.7, iou=0.2, verbose=False)
+        timings[name] = (time.perf_counter() - t0) / n * 1000
+        outputs[name] = boxes_to_numpy(res[0].boxes.data)
+        print(f'{name}: {timings[name]:.1f}ms/帧, {len(outputs[name])} 个框')
+
+    a, b = outputs['torch'], outputs['onnxruntime']
+    if len(a) and len(b):
+        print(f'torch 检测框在 ONNX 结果中的最大 IoU 均值: {box_iou(a, b).max(axis=1).mean():.4f}')
+    print(f'加速比: {timings["torch"] / timings["onnxruntime"]:.2f}x (torch 线程数 {torch.get_num_threads()})')
@@ -0,0 +1,242 @@
+# -*- coding:utf-8 -*-
+"""
+INT8 量化模块 - 用录制的游戏帧做静态量化校准，并对比量化前后的精度和耗时
+
+流程：.pt 导出 FP32 ONNX -> 用 recordings 中的帧校准 -> 生成 *_int8.onnx，
+再在没有参与校准的帧上以 FP32 模型的检测结果为基准，统计 INT8 模型各类别的精确率/召回率。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import os
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from dnf.detection import box_iou, boxes_to_numpy
+from dnf.onnx_backend import export_onnx, imgsz_hw, onnx_path_for, parse_imgsz, preprocess
+from utils.session_recorder import RecordingReader
+
+try:
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    QUANTIZATION_AVAILABLE = True
+except ImportError:
+    CalibrationDataReader = object
+    QUANTIZATION_AVAILABLE = False
+
+
+def find_recordings(paths: Sequence[str]) -> List[str]:
+    """展开录制目录：既可以是录制目录本身，也可以是包含多个录制目录的 recordings 根目录"""
+    found = []
+    for path in paths:
+        if RecordingReader.is_recording(path):
+            found.append(path)
+            continue
+        for name in sorted(os.listdir(path)):
+            sub = os.path.join(path, name)
+            if os.path.isdir(sub) and RecordingReader.is_recording(sub):
+                found.append(sub)
+    return found
+
+
+def iter_frames(record_dirs: Sequence[str], parity: Optional[int] = None, max_frames: int = 0
+                ) -> Iterator[np.ndarray]:
+    """
+    依次读取录制帧
+
+    Args:
+        record_dirs: 录制目录
+        parity: 0 只取偶数帧，1 只取奇数帧，None 取全部（校准和评估用不同的帧）
+        max_frames: 最多读取的帧数，0 表示不限制，超过时在所有帧中均匀抽取
+    """
+    index = []
+    readers = [RecordingReader(d) for d in record_dirs]
+    for r, reader in enumerate(readers):
+        index.extend((r, i) for i in range(len(reader)) if parity is None or i % 2 == parity)
+    if max_frames and len(index) > max_frames:
+        picks = np.linspace(0, len(index) - 1, max_frames).round().astype(int)
+        index = [index[i] for i in picks]
+    for r, i in index:
+        yield np.array(readers[r].frame(i))
+
+
+class RecordingCalibrationReader(CalibrationDataReader):
+    """
+    用录制帧做量化校准的数据源，预处理与推理时完全一致
+
+    Args:
+        record_dirs: 录制目录
+        input_name: 模型输入名
+        imgsz: 模型输入尺寸 (高, 宽)
+        max_frames: 校准帧数
+    """
+
+    def __init__(self, record_dirs: Sequence[str], input_name: str, imgsz: Tuple[int, int], max_frames: int = 200):
+        self.record_dirs = list(record_dirs)
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.max_frames = max_frames
+        self._frames: Optional[Iterator[np.ndarray]] = None
+        self.rewind()
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        frame = next(self._frames, None)
+        if frame is None:
+            return None
+        inputs, _, _ = preprocess(frame, self.imgsz)
+        return {self.input_name: inputs}
+
+    def rewind(self):
+        self._frames = iter_frames(self.record_dirs, parity=0, max_frames=self.max_frames)
+
+
+def _head_nodes(onnx_path: str) -> List[str]:
+    """检测头（最后一层 /model.N/）的节点名，量化它们会明显降低框的精度"""
+    import onnx
+
+    nodes = onnx.load(onnx_path).graph.node
+    layer = [int(m.group(1)) for n in nodes for m in [re.match(r'/model\.(\d+)/', n.name)] if m]
+    if not layer:
+        return []
+    prefix = f'/model.{max(layer)}/'
+    return [n.name for n in nodes if n.name.startswith(prefix)]
+
+
+def quantize_int8(weights: str, record_dirs: Sequence[str], imgsz: Any = (384, 640), max_frames: int = 200,
+                  per_channel: bool = True, keep_head_fp32: bool = True) -> str:
+    """
+    静态 INT8 量化（QDQ 格式，权重 per-channel int8，激活 uint8，MinMax 校准）
+
+    Args:
+        weights: .pt 模型路径
+        record_dirs: 校准用的录制目录
+        imgsz: 输入尺寸
+        max_frames: 校准帧数
+        per_channel: 权重按通道量化
+        keep_head_fp32: 检测头保持 FP32
+
+    Returns:
+        INT8 模型路径
+    """
+    if not QUANTIZATION_AVAILABLE:
+        raise ImportError("未安装 onnxruntime，请执行 pip install onnxruntime onnx")
+    import onnxruntime as ort
+
+    fp32_path = export_onnx(weights, imgsz)
+    prepared = fp32_path.replace('.onnx', '_prep.onnx')
+    quant_pre_process(fp32_path, prepared, skip_symbolic_shape=True)
+    input_name = ort.InferenceSession(prepared, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    target = onnx_path_for(weights, imgsz, int8=True)
+    reader = RecordingCalibrationReader(record_dirs, input_name, imgsz_hw(imgsz), max_frames)
+    t0 = time.perf_counter()
+    try:
+        quantize_static(prepared, target, reader, quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        per_channel=per_channel, calibrate_method=CalibrationMethod.MinMax,
+                        nodes_to_exclude=_head_nodes(prepared) if keep_head_fp32 else None)
+    finally:
+        os.remove(prepared)
+    logger.info(f"INT8量化完成: {target}，耗时 {time.perf_counter() - t0:.1f}秒")
+    return target
+
+
+def match_counts(reference: np.ndarray, candidate: np.ndarray, cls_id: int, match_iou: float = 0.5
+                 ) -> Tuple[int, int, int]:
+    """
+    单帧单类别的匹配数：按置信度从高到低贪心匹配
+
+    Returns:
+        (匹配数, 候选框数, 基准框数)
+    """
+    ref = reference[reference[:, 5] == cls_id]
+    cand = candidate[candidate[:, 5] == cls_id]
+    if len(ref) == 0 or len(cand) == 0:
+        return 0, len(cand), len(ref)
+    cand = cand[np.argsort(-cand[:, 4])]
+    iou = box_iou(cand, ref)
+    used = np.zeros(len(ref), dtype=bool)
+    tp = 0
+    for row in iou:
+        row = np.where(used, -1.0, row)
+        j = int(row.argmax())
+        if row[j] >= match_iou:
+            used[j] = True
+            tp += 1
+    return tp, len(cand), len(ref)
+
+
+def evaluate(reference_model, candidate_model, frames: Sequence[np.ndarray], conf: float = 0.7,
+             iou: float = 0.2, match_iou: float = 0.5) -> Dict[str, Any]:
+    """
+    以 reference_model（FP32）的检测结果为基准，统计 candidate_model（INT8）各类别的精确率/召回率和耗时
+
+    Returns:
+        {'reference_ms', 'candidate_ms', 'classes': {类别名: {'precision', 'recall', 'support'}}}
+    """
+    outputs, timings = [], []
+    for m in (reference_model, candidate_model):
+        m.predict(source=frames[0], conf=conf, iou=iou, verbose=False)  # 预热
+        boxes, elapsed = [], 0.0
+        for frame in frames:
+            t0 = time.perf_counter()
+            results = m.predict(source=frame, conf=conf, iou=iou, verbose=False)
+            elapsed += time.perf_counter() - t0
+            boxes.append(boxes_to_numpy(results[0].boxes.data))
+        outputs.append(boxes)
+        timings.append(elapsed / len(frames) * 1000)
+
+    names = reference_model.names
+    report = {'reference_ms': timings[0], 'candidate_ms': timings[1], 'classes': {}}
+    for cls_id, cls_name in (names.items() if isinstance(names, dict) else enumerate(names)):
+        tp = n_cand = n_ref = 0
+        for ref, cand in zip(*outputs):
+            t, c, r = match_counts(ref, cand, cls_id, match_iou)
+            tp, n_cand, n_ref = tp + t, n_cand + c, n_ref + r
+        if n_ref or n_cand:
+            report['classes'][cls_name] = {
+                'precision': tp / n_cand if n_cand else None,
+                'recall': tp / n_ref if n_ref else None,
+                'support': n_ref,
+            }
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from dnf.onnx_backend import OnnxDetector
+
+    # 用法: python -m dnf.quantize <模型.pt> <录制目录或recordings根目录...> [--imgsz 384x640]
+    # 偶数帧用于校准，奇数帧用于评估，输出 INT8 相对 FP32 的各类别精确率/召回率和单帧耗时
+    parser = argparse.ArgumentParser(description='录制帧校准的 INT8 静态量化')
+    parser.add_argument('weights')
+    parser.add_argument('recordings', nargs='+')
+    parser.add_argument('--imgsz', default='384x640')
+    parser.add_argument('--calib-frames', type=int, default=200)
+    parser.add_argument('--eval-frames', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=0)
+    args = parser.parse_args()
+
+    size = parse_imgsz(args.imgsz)
+    dirs = find_recordings(args.recordings)
+    if not dirs:
+        raise SystemExit(f'没有找到录制目录: {args.recordings}')
+    int8_path = quantize_int8(args.weights, dirs, size, args.calib_frames)
+
+    eval_frames = list(iter_frames(dirs, parity=1, max_frames=args.eval_frames))
+    fp32 = OnnxDetector(onnx_path_for(args.weights, size), args.threads)
+    int8 = OnnxDetector(int8_path, args.threads)
+    result = evaluate(fp32, int8, eval_frames)
+    print(f'评估 {len(eval_frames)} 帧: FP32 {result["reference_ms"]:.1f}ms/帧, '
+          f'INT8 {result["candidate_ms"]:.1f}ms/帧 ({result["reference_ms"] / result["candidate_ms"]:.2f}x)')
+    for cls_name, row in result['classes'].items():
+        p = '-' if row['precision'] is None else f'{row["precision"]:.3f}'
+        r = '-' if row['recall'] is None else f'{row["recall"]:.3f}'
+        print(f'  {cls_name:<14} 精确率 {p}  召回率 {r}  基准框数 {row["support"]}')
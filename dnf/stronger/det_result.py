@@ -25,6 +25,8 @@ class DetResult:
         self.shop_mystery_exist = False
         self.sss_exist = False
 
+        self.track_ids = {}  # 跟踪编号 {属性名: 与坐标列表一一对应的编号}
+
     # 定义 __str__ 方法，方便打印对象信息
     def __str__(self):
         return (f"DetResult(\n"
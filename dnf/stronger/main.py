@@ -64,6 +64,7 @@ from dnf.stronger.player import (
     process_mystery_shop,
     activity_live,
     do_recognize_fatigue,
+    FATIGUE_ROI,
     receive_mail,
     close_new_day_dialog
 )
@@ -88,16 +89,30 @@ from utils import window_utils as window_utils
 from utils.custom_thread_pool_executor import SingleTaskThreadPool
 from utils.fixed_length_queue import FixedLengthQueue
 from utils.keyboard_move_controller import MovementController
-from utils.utilities import plot_one_box
 from utils.window_utils import WindowCapture, capture_window_image
+from utils.frame_source import ReplayFrameSource
+from utils.session_recorder import SessionRecorder
+from utils.capture_thread import CaptureThread
+from utils.roi_capture import RegionCapture
+from utils.frame_change import FrameChangeDetector
+from utils.performance import FrameRateGovernor
+from utils.pipeline import LatestSlot, PipelineStage, StageStats
+from dnf.inference import DualModelRunner, FastPredictor, ObstacleScheduler
+from dnf.inference_worker import InferenceWorker
+from dnf.tracker import MultiTracker
+from dnf.hero_filter import HeroFilter
+from dnf.onnx_backend import OnnxDetector, default_threads, load_detector, use_onnx_backend
+from dnf.detection import DetAnalyser, DetectionMerger, boxes_to_numpy, draw_boxes
 from dnf.stronger.path_finder import PathFinder
+from dnf.stronger.minimap_state import MinimapState
+from dnf.stronger.minimap_watcher import MinimapWatcher
 from dnf.stronger.movement_helper import move_to_target, calculate_move_direction, is_in_range
 from utils.utilities import match_template_by_roi
 from utils.mail_sender import EmailSender
 from dnf.mail_config import config as mail_config
 from dnf.stronger.object_detect import object_detection_cv
 from utils.utilities import hex_to_bgr
-from dnf.stronger.skill_util import get_skill_initial_images
+from dnf.stronger.skill_util import get_skill_initial_images, SKILL_BAR_ROI
 
 temp = pathlib.PosixPath
 pathlib.PosixPath = pathlib.WindowsPath
@@ -142,13 +157,70 @@ enable_uniform_pl = False
 uniform_default_fatigue_reserved = 180
 # uniform_default_fatigue_reserved = /0
 
+# 录制会话回放目录，不为None时用录制的帧代替实时截图（基准测试/回归测试用）
+replay_session_dir = None
+
+# 录制最近的帧和检测结果（内存映射环形文件，不做图像编码），卡住/死亡时导出到 recordings 目录
+record_session = False
+record_capacity = 600  # 保留的帧数，1067*600的帧约1.9MB/帧
+
+# 以下后台线程、推理加速的开关默认关闭，在实机上逐个开启验证后再改默认值
+
+# 后台线程持续截图，打怪循环直接取最新帧，截图与推理重叠执行
+capture_in_background = False
+capture_fps = 30  # 后台截图的最大帧率
+# 推理和检测结果整理放到单独的线程（需要开启后台截图），按键时的 sleep 不再拖慢截图和推理，
+# 决策总是拿最新一帧的检测结果，旧结果直接丢弃；注意拿到的结果可能是上一次按键之前截的帧
+pipeline_inference = False
+
+# 小地图/技能栏/疲劳值只截取对应区域，各区域的刷新频率（0 表示每次都重新截取）
+minimap_fps = 10
+skill_bar_fps = 20
+
+# 小地图由后台线程持续增量分析，门口决策直接读最新的分析结果，不再现场截图，分析失败时也不 sleep 重试
+minimap_in_background = False
+minimap_watch_fps = 20  # 后台读取小地图的频率
+
+# 画面没有变化时（结算、商店、加载、站在门口）复用上一次的检测结果，跳过模型推理
+skip_static_frames = False
+static_frame_max_age = 10  # 最多连续复用的帧数
+
+# 障碍物不会移动，障碍物模型只在换房间或每隔N帧重新检测，其余帧按镜头滚动平移上次的结果，0 表示每帧都检测
+obstacle_interval = 0
+
+# 没有怪物时（走向门口、捡材料）每N帧运行一次检测，其余帧用目标跟踪外推位置，1 表示每帧都检测
+track_detect_interval = 1
+
+# 角色位置滤波：平滑检测抖动，并结合当前按键方向外推到按键生效的时刻，减少过门、捡材料时走过头
+smooth_hero = False
+hero_key_latency = 0.03  # 从决策到按键生效的延迟（秒）
+
+# 推理输入尺寸，640 表示正方形输入（与原来一致）；(384, 640) 为 (高, 宽)，按 1067x600 画面比例对齐到32的倍数，减少填充
+# 换尺寸前用 python -m dnf.inference compare <模型> <录制目录> 对比耗时和门/掉落物召回率
+inference_imgsz = 640
+
+# 推理后端: 'torch' / 'onnx' / 'onnx-int8' / 'auto'（没有可用 GPU 且安装了 onnxruntime 时，导出 ONNX 并用 ONNX Runtime 推理）
+# 'onnx-int8' 使用 python -m dnf.quantize 在录制帧上校准生成的 INT8 模型，不存在时退回 FP32
+inference_backend = 'torch'
+onnx_threads = 0  # ONNX Runtime 单个模型的线程数，0 表示按核心数自动选择
+
+# 预热后直接调用网络推理（预分配输入张量、固定阈值 NMS），绕过 model.predict 每次调用的开销，只对 torch 后端生效
+fast_predictor = False
+
+# 模型放到独立进程推理，帧和检测框通过共享内存传递，避免与键盘监听、小地图分析、界面抢 GIL 造成单帧耗时尖峰
+# 开启前用 python -m dnf.inference_worker <模型> 对比本进程和独立进程推理的单帧延迟 p50/p99
+inference_in_worker = False
+
 from model_loader import get_stronger_model_path
 weights = get_stronger_model_path()  # 模型存放的位置
 # <<<<<<<<<<<<<<<< 运行时相关的参数 <<<<<<<<<<<<<<<<
 
 #  >>>>>>>>>>>>>>>> 脚本所需要的变量 >>>>>>>>>>>>>>>>
-# 每秒最大处理帧数XX
+# 每秒最大处理帧数XX（打怪阶段）
 max_fps = 10
+# 各阶段的目标帧率：打怪用 max_fps，捡材料、走向门口、结算/商店时降低帧率，减少推理占用的CPU/GPU
+# 推理耗时超过帧间隔的预算时自动降频，耗时恢复后逐步回到目标帧率
+phase_fps = {'attack': max_fps, 'pickup': 10, 'next_room': 6, 'settlement': 3}
 
 # 游戏窗口位置
 x, y = 0, 0
@@ -200,6 +272,8 @@ color_purple = (255, 0, 255)  # 紫色
 model = None
 model_obstacle = None  # 障碍物检测模型
 device = None
+inference_runner = None  # 主模型与障碍物模型并发推理
+detection_merger = DetectionMerger()  # 合并障碍物模型的检测结果
 from model_loader import get_obstacle_model_path
 weights_obstacle = get_obstacle_model_path()
 
@@ -232,7 +306,7 @@ def _select_best_gpu():
 
 def get_model():
     """延迟加载YOLO模型"""
-    global model, model_obstacle, device
+    global model, model_obstacle, device, inference_runner
     if model is None:
         import time as _time
         t0 = _time.time()
@@ -241,37 +315,64 @@ def get_model():
         device, device_name = _select_best_gpu()
         logger.info(f"选择计算设备: {device} ({device_name})")
         
-        # 加载主模型并移动到指定设备
-        logger.info("正在加载主推理模型...")
-        model = YOLO(weights)
-        model.to(device)
-        
-        # 加载障碍物检测模型并移动到同一设备
-        if os.path.exists(weights_obstacle):
-            logger.info("正在加载障碍物模型...")
-            model_obstacle = YOLO(weights_obstacle)
-            model_obstacle.to(device)
-        
-        # 模型预热，让首次推理更快
-        logger.info("模型预热中...")
-        dummy_img = np.zeros((640, 640, 3), dtype=np.uint8)
-        model.predict(source=dummy_img, device=device, verbose=False)
-        if model_obstacle:
-            model_obstacle.predict(source=dummy_img, device=device, verbose=False)
+        # 两个模型并发推理，CPU 上各分一半线程
+        has_obstacle = os.path.exists(weights_obstacle)
+        threads = onnx_threads or max(1, default_threads() // (2 if has_obstacle else 1))
+        if use_onnx_backend(inference_backend, device):
+            logger.info(f"使用 ONNX Runtime 推理，每个模型 {threads} 线程")
+
+        if inference_in_worker:
+            # 每个模型一个推理进程，子进程中完成加载和预热
+            logger.info("正在启动推理进程...")
+            model = InferenceWorker(weights, device, inference_imgsz, inference_backend, threads,
+                                    fast_predictor, conf=0.7, iou=0.2).start()
+            if has_obstacle:
+                model_obstacle = InferenceWorker(weights_obstacle, device, inference_imgsz, inference_backend,
+                                                 threads, fast_predictor, conf=0.5, iou=0.2).start()
+            main_predictor, obstacle_predictor = model, model_obstacle
+        else:
+            # 加载主模型并移动到指定设备
+            logger.info("正在加载主推理模型...")
+            model = load_detector(weights, device, inference_imgsz, inference_backend, threads)
+
+            # 加载障碍物检测模型并移动到同一设备
+            if has_obstacle:
+                logger.info("正在加载障碍物模型...")
+                model_obstacle = load_detector(weights_obstacle, device, inference_imgsz, inference_backend, threads)
+
+            # 模型预热，让首次推理更快（预热尺寸与推理输入一致）
+            logger.info("模型预热中...")
+            main_predictor, obstacle_predictor = model, model_obstacle
+            if fast_predictor:
+                # 创建时会先预热，再取出网络直接调用（ONNX 模型加载失败时退回的是 torch 模型，按实际类型判断）
+                if not isinstance(model, OnnxDetector):
+                    main_predictor = FastPredictor(model, device, inference_imgsz, conf=0.7, iou=0.2)
+                if model_obstacle and not isinstance(model_obstacle, OnnxDetector):
+                    obstacle_predictor = FastPredictor(model_obstacle, device, inference_imgsz, conf=0.5, iou=0.2)
+        inference_runner = DualModelRunner(main_predictor, obstacle_predictor, device, imgsz=inference_imgsz)
+        inference_runner.warmup()
         logger.info(f"模型加载完成，使用设备: {device} ({device_name})，耗时: {_time.time()-t0:.1f}秒")
     return model, device
 
 
 def _release_models():
     """释放模型显存，防止内存泄漏"""
-    global model, model_obstacle, device
+    global model, model_obstacle, device, inference_runner
     import gc
     
+    if inference_runner is not None:
+        inference_runner.shutdown()
+        inference_runner = None
+
     if model is not None:
+        if isinstance(model, InferenceWorker):
+            model.close()
         del model
         model = None
     
     if model_obstacle is not None:
+        if isinstance(model_obstacle, InferenceWorker):
+            model_obstacle.close()
         del model_obstacle
         model_obstacle = None
     
@@ -419,6 +520,7 @@ monster_h = 57  # 普通怪高度处理
 em_h = 100  # 精英怪高度处理
 door_h = 32  # 门高度处理
 loot_h = 0  # 掉落物高度处理
+det_analyser = DetAnalyser(names, monster_h, door_h, loot_h)  # 检测框整理
 
 attack_x = 300  # 打怪命中范围，x轴距离
 attack_y = 90  # 打怪命中范围，y轴距离
@@ -436,6 +538,10 @@ img_executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
 tool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
 mail_sender = EmailSender(mail_config)  # 初始化邮件发送器
 stop_signal = [False]
+recorder = None  # 会话录制器
+capture_thread = None  # 后台截图线程
+detection_stage = None  # 流水线的推理阶段线程
+minimap_watcher = None  # 小地图后台分析线程
 
 # 创建一个队列，用于主线程和展示线程之间的通信（maxsize=2避免堆积）
 result_queue = queue.Queue(maxsize=2)
@@ -859,131 +965,14 @@ def self_handle_stuck(hero_x, hero_y, kbd_current_direction, door_xywh_list, doo
 def analyse_det_result(results, hero_height, img):
     global show
     if results is not None and len(results):
-        boss_xywh_list = []
-        monster_xywh_list = []
-        elite_monster_xywh_list = []
-
-        loot_xywh_list = []
-        gold_xywh_list = []
-        door_xywh_list = []
-        door_boss_xywh_list = []
-        obstacle_xywh_list = []
-
-        hero_conf = -1
-        hero_xywh = None
-
-        card_num = 0
-        continue_exist = False
-        shop_exist = False
-        shop_mystery_exist = False
-        menu_exist = False
-        sss_exist = False
-
-        result = results[0]
-        for box in result.boxes:
-            cls = int(box.cls)
-            xywh = box.xywh[0].tolist()
-            xyxy = box.xyxy[0].tolist()
-            conf = box.conf[0]
-
-            # 高度处理
-            if names[cls] == "hero":
-                xywh[1] += hero_height
-
-                if conf > hero_conf:  # 找一个置信度最大的hero,记录索引
-                    hero_conf = conf
-                    hero_xywh = xywh
-
-            if names[cls] == "boss":
-                # xywh[1] += b_h
-                xywh[1] = xyxy[3] - 20
+        # 检测框只拷回主机一次，按类别整体计算
+        data = boxes_to_numpy(results[0].boxes.data)
+        res = det_analyser.analyse(data, hero_height, DetResult())
+        hero_xywh = res.hero_xywh
 
-                boss_xywh_list.append(xywh)
-
-            if names[cls] == "monster":
-                xywh[1] += monster_h
-
-                monster_xywh_list.append(xywh)
-
-            if names[cls] == "elite-monster":
-                # xywh[1] += em_h
-                xywh[1] = xyxy[3] - 20
-
-                elite_monster_xywh_list.append(xywh)
-
-            if names[cls] == "door":
-                xywh[1] += door_h
-
-                door_xywh_list.append(xywh)
-
-            if names[cls] == "door-boss":
-                xywh[1] += door_h
-
-                door_boss_xywh_list.append(xywh)
-
-            if names[cls] == "loot":
-                xywh[1] += loot_h
-                # 处理半拉子框的情况
-                if xywh[2] > 111 and xywh[3] < 110:
-                    if (xyxy[1] + 60) > xywh[1]:
-                        xywh[1] = xyxy[1] + 60
-                loot_xywh_list.append(xywh)
-
-            if names[cls] == 'gold':
-                xywh[1] += loot_h
-                if xywh[2] > 111 and xywh[3] < 110:
-                    if (xyxy[1] + 60) > xywh[1]:
-                        xywh[1] = xyxy[1] + 60
-
-                gold_xywh_list.append(xywh)
-
-            if names[cls] == "continue":
-                continue_exist = True
-
-            if names[cls] == "card":
-                card_num = card_num + 1
-
-            if names[cls] == "shop":
-                shop_exist = True
-
-            if names[cls] == "shop-mystery":
-                shop_mystery_exist = True
-
-            if names[cls] == "menu":
-                menu_exist = True
-
-            if names[cls] == "sss":
-                sss_exist = True
-
-            if names[cls] == "obstacle":
-                obstacle_xywh_list.append(xywh)
-
-            # 在原图上画框
-            if show and img is not None:
-                label = '%s %.2f' % (names[int(cls)], conf)
-                # plot_one_box(box.xyxy[0], img, label=label, color=colors[int(cls)], line_thickness=2)
-                # plot_one_box(box.xyxy[0], img, label=label, color=hex_to_bgr(name_colors[int(cls)]['color']), line_thickness=2)
-                plot_one_box(box.xyxy[0], img, label=label, color=name_colors[int(cls)], line_thickness=2)
-
-        res = DetResult()
-        res.monster_xywh_list = monster_xywh_list
-        res.elite_monster_xywh_list = elite_monster_xywh_list
-        res.boss_xywh_list = boss_xywh_list
-        res.loot_xywh_list = loot_xywh_list
-        res.gold_xywh_list = gold_xywh_list
-        res.door_xywh_list = door_xywh_list
-        res.door_boss_xywh_list = door_boss_xywh_list
-        res.obstacle_xywh_list = obstacle_xywh_list
-
-        res.hero_xywh = hero_xywh
-        # res.hero_conf = hero_conf
-
-        res.card_num = card_num
-        res.continue_exist = continue_exist
-        res.shop_exist = shop_exist
-        res.shop_mystery_exist = shop_mystery_exist
-        res.menu_exist = menu_exist
-        res.sss_exist = sss_exist
+        # 在原图上画框
+        if show and img is not None:
+            draw_boxes(img, data, names, name_colors)
 
         # 给角色绘制定位圆点,方便查看
         if show:
@@ -1079,42 +1068,23 @@ def judge_is_target_door(current_room, door_box, hero_box, next_room_direction,
     return False
 
 
-def minimap_analyse(capturer):
-    # 分析小地图
-    cols, rows = 0, 0
-    cur_row, cur_col = 0, 0
-    map_crop = None
-    boss_room = (-1, -1)
-    current_room = (-1, -1)
+def minimap_analyse(regions):
+    # 分析小地图，只截取小地图区域
+    state = MinimapState()
     map_error_cnt = 0
     analyse_map_error = True
     while analyse_map_error:
         try:
-            img0 = capturer.capture()
-
-            # 分析小地图的行列
-            cols = map_util.get_colum_count(img0)
-            rows = map_util.get_row_count(img0)
-            # logger.warning("分析小地图的行列{},{}", rows, cols)
-
-            # 裁剪小地图区域
-            map_crop = map_util.get_small_map_region_img(img0, rows, cols)
-
-            # 获取boss房间位置，0基
-            boss_room = map_util.get_boss_from_crop(map_crop, rows, cols)
-            # logger.info('boss房间是 {}', boss_room)
-            current_room = map_util.current_room_index_cropped(map_crop, rows, cols)  # 实际上没有用，只是打印看一下位置
-            # logger.info('当前房间是 {}', current_room)
-            cur_row, cur_col = current_room
+            # 行列、boss房间(0基)、当前房间
+            state.analyse(regions.grab('minimap'))
         except Exception as e:
             logger.error(e)
             traceback.print_exc()
 
-        analyse_map_error = boss_room is None or current_room is None or boss_room == (-1, -1) or current_room == (
-        -1, -1)
+        analyse_map_error = not state.ready
         if analyse_map_error:
             map_error_cnt = map_error_cnt + 1
-            # cv2.imwrite(f'errorDetectMap_init_{map_error_cnt}.jpg', img0)
+            # cv2.imwrite(f'errorDetectMap_init_{map_error_cnt}.jpg', map_img)
             # logger.error(f"分析小地图的行列init，第 {map_error_cnt} 次出错,行列是 {rows} , {cols}")
             # logger.error("暂停2秒继续重试！！")
             time.sleep(0.2)
@@ -1124,7 +1094,7 @@ def minimap_analyse(capturer):
         if analyse_map_error and map_error_cnt > 20:
             logger.error("分析小地图的行列init多次出错了 废了！！！")
             return None
-    return boss_room, (rows, cols), current_room
+    return state.boss_room, (state.rows, state.cols), state.current_room
 
 
 def adjust_stutter_alarm(start_time,role_name,role_no,fight_count,handle):
@@ -1170,6 +1140,8 @@ def adjust_stutter_alarm(start_time,role_name,role_no,fight_count,handle):
             # 再次释放确保干净
             mover._release_all_keys()
             time.sleep(0.2)
+            # 导出卡住前的录制帧
+            tool_executor.submit(_dump_recording, 'stuck')
             # 用pynput按键，和技能按键一样的方式
             kbu.do_press_with_time(dnf.Key_collect_role, 300, 200)
             logger.info(f'已按下 numpad_7 键，返回上一地图')
@@ -1195,12 +1167,23 @@ def adjust_stutter_alarm(start_time,role_name,role_no,fight_count,handle):
             return
 
 
+def _dump_recording(reason):
+    """导出录制的最近帧，卡住/死亡后用 ReplayFrameSource 回放分析"""
+    if recorder is None:
+        return
+    try:
+        dump_dir = recorder.dump(reason)
+        if dump_dir:
+            logger.warning(f"已导出最近的录制帧: {dump_dir}")
+    except Exception as e:
+        logger.error(f"导出录制失败: {e}")
 
 
 # <<<<<<<<<<<<<<<< 方法定义 <<<<<<<<<<<<<<<<
 
 def main_script():
-    global x, y, handle, show, game_mode, stop_signal, stop_be_pressed
+    global x, y, handle, show, game_mode, stop_signal, stop_be_pressed, recorder, capture_thread, detection_stage, \
+        minimap_watcher
     # ################### 主流程开始 ###############################
     start_time = datetime.now()
     logger.info("_____________________准备_____________________")
@@ -1230,6 +1213,26 @@ def main_script():
         
         # 释放模型显存，防止内存泄漏
         _release_models()
+
+        # 停止推理阶段（先于截图线程停止，释放它持有的帧）
+        if detection_stage is not None:
+            detection_stage.stop()
+            detection_stage = None
+
+        # 停止小地图后台分析（它通过截图对象截取小地图区域）
+        if minimap_watcher is not None:
+            minimap_watcher.stop()
+            minimap_watcher = None
+
+        # 停止后台截图
+        if capture_thread is not None:
+            capture_thread.stop()
+            capture_thread = None
+
+        # 关闭会话录制
+        if recorder is not None:
+            recorder.close()
+            recorder = None
         
         # 脚本正常执行完,不是被组合键中断的,并且配置了退出游戏
         if not stop_be_pressed and quit_game_after_finish:
@@ -1247,7 +1250,8 @@ def main_script():
 
 
 def _run_main_script():
-    global x, y, handle, show, game_mode, stop_signal, stop_be_pressed, display_thread
+    global x, y, handle, show, game_mode, stop_signal, stop_be_pressed, display_thread, recorder, capture_thread, \
+        detection_stage, minimap_watcher
     
     # 加载模型（延迟加载，首次调用时才真正加载）
     model, device = get_model()
@@ -1262,7 +1266,36 @@ def _run_main_script():
     logger.info("获取游戏窗口位置和大小...{},{},{},{}", x, y, width, height)
     window_utils.resize_window(handle)
     logger.warning("矫正窗口大小:1067*600")
-    capturer = WindowCapture(handle)
+    if replay_session_dir:
+        capturer = ReplayFrameSource(replay_session_dir)
+        logger.warning(f"使用录制会话回放代替实时截图: {replay_session_dir}")
+    else:
+        # 后台截图时多一个槽位给截图线程持有的最新帧
+        capturer = WindowCapture(handle, ring_slots=4 if capture_in_background else 3)
+
+    # 后台截图
+    if capture_in_background and capture_thread is None:
+        capture_thread = CaptureThread(capturer, capture_fps)
+        capture_thread.start()
+        logger.info(f"后台截图已开启，最大{capture_fps}帧/秒")
+
+    # 小区域截图，不必整窗截图
+    regions = RegionCapture(capturer)
+    regions.add('minimap', map_util.minimap_roi(capturer.width), minimap_fps)
+    regions.add('skill_bar', SKILL_BAR_ROI, skill_bar_fps)
+    regions.add('fatigue', FATIGUE_ROI)
+
+    # 小地图后台分析
+    if minimap_in_background and minimap_watcher is None:
+        minimap_watcher = MinimapWatcher(lambda: regions.grab('minimap'), minimap_watch_fps)
+        minimap_watcher.start()
+        logger.info(f"小地图后台分析已开启，{minimap_watch_fps}次/秒")
+
+    # 会话录制
+    if record_session and recorder is None:
+        recorder = SessionRecorder(os.path.join(config_.project_base_path, 'recordings', 'live_stronger'),
+                                   capturer.width, capturer.height, record_capacity)
+        logger.info(f"会话录制已开启，保留最近{record_capacity}帧")
 
     # 获取角色配置列表
     role_list = get_role_config_list(account_code, use_json=use_json_config)
@@ -1367,7 +1400,7 @@ def _run_main_script():
         logger.info(f'设置的拥有疲劳值: {role.fatigue_all}')
 
         # ocr_fatigue = do_ocr_fatigue_retry(handle, x, y, reader, 5)
-        ocr_fatigue = do_recognize_fatigue(capturer.capture())
+        ocr_fatigue = do_recognize_fatigue(regions.grab('fatigue'), FATIGUE_ROI[:2])
         logger.info(f'识别的拥有疲劳值: {ocr_fatigue}')
         if ocr_fatigue is not None:
             if role.fatigue_all != ocr_fatigue:
@@ -1407,7 +1440,7 @@ def _run_main_script():
             # 默认是站在赛丽亚房间
 
             # 获取技能栏截图
-            skill_images = get_skill_initial_images(capturer.capture())
+            skill_images = get_skill_initial_images(regions.grab('skill_bar'), SKILL_BAR_ROI[:2])
 
             if game_mode != 2:
                 # N 点第一个
@@ -1464,6 +1497,8 @@ def _run_main_script():
         fight_count = 0
         # 角色刷完结束
         finished = False
+        # 目标跟踪在整个角色的刷图过程中复用，进图、换房间时清除轨迹
+        det_tracker = MultiTracker() if track_detect_interval > 1 else None
 
         # todo 循环进图开始>>>>>>>>>>>>>>>>>>>>>>>>
         # 一直循环
@@ -1479,7 +1514,7 @@ def _run_main_script():
             try:
                 t1 = time.time()
                 time.sleep(0.2)
-                load_map_task = tool_executor.submit(minimap_analyse, capturer)
+                load_map_task = tool_executor.submit(minimap_analyse, regions)
                 load_map_success = load_map_task.result(timeout=5)
                 if load_map_success:
                     logger.info(f"地图加载完成！{(time.time() - t1):.2f}s")
@@ -1498,7 +1533,7 @@ def _run_main_script():
             one_game_start = time.time()
             # # 记录疲劳值
             # current_fatigue_ocr = do_ocr_fatigue_retry(handle, x, y, reader, 5)  # 识别疲劳值
-            current_fatigue_ocr = do_recognize_fatigue(capturer.capture())  # 识别疲劳值
+            current_fatigue_ocr = do_recognize_fatigue(regions.grab('fatigue'), FATIGUE_ROI[:2])  # 识别疲劳值
             logger.info(f'当前还有疲劳值(识别): {current_fatigue_ocr}')
 
             global continue_pressed
@@ -1516,10 +1551,14 @@ def _run_main_script():
             else:
                 logger.info(f'不需要上Buff..')
 
-            # 分析小地图
+            # 分析小地图，本局的行列、boss房间缓存在 minimap_state 里，之后只增量更新变化的格子
+            minimap_state = MinimapState()
+            if minimap_watcher is not None:
+                # 后台线程丢弃上一局的布局，重新完整分析
+                minimap_watcher.reset()
+            minimap = minimap_state  # 本局读取小地图结果的对象，后台分析时为最新快照
             cols, rows = 0, 0
             cur_row, cur_col = 0, 0
-            map_crop = None
             boss_room = (-1, -1)
             current_room = (-1, -1)
 
@@ -1527,34 +1566,31 @@ def _run_main_script():
             analyse_map_error = True
             while analyse_map_error:
                 try:
-                    img0 = capturer.capture()
-
-                    # 分析小地图的行列
-                    cols = map_util.get_colum_count(img0)
-                    rows = map_util.get_row_count(img0)
+                    if minimap_watcher is not None:
+                        minimap = minimap_watcher.wait_ready(timeout=1)
+                    else:
+                        minimap_state.analyse(regions.grab('minimap'))
+                    rows, cols = minimap.rows, minimap.cols
                     logger.warning("分析小地图的行列{},{}", rows, cols)
 
-                    # 裁剪小地图区域
-                    map_crop = map_util.get_small_map_region_img(img0, rows, cols)
-
                     # 获取boss房间位置，0基
-                    boss_room = map_util.get_boss_from_crop(map_crop, rows, cols)
+                    boss_room = minimap.boss_room
                     logger.info('boss房间是 {}', boss_room)
-                    current_room = map_util.current_room_index_cropped(map_crop, rows, cols)  # 实际上没有用，只是打印看一下位置
+                    current_room = minimap.current_room
                     logger.info('当前房间是 {}', current_room)
                     cur_row, cur_col = current_room
                 except Exception as e:
                     logger.error(e)
                     traceback.print_exc()
 
-                analyse_map_error = boss_room is None or current_room is None or boss_room == (
-                -1, -1) or current_room == (-1, -1)
+                analyse_map_error = not minimap.ready
                 if analyse_map_error:
                     map_error_cnt = map_error_cnt + 1
-                    # cv2.imwrite(f'errorDetectMap_init_{map_error_cnt}.jpg', img0)
+                    # cv2.imwrite(f'errorDetectMap_init_{map_error_cnt}.jpg', map_img)
                     logger.error(f"分析小地图的行列init，第 {map_error_cnt} 次出错,行列是 {rows} , {cols}")
                     logger.error("暂停2秒继续重试！！")
-                    safe_sleep(1)
+                    if minimap_watcher is None:
+                        safe_sleep(1)  # 后台分析时 wait_ready 已经等过了
                     if stop_be_pressed:
                         break
                 else:
@@ -1565,10 +1601,15 @@ def _run_main_script():
                     # cv2.imwrite(f'errorDetectMap_init_{map_error_cnt}.jpg', capturer.capture())
                     break
 
-            allow_directions = map_util.get_allow_directions(map_crop, cur_row, cur_col)
+            allow_directions = minimap.allow_directions()
 
             # 初始化
             finder = PathFinder(rows, cols, boss_room)
+            if minimap.ready:
+                # 小地图上所有已显示的房间一次建图，进图时就规划好到boss房间的路线
+                room_graph = minimap.room_graph()
+                finder.set_map_graph(room_graph.links)
+                logger.info(f"房间图 {room_graph.summary()}, 到boss房间的路线 {room_graph.route(current_room)}")
             stop_signal[0] = False  # 重置超时检测标志
             threading.Thread(target=adjust_stutter_alarm, args=(one_game_start,role.name,role.no,fight_count,handle)).start()
             logger.info(f'准备打怪..')
@@ -1593,97 +1634,182 @@ def _run_main_script():
             in_boss_room = False
             next_room_direction = None  # 下一个房间的方向，用于小卡处理
 
-            frame_time = time.time()
-            frame_interval = 1.0 / max_fps if max_fps else 0
+            frame_governor = FrameRateGovernor(phase_fps, default_fps=max_fps)
+            governor_log_time = time.time()
+            last_frame_seq = -1  # 后台截图时上一次处理的帧序号
+            frame_ref = None  # 本轮处理的帧，处理期间一直持有
+            frame_gate = FrameChangeDetector(max_age=static_frame_max_age) if skip_static_frames else None
+            last_results = None  # 上一次推理的检测结果，画面没有变化时复用
+            obstacle_scheduler = ObstacleScheduler(obstacle_interval) \
+                if obstacle_interval and model_obstacle is not None else None
+            if det_tracker is not None:
+                det_tracker.reset()  # 换地图，上一局的轨迹全部作废
+            last_det = None  # 上一帧的检测结果（检测或跟踪外推）
+            detect_skipped = 0  # 连续跳过检测的帧数
+            tracking_room = current_room  # 轨迹所属的房间
+            # 决策时小地图识别到换房间就设置，检测（流水线模式下在推理线程）开始前清除轨迹
+            tracking_reset = threading.Event()
+
+            def check_room_change(room):
+                """小地图识别到换房间时，通知检测丢弃上一个房间的轨迹，避免外推出上一个房间的门和掉落物"""
+                nonlocal tracking_room
+                if room != tracking_room:
+                    tracking_room = room
+                    tracking_reset.set()
+            hero_filter = HeroFilter() if smooth_hero else None
+
+            def detect_frame(frame_ref):
+                """
+                识别一帧：推理（或复用上次结果、跟踪外推）、合并障碍物、整理成 DetResult
+
+                Returns:
+                    (results, det, img4show)，没有识别到任何物体时 det 为None
+                """
+                nonlocal last_results, last_det, detect_skipped
+                img0 = frame_ref.img
+                if tracking_reset.is_set():
+                    tracking_reset.clear()
+                    if det_tracker is not None:
+                        det_tracker.reset()
+                    last_det = None
+                    detect_skipped = 0
+                # 只在需要展示时复制图像，减少CPU开销
+                img4show = img0.copy() if show else img0
+                # 没有怪物、也没有结算时，隔帧检测，中间的帧用跟踪外推
+                if det_tracker is not None and last_det is not None and last_det.hero_xywh and not sss_appeared \
+                        and detect_skipped < track_detect_interval - 1 \
+                        and not (last_det.monster_xywh_list or last_det.elite_monster_xywh_list
+                                 or last_det.boss_xywh_list):
+                    detect_skipped += 1
+                    # 翻牌、菜单、商店等标志位不参与跟踪，沿用上一次检测的值
+                    last_det = det_tracker.predict(frame_ref.timestamp, DetResult(), last_det)
+                    return last_results, last_det, img4show  # 本帧不检测，位置由跟踪外推
+                detect_skipped = 0
+                if frame_gate is not None and not frame_gate.should_infer(img0) and last_results is not None:
+                    # 画面没有变化，复用上一次的检测结果
+                    results = last_results
+                else:
+                    # 障碍物模型只在换房间或间隔到期时运行
+                    minimap_room = None
+                    with_obstacle = True
+                    if obstacle_scheduler is not None:
+                        try:
+                            if minimap_watcher is not None:
+                                minimap_room = minimap_watcher.snapshot().current_room
+                            else:
+                                map_crop_now = map_util.get_small_map_region_img(regions.get('minimap'), rows, cols)
+                                minimap_room = map_util.current_room_index_cropped(map_crop_now, rows, cols)
+                        except Exception as e:
+                            logger.debug(f"小地图识别当前房间失败: {e}")
+                        with_obstacle = obstacle_scheduler.need_update(minimap_room)
+
+                    # 主模型与障碍物模型并发推理
+                    infer_start = time.perf_counter()
+                    results, results_obstacle = inference_runner.predict(img0, with_obstacle=with_obstacle)
+                    frame_governor.record_inference(time.perf_counter() - infer_start)
+
+                    if obstacle_scheduler is not None:
+                        if with_obstacle:
+                            obstacle_scheduler.update(results_obstacle, img0, minimap_room)
+                        else:
+                            # 复用上次的障碍物，按镜头滚动平移
+                            results_obstacle = obstacle_scheduler.shifted(img0)
+                            if results_obstacle is None:
+                                # 滚动量估计不可靠，重新检测
+                                results_obstacle = inference_runner.predict_obstacle(img0)
+                                obstacle_scheduler.update(results_obstacle, img0, minimap_room)
+
+                    # 合并障碍物模型的结果：障碍物直接合并，门与主模型的门去重后合并
+                    detection_merger.merge_results(results, results_obstacle)
+
+                    last_results = results
+
+                # 录制原始帧和合并后的检测框
+                if recorder is not None:
+                    recorder.record(img0, results[0].boxes.data if results else None, current_room, hero_height)
+
+                if results is None or len(results) == 0 or len(results[0].boxes) == 0:
+                    # logger.info('模型没有识别到物体')
+                    return results, None, img4show
+
+                # 分析推理结果,组装类别数据
+                det = analyse_det_result(results, hero_height, img4show)
+                if det_tracker is not None:
+                    det_tracker.update(det, frame_ref.timestamp)
+                if hero_filter is not None and det.hero_xywh:
+                    hero_filter.update(det.hero_xywh, frame_ref.timestamp,
+                                       mover.get_current_direction(), mover.current_mode)
+                last_det = det
+                return results, det, img4show
+
+            # 流水线：推理阶段在自己的线程上按阶段帧率取最新帧识别，结果放入只保留最新一项的队列
+            detection_output = None
+            detection_seq = -1
+            if pipeline_inference and capture_thread is not None:
+                stage_frame_seq = -1
+
+                def next_frame(timeout):
+                    nonlocal stage_frame_seq
+                    frame_governor.wait()
+                    if not pause_event.wait(timeout):
+                        return None
+                    frame = capture_thread.get_latest(stage_frame_seq, timeout)
+                    if frame is not None:
+                        stage_frame_seq = frame.seq
+                    return frame
+
+                detection_output = LatestSlot(on_drop=lambda item: item[0].release())
+                detection_stage = PipelineStage('DetectionStage', next_frame,
+                                                lambda frame: (frame,) + detect_frame(frame),
+                                                detection_output, on_skip=lambda frame: frame.release())
+                detection_stage.start()
+            decide_stats = StageStats()  # 决策阶段每轮的耗时
+            decide_start = None
             while True:  # 循环打怪过图
+                if decide_start is not None:
+                    decide_stats.record(time.perf_counter() - decide_start)
+                    decide_start = None
                 # 检查停止标志
                 if stop_be_pressed:
                     logger.warning("检测到停止信号，退出打怪循环...")
                     break
-                
-                # 限制处理速率 - 精确等待到下一帧时间
-                if frame_interval:
-                    elapsed = time.time() - frame_time
-                    if elapsed < frame_interval:
-                        # 直接sleep剩余时间，避免频繁轮询
-                        time.sleep(frame_interval - elapsed)
-                    frame_time = time.time()
 
-                pause_event.wait()  # 暂停
+                if detection_output is None:
+                    # 限制处理速率 - 按当前阶段的帧率等待到下一帧时间（流水线模式下由推理阶段调度）
+                    frame_governor.wait()
 
-                # 截图
-                img0 = capturer.capture()
+                pause_event.wait()  # 暂停
 
+                # 截图，本轮处理期间持有该帧，识别线程另外持有一次，避免被后续截图覆盖
+                if frame_ref is not None:
+                    frame_ref.release()
+                    frame_ref = None
+                if detection_output is not None:
+                    # 取推理阶段最新的识别结果，连同对应的帧
+                    detection_seq, detection = detection_output.get_latest(detection_seq, timeout=1.0)
+                    if detection is None:
+                        continue
+                    frame_ref, results, det, img4show = detection
+                elif capture_thread is not None:
+                    # 直接取推理期间截好的最新帧
+                    frame_ref = capture_thread.get_latest(last_frame_seq, timeout=1.0)
+                    if frame_ref is None:
+                        continue
+                    last_frame_seq = frame_ref.seq
+                else:
+                    frame_ref = capturer.acquire()
+                img0 = frame_ref.img
+                decide_start = time.perf_counter()
 
                 # 识别
                 cv_det_task = None
                 if boss_appeared or in_boss_room or boss_door_appeared or game_mode == 2:
                     cv_det_task = img_executor.submit(object_detection_cv, img0)
-                # 只在需要展示时复制图像，减少CPU开销
-                img4show = img0.copy() if show else img0
-                # 执行推理
-                results = model.predict(
-                    source=img0,
-                    device=device,
-                    imgsz=640,
-                    conf=0.7,
-                    iou=0.2,
-                    verbose=False
-                )
-                
-                # 障碍物模型推理并合并结果
-                if model_obstacle is not None:
-                    results_obstacle = model_obstacle.predict(
-                        source=img0,
-                        device=device,
-                        imgsz=640,
-                        conf=0.5,
-                        iou=0.2,
-                        verbose=False
-                    )
-                    if results_obstacle and len(results_obstacle) > 0 and len(results_obstacle[0].boxes) > 0:
-                        obstacle_boxes = results_obstacle[0].boxes
-                        # 获取原模型识别的door位置，用于去重
-                        main_door_boxes = []
-                        if results and len(results) > 0:
-                            for j, main_cls in enumerate(results[0].boxes.cls):
-                                if int(main_cls) == 3:  # door
-                                    main_door_boxes.append(results[0].boxes.xyxy[j].tolist())
-                        
-                        for i, cls in enumerate(obstacle_boxes.cls):
-                            cls_id = int(cls)
-                            new_box = obstacle_boxes.data[i]
-                            
-                            # obstacle类别(14)直接合并
-                            if cls_id == 14:
-                                if results and len(results) > 0:
-                                    results[0].boxes.data = torch.cat([results[0].boxes.data, new_box.unsqueeze(0)], dim=0)
-                            
-                            # door类别(3)需要去重：检查是否和原模型的door重叠
-                            elif cls_id == 3:
-                                new_xyxy = obstacle_boxes.xyxy[i].tolist()
-                                is_duplicate = False
-                                for main_box in main_door_boxes:
-                                    # 计算IoU判断是否重叠
-                                    x1 = max(new_xyxy[0], main_box[0])
-                                    y1 = max(new_xyxy[1], main_box[1])
-                                    x2 = min(new_xyxy[2], main_box[2])
-                                    y2 = min(new_xyxy[3], main_box[3])
-                                    inter = max(0, x2 - x1) * max(0, y2 - y1)
-                                    area1 = (new_xyxy[2] - new_xyxy[0]) * (new_xyxy[3] - new_xyxy[1])
-                                    area2 = (main_box[2] - main_box[0]) * (main_box[3] - main_box[1])
-                                    iou = inter / (area1 + area2 - inter + 1e-6)
-                                    if iou > 0.3:  # IoU > 0.3 认为是同一个门
-                                        is_duplicate = True
-                                        break
-                                
-                                # 不重复的门才合并
-                                if not is_duplicate and results and len(results) > 0:
-                                    results[0].boxes.data = torch.cat([results[0].boxes.data, new_box.unsqueeze(0)], dim=0)
-                                    logger.debug(f"新模型补充识别到门，位置: {new_xyxy}")
+                    cv_det_task.add_done_callback(frame_ref.retain().release)
+                if detection_output is None:
+                    results, det, img4show = detect_frame(frame_ref)
 
-                if results is None or len(results) == 0 or len(results[0].boxes) == 0:
-                    # logger.info('模型没有识别到物体')
+                if det is None:
                     if not sss_appeared:
                         mover.move(target_direction=random.choice(kbu.single_direct))
                     continue
@@ -1695,8 +1821,23 @@ def _run_main_script():
                 #     result_queue.put(annotated_frame)
 
                 # print('results[0].boxes', results[0].boxes)
-                # 分析推理结果,组装类别数据
-                det = analyse_det_result(results, hero_height, img4show)
+                if hero_filter is not None and det.hero_xywh:
+                    # 截图时刻的位置外推到按键生效的时刻；回放时帧时间戳来自录制，不能和当前时间比较，从截图时刻算起
+                    now = time.monotonic() if replay_session_dir is None else frame_ref.timestamp
+                    det.hero_xywh = hero_filter.predict(now + hero_key_latency) or det.hero_xywh
+
+                # 按本帧看到的内容切换阶段，决定下一帧的等待时间
+                if sss_appeared or det.sss_exist or det.shop_exist or det.shop_mystery_exist:
+                    frame_governor.set_phase('settlement')
+                elif det.monster_xywh_list or det.elite_monster_xywh_list or det.boss_xywh_list:
+                    frame_governor.set_phase('attack')
+                elif det.loot_xywh_list or det.gold_xywh_list:
+                    frame_governor.set_phase('pickup')
+                elif det.door_xywh_list or det.door_boss_xywh_list:
+                    frame_governor.set_phase('next_room')
+                if time.time() - governor_log_time > 30:
+                    logger.debug(f"帧率调度: {frame_governor.summary()}")
+                    governor_log_time = time.time()
                 # logger.debug(f'det_res是什么 {det}')
                 # logger.debug(f'doors:{det.door_xywh_list}')
 
@@ -1752,6 +1893,7 @@ def _run_main_script():
                         if time.time() - die_time > 11:
                             die_time = time.time()
                             logger.warning(f"死亡提醒!!")
+                            tool_executor.submit(_dump_recording, 'death')
                             # 声音提醒 不要
                             # 邮件提醒
                             mode_name = (
@@ -1914,19 +2056,21 @@ def _run_main_script():
                             allow_directions = []
                             in_boss_room = False
                             try:
-                                img00 = capturer.capture()
-
-                                # 裁剪小地图区域
-                                map_crop = map_util.get_small_map_region_img(img00, rows, cols)
-                                # 当前房间位置
-                                current_room = map_util.current_room_index_cropped(map_crop, rows, cols)
+                                if minimap_watcher is not None:
+                                    # 后台线程分析好的最新结果，不截图、不等待
+                                    minimap = minimap_watcher.snapshot()
+                                else:
+                                    # 只重新分析像素变化的格子，当前房间位置
+                                    minimap_state.update(regions.grab('minimap'))
+                                current_room = minimap.current_room
                                 logger.info('当前房间是 {}', current_room)
                                 cur_row, cur_col = current_room
+                                check_room_change(current_room)
 
                                 if current_room == boss_room or (boss_door_appeared and current_room == (-1, -1)):
                                     in_boss_room = True
 
-                                allow_directions = map_util.get_allow_directions(map_crop, cur_row, cur_col)
+                                allow_directions = minimap.allow_directions()
                                 logger.debug(f"allow_directions:{allow_directions}")
                             except Exception as e:
                                 logger.error(e)
@@ -1937,8 +2081,12 @@ def _run_main_script():
                                 if in_boss_room:
                                     logger.info("在boss房间分析出错，无视")
                                     break
+                                if minimap_watcher is not None:
+                                    # 后台线程还没分析出来，这一帧先跳过，下一帧再读快照
+                                    logger.debug(f"小地图快照没有允许方向(房间{current_room})，跳过")
+                                    break
                                 map_door_error_cnt = map_door_error_cnt + 1
-                                # cv2.imwrite(f'errorDetectMap_door_{map_door_error_cnt}.jpg', map_crop)
+                                # cv2.imwrite(f'errorDetectMap_door_{map_door_error_cnt}.jpg', minimap_state.crop)
                                 logger.error(
                                     f"分析小地图的行列door，第 {map_door_error_cnt} 次出错,行列是 {rows} , {cols}")
                                 logger.error("暂停2秒继续重试！！")
@@ -1947,6 +2095,8 @@ def _run_main_script():
                                     break
                             else:
                                 map_door_error_cnt = 0
+                                # 问号房间探索后格子会变，房间图随之重建（没变化时是缓存）
+                                finder.set_map_graph(minimap.room_graph().links)
                                 next_room_direction = finder.get_next_direction((cur_row, cur_col), allow_directions)
                                 logger.debug(f"next_room_direction:{next_room_direction}")
 
@@ -2545,21 +2695,27 @@ def _run_main_script():
                         logger.warning("除了角色什么也没识别到")
                         direct = random.choice(random.choice([kbu.single_direct, kbu.double_direct]))
                         try:
-                            map_crop = map_util.get_small_map_region_img(img0, rows, cols)
-                            cur_row, cur_col = map_util.current_room_index_cropped(map_crop, rows, cols)
-                            allow_directions = map_util.get_allow_directions(map_crop, cur_row, cur_col)
+                            if minimap_watcher is not None:
+                                minimap = minimap_watcher.snapshot()
+                            else:
+                                # 整帧截图也以右边缘为基准，可以直接增量更新
+                                minimap_state.update(img0)
+                            cur_row, cur_col = minimap.current_room
+                            allow_directions = minimap.allow_directions()
                             logger.debug(f"未识别到尝试allow_directions:{allow_directions}")
-                            if not allow_directions:
+                            # 后台分析时快照已经是最新的，不再等待重试
+                            if not allow_directions and minimap_watcher is None:
                                 # cv2.imwrite("no_allow_directions_full1.jpg", img0)
-                                # cv2.imwrite("no_allow_directions_crop1.jpg", map_crop)
+                                # cv2.imwrite("no_allow_directions_crop1.jpg", minimap_state.crop)
                                 logger.debug(f'小地图没找到对应的图{(rows, cols)},{(cur_row, cur_col)}！！！！')
                                 time.sleep(1)
-                                img00 = capturer.capture()
-                                map_crop = map_util.get_small_map_region_img(img00, rows, cols)
-                                cur_row, cur_col = map_util.current_room_index_cropped(map_crop, rows, cols)
-                                allow_directions = map_util.get_allow_directions(map_crop, cur_row, cur_col)
+                                minimap_state.update(regions.grab('minimap'))
+                                cur_row, cur_col = minimap_state.current_room
+                                allow_directions = minimap_state.allow_directions()
                                 current_room = (cur_row, cur_col)
+                            check_room_change((cur_row, cur_col))
 
+                            finder.set_map_graph(minimap.room_graph().links)
                             next_room_direction = finder.get_next_direction((cur_row, cur_col), allow_directions)
                             logger.debug("计算方向2", next_room_direction)
                             logger.info(
@@ -2603,6 +2759,16 @@ def _run_main_script():
                     continue
                 # 逻辑处理-什么都没有<<<<<<<<<<<<<<<<<<<<<<<<<<<<<
             # todo 循环打怪过图 循环结束////////////////////////////////
+            if frame_ref is not None:
+                frame_ref.release()
+            if detection_stage is not None:
+                detection_stage.stop()
+                logger.info(f"推理阶段: {detection_stage.stats.summary()}")
+                detection_stage = None
+            logger.info(f"决策阶段: {decide_stats.summary()}")
+            logger.info(f"帧率调度: {frame_governor.summary()}")
+            if minimap_watcher is not None:
+                logger.info(f"小地图后台分析: {minimap_watcher.summary()}")
             logger.warning("循环打怪过图 循环结束////////////////////////////////")
 
             pause_event.wait()  # 暂停
@@ -2622,7 +2788,7 @@ def _run_main_script():
             pause_event.wait()  # 暂停
             # 疲劳值判断
             # current_fatigue = do_ocr_fatigue_retry(handle, x, y, reader, 5)
-            current_fatigue = do_recognize_fatigue(capturer.capture())
+            current_fatigue = do_recognize_fatigue(regions.grab('fatigue'), FATIGUE_ROI[:2])
             if role.fatigue_reserved > 0 and (current_fatigue - fatigue_cost) < role.fatigue_reserved:
                 # 再打一把就疲劳值就不够预留的了
                 logger.info(f'再打一把就疲劳值就不够预留的{role.fatigue_reserved}了')
@@ -16,6 +16,21 @@ from utils.utilities import match_template_one, match_template
 import config as config_
 from utils.utilities import compare_images
 
+# 小地图区域的尺寸，区域贴着窗口右上角，行列/房间的计算都以图像右边缘为基准，
+# 所以区域截图可以直接传给本模块的函数
+MINIMAP_ROI_WIDTH = 200
+MINIMAP_ROI_HEIGHT = 200
+
+
+def minimap_roi(window_width):
+    """
+    小地图区域 (x, y, width, height)
+    :param window_width: 窗口客户区宽度
+    :return:
+    """
+    return window_width - MINIMAP_ROI_WIDTH, 0, MINIMAP_ROI_WIDTH, MINIMAP_ROI_HEIGHT
+
+
 question_template = cv.imread(os.path.normpath(f'{config_.project_base_path}/assets/img/game/question_mark_bright.png'))
 
 
@@ -114,87 +129,58 @@ def get_small_map_region_img(img0, rows, cols):
     return crop
 
 
-# 找出该区域内蓝色的点,作为当前所在的房间
-def current_room_index_cropped(crop, rows, cols):
-    # 获取图像的高度和宽度
-    height, width = crop.shape[:2]
+# 当前房间标志（蓝色）的 HSV 范围
+LOWER_BLUE = np.array([90, 180, 70])
+UPPER_BLUE = np.array([130, 255, 255])
+# boss 房间（红色）的 HSV 范围，红色跨过色调0，分两个区间
+LOWER_RED_1 = np.array([0, 120, 70])
+UPPER_RED_1 = np.array([10, 255, 255])
+LOWER_RED_2 = np.array([170, 120, 70])
+UPPER_RED_2 = np.array([180, 255, 255])
+
+
+def _grid_cells(mask, rows, cols):
+    """
+    把整张小地图的掩码按格子切分，返回 (rows, 格高, cols, 格宽) 的视图
+    除不尽时右侧、下侧多出的像素不属于任何格子，与逐格切片的范围一致
+    """
+    cell_height, cell_width = mask.shape[0] // rows, mask.shape[1] // cols
+    return mask[:rows * cell_height, :cols * cell_width].reshape(rows, cell_height, cols, cell_width)
 
-    # 分割矩形区域为几行几列的格子
-    cell_width = width // cols  # 每个格子的宽度
-    cell_height = height // rows  # 每个格子的高度
 
-    # 将图像从BGR转换为HSV
+def first_max_cell(values, min_value=0):
+    """按行优先顺序取第一个最大值所在的格子，最大值不超过 min_value 时返回 (-1, -1)"""
+    if values.size == 0 or values.max() <= min_value:
+        return -1, -1
+    row, col = np.unravel_index(int(np.argmax(values)), values.shape)
+    return int(row), int(col)
+
+
+def room_blue_ratios(crop, rows, cols):
+    """
+    整张小地图只做一次颜色阈值，再按格子统计蓝色像素总数和格子中间 50% 区域内的数量
+    :return: (rows, cols) 每个格子中间区域蓝色像素的占比，蓝色像素不超过15个的格子为0
+    """
     hsv_crop = cv.cvtColor(crop, cv.COLOR_BGR2HSV)
+    cells = _grid_cells(cv.inRange(hsv_crop, LOWER_BLUE, UPPER_BLUE) > 0, rows, cols)
+    cell_height, cell_width = cells.shape[1], cells.shape[3]
+
+    # 中间区域 (格子中间 50% 区域，含边界)
+    x_center_min, x_center_max = int(cell_width * 0.25), int(cell_width * 0.75)
+    y_center_min, y_center_max = int(cell_height * 0.25), int(cell_height * 0.75)
 
-    # 定义蓝色的 HSV 范围
-    lower_blue = np.array([90, 180, 70])  # 蓝色的下限
-    upper_blue = np.array([130, 255, 255])  # 蓝色的上限
-
-    # 记录蓝色像素最多的格子信息
-    max_blue_pixels = -1
-    max_blue_ratio = 0
-    bluest_cell = (-1, -1)  # 格子的位置 (row, col)
-
-    # 遍历每个格子，寻找蓝色像素
-    for row in range(rows):
-        for col in range(cols):
-            # 计算每个格子的位置
-            cell_x = col * cell_width
-            cell_y = row * cell_height
-            cell = hsv_crop[cell_y:cell_y + cell_height, cell_x:cell_x + cell_width]
-
-            # 检测蓝色区域
-            mask = cv.inRange(cell, lower_blue, upper_blue)
-
-            # 找到所有蓝色像素的坐标
-            blue_pixels = np.column_stack(np.where(mask > 0))
-
-            # 获取图像的尺寸
-            height, width = mask.shape
-
-            # 定义中间区域 (图像中间 50% 区域)
-            x_center_min, x_center_max = int(width * 0.25), int(width * 0.75)
-            y_center_min, y_center_max = int(height * 0.25), int(height * 0.75)
-
-            # x_center_min, x_center_max = int(width * 0.15), int(width * 0.85)
-            # y_center_min, y_center_max = int(height * 0.15), int(height * 0.85)
-
-            # 计算中间区域内的蓝色像素数量
-            center_pixels = [pixel for pixel in blue_pixels
-                             if x_center_min <= pixel[1] <= x_center_max and y_center_min <= pixel[0] <= y_center_max]
-
-            # 计算蓝色像素的占比
-            total_blue_pixels = len(blue_pixels)
-            center_blue_pixels = len(center_pixels)
-
-            if total_blue_pixels > 15:
-                center_ratio = center_blue_pixels / total_blue_pixels
-            else:
-                center_ratio = 0
-
-            # print((row, col), center_blue_pixels, total_blue_pixels, center_ratio)
-
-            # # 判断蓝色像素是否主要集中在中间
-            # if center_ratio > 0.5:
-            #     if center_ratio > max_blue_ratio:
-            #         max_blue_ratio = center_ratio
-            #         # print("蓝色像素主要集中在中间区域")
-            #         bluest_cell = (row, col)  # 记录行列索引，使用0基索引
-            # else:
-            #     # print("蓝色像素未集中在中间区域")
-            #     pass
-
-            if center_ratio > max_blue_ratio:
-                max_blue_ratio = center_ratio
-                # print("蓝色像素主要集中在中间区域")
-                bluest_cell = (row, col)  # 记录行列索引，使用0基索引
-
-            # # 如果当前格子中的蓝色像素数量比之前的最大值高，更新最大值
-            # if blue_pixels > max_blue_pixels:
-            #     max_blue_pixels = blue_pixels
-            #     bluest_cell = (row, col)  # 记录行列索引，使用0基索引
-
-    # 返回二维数组的结构中的位置
+    total_blue_pixels = cells.sum(axis=(1, 3))
+    center_blue_pixels = cells[:, y_center_min:y_center_max + 1, :, x_center_min:x_center_max + 1].sum(axis=(1, 3))
+    return np.where(total_blue_pixels > 15, center_blue_pixels / np.maximum(total_blue_pixels, 1), 0.0)
+
+
+# 找出该区域内蓝色的点,作为当前所在的房间
+def current_room_index_cropped(crop, rows, cols):
+    """
+    取中间区域蓝色占比最高的格子
+    :return: 当前房间 (row, col)，0基索引，没有找到时为 (-1, -1)
+    """
+    bluest_cell = first_max_cell(room_blue_ratios(crop, rows, cols))
     logger.debug(f"当前房间在 {bluest_cell}")
     return bluest_cell
 
@@ -212,67 +198,17 @@ def current_room_index_cropped_retry(crop, rows, cols, count=5):
 
 def get_boss_room_cropped(crop, rows, cols):
     """
+    整张小地图只做一次红色阈值，按格子统计红色像素数，取最多的格子
     :param crop:
     :param rows:
     :param cols:
     :return: boss房间，0基索引
     """
-    # 获取图像的高度和宽度
-    height, width = crop.shape[:2]
-
-    # cv.imshow('crop',crop)
-    # cv.waitKey(0)
-    # cv.imwrite("./map.jpg", crop)
-
-    # 将图像从BGR转换为HSV
     hsv_crop = cv.cvtColor(crop, cv.COLOR_BGR2HSV)
-
-    cell_width = width // cols  # 每个格子的宽度
-    cell_height = height // rows  # 每个格子的高度
-
-    # 红色在HSV空间的阈值范围（需要检测两个区间）
-    # lower_red_1 = np.array([0, 50, 50])  # 红色的低区间下限
-    # upper_red_1 = np.array([10, 255, 255])  # 红色的低区间上限
-    # lower_red_2 = np.array([170, 50, 50])  # 红色的高区间下限
-    # upper_red_2 = np.array([180, 255, 255])  # 红色的高区间上限
-
-    lower_red_1 = np.array([0, 120, 70])  # 增大饱和度和明度下限
-    upper_red_1 = np.array([10, 255, 255])  # 保持色调范围不变
-    lower_red_2 = np.array([170, 120, 70])  # 增大饱和度和明度下限
-    upper_red_2 = np.array([180, 255, 255])  # 红色的高区间上限
-
-    # 记录红色像素最多的格子信息
-    max_red_pixels = 0
-    reddest_cell = (-1, -1)  # 格子的位置 (row, col)
-
-    # 遍历每个格子，寻找红色像素
-    for row in range(rows):
-        for col in range(cols):
-            # 计算每个格子的位置
-            cell_x = col * cell_width
-            cell_y = row * cell_height
-            cell = hsv_crop[cell_y:cell_y + cell_height, cell_x:cell_x + cell_width]
-
-            # 检测红色区域（两个区间的掩码）
-            mask1 = cv.inRange(cell, lower_red_1, upper_red_1)
-            mask2 = cv.inRange(cell, lower_red_2, upper_red_2)
-
-            # 合并两个红色掩码
-            red_mask = cv.bitwise_or(mask1, mask2)
-
-            # 计算该格子中红色像素的数量
-            red_pixels = cv.countNonZero(red_mask)
-
-            # print((row, col), red_pixels)
-
-            # 如果当前格子中的红色像素数量比之前的最大值高，更新最大值
-            if red_pixels > max_red_pixels:
-                max_red_pixels = red_pixels
-                reddest_cell = (row, col)  # 记录行列索引，使用0基索引
-
-    # 返回二维数组的结构中的位置
-    # logger.debug(f"BOOS房间在 {reddest_cell}")
-    return reddest_cell
+    red_mask = cv.bitwise_or(cv.inRange(hsv_crop, LOWER_RED_1, UPPER_RED_1),
+                             cv.inRange(hsv_crop, LOWER_RED_2, UPPER_RED_2))
+    red_pixels = np.count_nonzero(_grid_cells(red_mask, rows, cols), axis=(1, 3))
+    return first_max_cell(red_pixels)
 
 
 def get_boss_from_crop(crop, rows, cols):
@@ -319,36 +255,18 @@ def get_allow_directions(crop, cur_row, cur_col):
         logger.warning(f"无法截取格子图像: row={cur_row}, col={cur_col}")
         return []
 
-    score_list = []
-    found_num = False
-    allow_directions = []
-    # SSIM查找当前格子，得到允许方向
-    for map_npy in npy_list:
-        for npy in map_npy['img_num']:
-            score = compare_images(npy, cur_img)
-            # score_list.append((num, score))
-            score_list.append((map_npy['direction'], score))
-            if score >= 0.95:
-                # print('找到了，序号是：', num, score)
-                # found_num = num
-                # found_num = npy
-                found_num = True
-                allow_directions = map_npy['direction']
-                break
-        if found_num:
-            break
-
-    if not found_num:
-        highest_score = max(score_list, key=lambda x: x[1])
-        if highest_score[1] > 0.85:
-            allow_directions = highest_score[0]
-
-    # s = time.time()
-    # print(f'找到序号{found_num}, 允许方向：{allow_directions}')
-    return allow_directions
+    # 与所有底图一次算完SSIM，得到允许方向
+    return tile_index.classify(cur_img)
 
 
-def all_question_mark_room_cropped(crop, rows, cols, cur_row, cur_col):
+def question_mark_rooms_cropped(crop, rows, cols):
+    """
+    所有显示问号（还没探索）的房间
+    :param crop:
+    :param rows:
+    :param cols:
+    :return: 问号房间的集合 {(row, col)}，0基索引
+    """
     # 获取图像的高度和宽度
     height, width = crop.shape[:2]
 
@@ -359,41 +277,33 @@ def all_question_mark_room_cropped(crop, rows, cols, cur_row, cur_col):
     gray_screenshot = cv.cvtColor(crop, cv.COLOR_BGRA2GRAY)
     template_again_gray = cv.cvtColor(question_template, cv.COLOR_BGR2GRAY)
     matches = match_template(gray_screenshot, template_again_gray, threshold=0.7)
-    # print(f'问号匹配数量:{len(matches)}')
 
     res = set()
+    for (x1, y1), (x2, y2) in matches:
+        # 计算图案的中心坐标
+        center_x = (x1 + x2) / 2
+        center_y = (y1 + y2) / 2
 
-    if len(matches) > 0:
-        # 获取匹配区域的尺寸
-        for (x1, y1), (x2, y2) in matches:
-            print(x1, y1, x2, y2)
-
-            # 计算图案的中心坐标
-            center_x = (x1 + x2) / 2
-            center_y = (y1 + y2) / 2
-
-            # 计算格子的索引
-            grid_x = int(center_x // cell_width)
-            grid_y = int(center_y // cell_height)
-
-            # 确保格子的索引在有效范围内
-            grid_x = min(max(grid_x, 0), cols - 1)
-            grid_y = min(max(grid_y, 0), rows - 1)
-
-            # print(f'图案的中心坐标: ({center_x}, {center_y})')
-            # print(f'问号的格子: 行 {grid_y + 1}, 列 {grid_x + 1}')
-            # res.add((grid_y, grid_x))
-
-            direction = None
-            if grid_x == (cur_col + 1):
-                direction = 'RIGHT'
-            if grid_x == (cur_col - 1):
-                direction = 'LEFT'
-            if grid_y == (cur_row - 1):
-                direction = 'UP'
-            if grid_y == (cur_row + 1):
-                direction = 'DOWN'
-            res.add(direction)
+        # 计算格子的索引，确保在有效范围内
+        grid_x = min(max(int(center_x // cell_width), 0), cols - 1)
+        grid_y = min(max(int(center_y // cell_height), 0), rows - 1)
+        res.add((grid_y, grid_x))
+    return res
+
+
+def all_question_mark_room_cropped(crop, rows, cols, cur_row, cur_col):
+    res = set()
+    for grid_y, grid_x in question_mark_rooms_cropped(crop, rows, cols):
+        direction = None
+        if grid_x == (cur_col + 1):
+            direction = 'RIGHT'
+        if grid_x == (cur_col - 1):
+            direction = 'LEFT'
+        if grid_y == (cur_row - 1):
+            direction = 'UP'
+        if grid_y == (cur_row + 1):
+            direction = 'DOWN'
+        res.add(direction)
     return list(res)
 
 
@@ -435,6 +345,109 @@ for map_img in map_list:
         item['img_num'].append(image)
     npy_list.append(item)
 
+
+class TileIndex:
+    """
+    小地图格子底图索引，get_allow_directions 用它判断格子允许的方向
+
+    导入时把所有底图转成灰度并预先算好 SSIM 需要的 7x7 窗口均值和方差，
+    分类时一次算出格子与全部底图的 SSIM（与 skimage structural_similarity 的默认参数一致：
+    7x7 均匀窗口、样本协方差、data_range=255，取不受边界填充影响的内部窗口的均值），
+    判定规则与原来逐个比较时相同：按顺序第一个 >=0.95 的底图，否则取最高分且 >0.85 的底图。
+    与某个底图完全相同的格子直接查表。
+    """
+
+    WIN = 7
+    C1 = (0.01 * 255) ** 2
+    C2 = (0.03 * 255) ** 2
+
+    def __init__(self, npy_list, match_score=0.95, min_score=0.85):
+        self.match_score = match_score
+        self.min_score = min_score
+        self.directions = [item['direction'] for item in npy_list for _ in item['img_num']]
+        tiles = [tile for item in npy_list for tile in item['img_num']]
+        self.shape = tiles[0].shape
+        gray = np.stack([cv.cvtColor(tile, cv.COLOR_BGR2GRAY) for tile in tiles]).astype(np.float64)
+        self._gray = gray
+        self._mean, self._var = self._window_stats(gray)
+        # 底图本身的分类结果（与全部底图比较后的结果，不一定是它自己所在的组）
+        self._exact = {}
+        for tile, directions in zip(tiles, self.classify_many(np.stack(tiles))):
+            self._exact.setdefault(tile.tobytes(), directions)
+
+    @classmethod
+    def _box_mean(cls, a):
+        """最后两维上所有完整 7x7 窗口的均值，(..., H, W) -> (..., H-6, W-6)"""
+        win = cls.WIN
+        c = np.zeros(a.shape[:-2] + (a.shape[-2] + 1, a.shape[-1] + 1))
+        c[..., 1:, 1:] = a.cumsum(axis=-1).cumsum(axis=-2)
+        return (c[..., win:, win:] - c[..., :-win, win:] - c[..., win:, :-win] + c[..., :-win, :-win]) / (win * win)
+
+    @classmethod
+    def _window_stats(cls, gray):
+        """窗口均值和（样本）方差"""
+        cov_norm = cls.WIN ** 2 / (cls.WIN ** 2 - 1)
+        mean = cls._box_mean(gray)
+        var = cov_norm * (cls._box_mean(gray * gray) - mean * mean)
+        return mean, var
+
+    def scores(self, cells):
+        """
+        格子与每个底图的 SSIM
+
+        :param cells: (18, 18, 3) 或 (N, 18, 18, 3) BGR 格子
+        :return: (底图数,) 或 (N, 底图数)
+        """
+        single = cells.ndim == 3
+        cells = cells[None] if single else cells
+        gray = np.stack([cv.cvtColor(cell, cv.COLOR_BGR2GRAY) for cell in cells]).astype(np.float64)
+        mean, var = self._window_stats(gray)
+        cov_norm = self.WIN ** 2 / (self.WIN ** 2 - 1)
+        # (N, 1, ...) 与 (底图数, ...) 广播
+        mean, var, gray = mean[:, None], var[:, None], gray[:, None]
+        covar = cov_norm * (self._box_mean(gray * self._gray) - mean * self._mean)
+        ssim_map = ((2 * mean * self._mean + self.C1) * (2 * covar + self.C2)
+                    / ((mean ** 2 + self._mean ** 2 + self.C1) * (var + self._var + self.C2)))
+        result = ssim_map.mean(axis=(-2, -1))
+        return result[0] if single else result
+
+    def _pick(self, scores):
+        matched = np.flatnonzero(scores >= self.match_score)
+        if len(matched):
+            return list(self.directions[matched[0]])
+        best = int(np.argmax(scores))
+        if scores[best] > self.min_score:
+            return list(self.directions[best])
+        return []
+
+    def classify(self, cell):
+        """
+        格子允许的方向
+
+        :param cell: (18, 18, 3) BGR 格子
+        :return: 方向列表，没有匹配的底图时为空列表
+        """
+        if cell.shape[:2] != self.shape[:2]:
+            return []
+        hit = self._exact.get(cell.tobytes())
+        if hit is not None:
+            return list(hit)
+        return self._pick(self.scores(cell))
+
+    def classify_many(self, cells):
+        """
+        一次判断多个格子
+
+        :param cells: (N, 18, 18, 3) BGR 格子
+        :return: 每个格子的方向列表
+        """
+        if len(cells) == 0:
+            return []
+        return [self._pick(row) for row in self.scores(np.asarray(cells))]
+
+
+tile_index = TileIndex(npy_list)
+
 # 1.根据蓝标找当前房间位置
 # 2 根据当前位置切图，判断是哪个底图，来判断允许的方向
 # 3 找问号位置，判断未探索方向
@@ -444,11 +457,116 @@ for map_img in map_list:
 #######################################
 
 if __name__ == "__main__":
-    crop = cv.imread('img/no_allow_directions_crop0.jpg')
-    cv.imshow('crop', crop)
-    # cv.waitKey(0)
-    directions = get_allow_directions(crop, 0, 2)
-    print(directions)
+    # 用 c_*.npy 格子拼出随机小地图，加上蓝色标志、红色 boss 房间和噪声，
+    # 对比整图阈值+按格子统计与原来逐格 inRange+列表推导的结果和耗时
+
+    def _current_room_loop(crop, rows, cols):
+        hsv_crop = cv.cvtColor(crop, cv.COLOR_BGR2HSV)
+        cell_width, cell_height = crop.shape[1] // cols, crop.shape[0] // rows
+        max_blue_ratio, bluest_cell = 0, (-1, -1)
+        for row in range(rows):
+            for col in range(cols):
+                cell = hsv_crop[row * cell_height:(row + 1) * cell_height, col * cell_width:(col + 1) * cell_width]
+                mask = cv.inRange(cell, LOWER_BLUE, UPPER_BLUE)
+                blue_pixels = np.column_stack(np.where(mask > 0))
+                height, width = mask.shape
+                x_center_min, x_center_max = int(width * 0.25), int(width * 0.75)
+                y_center_min, y_center_max = int(height * 0.25), int(height * 0.75)
+                center_pixels = [pixel for pixel in blue_pixels
+                                 if x_center_min <= pixel[1] <= x_center_max and y_center_min <= pixel[0] <= y_center_max]
+                center_ratio = len(center_pixels) / len(blue_pixels) if len(blue_pixels) > 15 else 0
+                if center_ratio > max_blue_ratio:
+                    max_blue_ratio, bluest_cell = center_ratio, (row, col)
+        return bluest_cell
+
+    def _boss_room_loop(crop, rows, cols):
+        hsv_crop = cv.cvtColor(crop, cv.COLOR_BGR2HSV)
+        cell_width, cell_height = crop.shape[1] // cols, crop.shape[0] // rows
+        max_red_pixels, reddest_cell = 0, (-1, -1)
+        for row in range(rows):
+            for col in range(cols):
+                cell = hsv_crop[row * cell_height:(row + 1) * cell_height, col * cell_width:(col + 1) * cell_width]
+                red_mask = cv.bitwise_or(cv.inRange(cell, LOWER_RED_1, UPPER_RED_1),
+                                         cv.inRange(cell, LOWER_RED_2, UPPER_RED_2))
+                red_pixels = cv.countNonZero(red_mask)
+                if red_pixels > max_red_pixels:
+                    max_red_pixels, reddest_cell = red_pixels, (row, col)
+        return reddest_cell
+
+    rng = np.random.default_rng(0)
+    tiles = [tile for item in npy_list for tile in item['img_num']]
+    crops = []
+    for _ in range(300):
+        rows, cols = int(rng.integers(1, 8)), int(rng.integers(1, 10))
+        crop = np.zeros((rows * 18, cols * 18, 3), dtype=np.uint8)
+        for r in range(rows):
+            for c in range(cols):
+                if rng.random() < 0.7:
+                    crop[r * 18:(r + 1) * 18, c * 18:(c + 1) * 18] = tiles[rng.integers(len(tiles))]
+        for color in ([255, 80, 20], [20, 20, 230]):  # 蓝色标志、红色 boss 房间
+            if rng.random() < 0.9:
+                y, x = int(rng.integers(0, rows * 18 - 4)), int(rng.integers(0, cols * 18 - 4))
+                h, w = int(rng.integers(3, 12)), int(rng.integers(3, 12))
+                crop[y:y + h, x:x + w] = color
+        noise = rng.integers(-30, 30, crop.shape)
+        crop = np.clip(crop.astype(int) + noise * (rng.random(crop.shape[:2]) < 0.1)[..., None], 0, 255)
+        crops.append((crop.astype(np.uint8), rows, cols))
+    for crop, rows, cols in crops:
+        assert current_room_index_cropped(crop, rows, cols) == _current_room_loop(crop, rows, cols), (rows, cols)
+        assert get_boss_room_cropped(crop, rows, cols) == _boss_room_loop(crop, rows, cols), (rows, cols)
+
+    big = [item for item in crops if item[1] * item[2] >= 30]
+    for name, new_fn, old_fn in (('当前房间', current_room_index_cropped, _current_room_loop),
+                                 ('boss房间', get_boss_room_cropped, _boss_room_loop)):
+        t0 = time.perf_counter()
+        for crop, rows, cols in big:
+            old_fn(crop, rows, cols)
+        old_ms = (time.perf_counter() - t0) / len(big) * 1000
+        t0 = time.perf_counter()
+        for crop, rows, cols in big:
+            new_fn(crop, rows, cols)
+        new_ms = (time.perf_counter() - t0) / len(big) * 1000
+        print(f'{name}: 逐格 {old_ms:.3f}ms, 整图 {new_ms:.3f}ms ({old_ms / new_ms:.1f}x)')
+    print(f'{len(crops)} 张随机小地图结果一致')
+
+    # 底图索引与原来逐个 SSIM 比较的结果和耗时对比：原始底图、加噪声、平移、盖上蓝色标志的格子
+    def _allow_directions_loop(cur_img):
+        score_list = []
+        for map_npy in npy_list:
+            for npy in map_npy['img_num']:
+                score = compare_images(npy, cur_img)
+                score_list.append((map_npy['direction'], score))
+                if score >= 0.95:
+                    return map_npy['direction'], score_list
+        highest_score = max(score_list, key=lambda x: x[1])
+        return (highest_score[0] if highest_score[1] > 0.85 else []), score_list
+
+    cells = list(tiles)
+    for tile in tiles:
+        for _ in range(5):
+            cell = tile.astype(int) + rng.integers(-int(rng.integers(1, 40)), 40, tile.shape)
+            cells.append(np.clip(cell, 0, 255).astype(np.uint8))
+        cells.append(np.roll(tile, int(rng.integers(-2, 3)), axis=int(rng.integers(0, 2))))
+        marked = tile.copy()
+        marked[6:12, 6:12] = [255, 80, 20]
+        cells.append(marked)
+    cells.extend(rng.integers(0, 255, (20, 18, 18, 3), dtype=np.uint8))
+    for cell in cells:
+        expected, score_list = _allow_directions_loop(cell)
+        assert tile_index.classify(cell) == expected
+        if len(score_list) == len(tiles):
+            assert np.allclose(tile_index.scores(cell), [score for _, score in score_list], atol=1e-9)
+    assert tile_index.classify_many(np.stack(cells)) == [_allow_directions_loop(cell)[0] for cell in cells]
+
+    t0 = time.perf_counter()
+    for cell in cells:
+        _allow_directions_loop(cell)
+    old_ms = (time.perf_counter() - t0) / len(cells) * 1000
+    t0 = time.perf_counter()
+    for cell in cells:
+        tile_index.classify(cell)
+    new_ms = (time.perf_counter() - t0) / len(cells) * 1000
+    print(f'允许方向: 逐个SSIM {old_ms:.3f}ms, 底图索引 {new_ms:.3f}ms ({old_ms / new_ms:.0f}x)，{len(cells)} 个格子结果一致')
 
 
 # if __name__ == "__main__":
@@ -0,0 +1,249 @@
+# -*- coding:utf-8 -*-
+"""
+小地图状态模块 - 一局内缓存小地图布局，只重新分析像素变化的格子
+
+一局地下城里小地图的行列数和 boss 房间不会变，每个格子的底图（允许的方向）也只在
+蓝色标志移动、问号房间被探索时才会变化。MinimapState 在进图时完整分析一次，
+之后每次只和上次分析时的小地图做差，重新计算变化格子的蓝色占比和底图分类，
+当前房间变化时返回换房间事件。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+
+import map_util
+from dnf.stronger.logger_config import logger
+from dnf.stronger.room_graph import RoomGraph, build_room_graph
+
+CELL_SIZE = 18  # 小地图每个格子的边长（像素）
+
+
+class RoomChange(NamedTuple):
+    """换房间事件"""
+    previous: Tuple[int, int]
+    current: Tuple[int, int]
+
+
+class MinimapState:
+    """
+    一局地下城的小地图状态（非线程安全，跨线程使用时由调用方加锁）
+
+    Args:
+        pixel_threshold: 像素任一通道的差值超过它才算变化
+        min_changed_pixels: 格子内变化的像素数达到它才重新分析这个格子
+        on_room_change: 当前房间变化时的回调
+    """
+
+    def __init__(self, pixel_threshold: int = 24, min_changed_pixels: int = 3,
+                 on_room_change: Optional[Callable[[RoomChange], None]] = None):
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_pixels = min_changed_pixels
+        self.on_room_change = on_room_change
+        # 统计：完整分析次数、增量更新次数、重新分析的格子数
+        self.full_analyses = 0
+        self.updates = 0
+        self.changed_cells = 0
+        self.room_changes = 0
+        self.clear()
+
+    def clear(self):
+        """清除布局（换地图、重新进图时调用），统计数据保留"""
+        self.rows, self.cols = 0, 0
+        self.boss_room = (-1, -1)
+        self.current_room = (-1, -1)
+        self.crop: Optional[np.ndarray] = None  # 上次分析时的小地图，只有重新分析过的格子会被覆盖
+        self._ratios: Optional[np.ndarray] = None  # 每个格子中间区域的蓝色占比
+        self._directions: Dict[Tuple[int, int], List[str]] = {}  # 格子底图分类结果，用到时才计算
+        self._graph: Optional[RoomGraph] = None  # 房间图，有格子变化时重建
+        self.changed_at = 0.0  # 最近一次换房间的时间
+
+    @property
+    def ready(self) -> bool:
+        """布局已分析成功（找到了 boss 房间和当前房间）"""
+        return self.crop is not None and self.boss_room != (-1, -1) and self.current_room != (-1, -1)
+
+    def analyse(self, map_img: np.ndarray) -> bool:
+        """
+        完整分析小地图：行列数、boss 房间、每个格子的蓝色占比、当前房间
+
+        Args:
+            map_img: 小地图区域截图或整帧截图（都以右边缘为基准）
+
+        Returns:
+            是否找到了 boss 房间和当前房间
+        """
+        self.clear()
+        self.full_analyses += 1
+        cols = map_util.get_colum_count(map_img)
+        rows = map_util.get_row_count(map_img)
+        crop = map_util.get_small_map_region_img(map_img, rows, cols)
+        if crop.shape[:2] != (rows * CELL_SIZE, cols * CELL_SIZE):
+            logger.warning(f"小地图区域不完整 {crop.shape[:2]}, 行列是 {rows} , {cols}")
+            return False
+        self.rows, self.cols = rows, cols
+        self.crop = crop.copy()
+        self.boss_room = map_util.get_boss_room_cropped(self.crop, rows, cols)
+        self._ratios = map_util.room_blue_ratios(self.crop, rows, cols)
+        self.current_room = map_util.first_max_cell(self._ratios)
+        self.changed_at = time.monotonic()
+        return self.ready
+
+    def changed_mask(self, crop: np.ndarray) -> np.ndarray:
+        """(rows, cols) 与上次分析时相比像素有变化的格子"""
+        diff = cv.absdiff(crop, self.crop)
+        if diff.ndim == 3:
+            diff = diff.max(axis=2)
+        changed = map_util._grid_cells(diff > self.pixel_threshold, self.rows, self.cols)
+        return np.count_nonzero(changed, axis=(1, 3)) >= self.min_changed_pixels
+
+    def update(self, map_img: np.ndarray) -> Optional[RoomChange]:
+        """
+        增量更新：只重新分析像素变化的格子
+
+        Args:
+            map_img: 小地图区域截图或整帧截图
+
+        Returns:
+            当前房间变化时返回 RoomChange，否则返回None
+        """
+        crop = None
+        if self.crop is not None:
+            crop = map_util.get_small_map_region_img(map_img, self.rows, self.cols)
+        if crop is None or crop.shape != self.crop.shape:
+            # 还没有分析成功，或者截图尺寸、通道数变了，重新完整分析
+            previous = self.current_room
+            self.analyse(map_img)
+            return self._room_changed(previous)
+        self.updates += 1
+        changed = np.argwhere(self.changed_mask(crop))
+        if not len(changed):
+            return None
+        self.changed_cells += len(changed)
+        self._graph = None
+        for row, col in changed:
+            y, x = row * CELL_SIZE, col * CELL_SIZE
+            cell = crop[y:y + CELL_SIZE, x:x + CELL_SIZE]
+            self.crop[y:y + CELL_SIZE, x:x + CELL_SIZE] = cell
+            self._ratios[row, col] = map_util.room_blue_ratios(cell, 1, 1)[0, 0]
+            self._directions.pop((int(row), int(col)), None)
+        previous = self.current_room
+        self.current_room = map_util.first_max_cell(self._ratios)
+        return self._room_changed(previous)
+
+    def _room_changed(self, previous: Tuple[int, int]) -> Optional[RoomChange]:
+        if self.current_room == previous:
+            return None
+        change = RoomChange(previous, self.current_room)
+        self.room_changes += 1
+        self.changed_at = time.monotonic()
+        logger.debug(f"小地图换房间 {previous} -> {self.current_room}")
+        if self.on_room_change is not None:
+            self.on_room_change(change)
+        return change
+
+    def cell(self, room: Tuple[int, int]) -> Optional[np.ndarray]:
+        """房间所在格子的图像（上次分析时的像素），越界时返回None"""
+        row, col = room
+        if self.crop is None or not (0 <= row < self.rows and 0 <= col < self.cols):
+            return None
+        return self.crop[row * CELL_SIZE:(row + 1) * CELL_SIZE, col * CELL_SIZE:(col + 1) * CELL_SIZE]
+
+    def allow_directions(self, room: Optional[Tuple[int, int]] = None) -> List[str]:
+        """
+        房间允许的方向（格子底图分类结果会缓存到格子像素变化为止）
+
+        Args:
+            room: 房间 (row, col)，默认当前房间
+
+        Returns:
+            方向列表，识别不到时为空列表
+        """
+        room = self.current_room if room is None else (int(room[0]), int(room[1]))
+        directions = self._directions.get(room)
+        if directions is None:
+            cell = self.cell(room)
+            if cell is None:
+                return []
+            directions = map_util.tile_index.classify(cell)
+            self._directions[room] = directions
+        return list(directions)
+
+    def room_graph(self) -> RoomGraph:
+        """
+        所有格子一次分类后建出的房间图（问号房间、boss 房间由相邻房间的门推断），格子没有变化时直接返回缓存
+
+        Returns:
+            RoomGraph，布局还没分析成功时为空图
+        """
+        if self._graph is not None:
+            return self._graph
+        if self.crop is None:
+            return build_room_graph(self.rows, self.cols, self.boss_room, {})
+        missing = [(row, col) for row in range(self.rows) for col in range(self.cols)
+                   if (row, col) not in self._directions]
+        if missing:
+            cells = np.stack([self.cell(room) for room in missing])
+            for room, directions in zip(missing, map_util.tile_index.classify_many(cells)):
+                self._directions[room] = directions
+        question_rooms = map_util.question_mark_rooms_cropped(self.crop, self.rows, self.cols)
+        self._graph = build_room_graph(self.rows, self.cols, self.boss_room, self._directions, question_rooms)
+        return self._graph
+
+    def summary(self) -> str:
+        return (f"完整分析{self.full_analyses}次 增量更新{self.updates}次 "
+                f"重新分析格子{self.changed_cells}个 换房间{self.room_changes}次")
+
+
+if __name__ == '__main__':
+    # 用底图拼出 5x7 的小地图，模拟蓝色标志沿路线在房间之间移动，
+    # 对比每次完整分析和增量更新的结果与耗时
+    rng = np.random.default_rng(0)
+    tiles = [tile for item in map_util.npy_list for tile in item['img_num']]
+    rows, cols = 5, 7
+    frame = np.full((200, 200, 3), 30, dtype=np.uint8)
+    x0, y0 = 200 - 11 - cols * CELL_SIZE, 52
+    frame[y0 - 19:y0 - 1, x0:200 - 11] = (90, 90, 90)  # 行列数计算用到的上边框和右边框
+    frame[y0:y0 + rows * CELL_SIZE, 200 - 10:200 - 7] = (90, 90, 90)
+    for r in range(rows):
+        for c in range(cols):
+            frame[y0 + r * CELL_SIZE:y0 + (r + 1) * CELL_SIZE, x0 + c * CELL_SIZE:x0 + (c + 1) * CELL_SIZE] = \
+                tiles[rng.integers(len(tiles))]
+    boss = (rows - 1, cols - 1)
+    frame[y0 + boss[0] * CELL_SIZE + 5:y0 + boss[0] * CELL_SIZE + 13,
+          x0 + boss[1] * CELL_SIZE + 5:x0 + boss[1] * CELL_SIZE + 13] = (0, 0, 230)
+
+    def with_marker(room):
+        img = frame.copy()
+        y, x = y0 + room[0] * CELL_SIZE, x0 + room[1] * CELL_SIZE
+        img[y + 4:y + 14, x + 4:x + 14] = (230, 120, 20)
+        return img
+
+    route = [(0, c) for c in range(cols)] + [(r, cols - 1) for r in range(1, rows)]
+    frames = [with_marker(route[min(i // 8, len(route) - 1)]) for i in range(len(route) * 8)]
+    state = MinimapState()
+    assert state.analyse(frames[0]), '完整分析失败'
+    print(f'{state.rows}x{state.cols}, boss {state.boss_room}, 当前 {state.current_room}')
+
+    full_s, inc_s, mismatch = 0.0, 0.0, 0
+    for img in frames:
+        t0 = time.perf_counter()
+        map_crop = map_util.get_small_map_region_img(img, rows, cols)
+        room = map_util.current_room_index_cropped(map_crop, rows, cols)
+        directions = map_util.get_allow_directions(map_crop, *room)
+        map_util.get_boss_room_cropped(map_crop, rows, cols)
+        full_s += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        state.update(img)
+        inc_directions = state.allow_directions()
+        inc_s += time.perf_counter() - t0
+        mismatch += room != state.current_room or directions != inc_directions
+    n = len(frames)
+    print(f'{n} 帧, 结果不一致 {mismatch} 次, 每帧完整分析 {full_s / n * 1000:.2f}ms, '
+          f'增量更新 {inc_s / n * 1000:.3f}ms; {state.summary()}')
@@ -0,0 +1,253 @@
+# -*- coding:utf-8 -*-
+"""
+小地图后台分析模块 - 单独的线程高频读取小地图区域，发布当前房间、boss 房间和允许方向
+
+打怪循环原来在门口现场截图分析小地图，分析失败时 safe_sleep(2) 重试最多5次，
+整个循环会被卡住最多10秒。MinimapWatcher 在后台持续用 MinimapState 增量分析，
+每次分析后替换一份不可变的快照，打怪循环直接读快照，不截图、不等待；
+需要等换房间时用 wait_for_change() 按序号等待。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from dnf.stronger.logger_config import logger
+from dnf.stronger.minimap_state import MinimapState, RoomChange
+from dnf.stronger.room_graph import RoomGraph, build_room_graph
+
+Room = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class MinimapSnapshot:
+    """
+    某一时刻的小地图分析结果，属性名与 MinimapState 一致，两者可以互换使用
+
+    Attributes:
+        seq: 内容变化（换房间、允许方向变化、重新分析布局）时加1
+        timestamp: 最近一次读取小地图的时间（time.monotonic）
+        directions: 当前房间允许的方向
+        graph: 房间图，布局还没分析成功时为None
+    """
+    seq: int = 0
+    timestamp: float = 0.0
+    ready: bool = False
+    rows: int = 0
+    cols: int = 0
+    boss_room: Room = (-1, -1)
+    current_room: Room = (-1, -1)
+    directions: Tuple[str, ...] = ()
+    graph: Optional[RoomGraph] = None
+
+    @property
+    def age(self) -> float:
+        """距最近一次读取小地图的秒数"""
+        return time.monotonic() - self.timestamp
+
+    def allow_directions(self, room: Optional[Room] = None) -> List[str]:
+        """房间允许的方向，默认当前房间；其他房间取房间图里识别出的底图"""
+        if room is None or tuple(room) == self.current_room:
+            return list(self.directions)
+        if self.graph is None:
+            return []
+        return list(self.graph.tiles.get(tuple(room), []))
+
+    def room_graph(self) -> RoomGraph:
+        if self.graph is None:
+            return build_room_graph(self.rows, self.cols, self.boss_room, {})
+        return self.graph
+
+
+class MinimapWatcher(threading.Thread):
+    """
+    小地图后台分析线程
+
+    线程内独占一个 MinimapState：布局还没分析成功时每次完整分析，成功后增量更新。
+    snapshot() 只是读一个引用，任何线程都可以随时调用。
+
+    支持上下文管理器协议（进入时启动，退出时停止）
+
+    Args:
+        grab: 截取小地图区域的函数（比如 lambda: regions.grab('minimap')）
+        fps: 读取频率
+        on_room_change: 换房间时在分析线程里调用的回调
+    """
+
+    def __init__(self, grab: Callable[[], np.ndarray], fps: float = 20.0,
+                 on_room_change: Optional[Callable[[RoomChange], None]] = None, name: str = 'MinimapWatcher'):
+        super().__init__(name=name, daemon=True)
+        self.grab = grab
+        self.interval = 1.0 / fps if fps else 0.0
+        self.state = MinimapState(on_room_change=on_room_change)
+        self._cond = threading.Condition()
+        self._snapshot = MinimapSnapshot()
+        self._reset_requested = False
+        self._stop_event = threading.Event()
+        # 统计：读取次数、分析总耗时、出错次数
+        self.reads = 0
+        self.busy_seconds = 0.0
+        self.errors = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    def snapshot(self) -> MinimapSnapshot:
+        """最新的分析结果"""
+        return self._snapshot
+
+    def reset(self):
+        """进入新的地下城时调用：丢弃缓存的布局，下一次读取时重新完整分析"""
+        with self._cond:
+            self._reset_requested = True
+            self._snapshot = MinimapSnapshot(seq=self._snapshot.seq + 1)
+            self._cond.notify_all()
+
+    def wait_for_change(self, after_seq: int, timeout: Optional[float] = None) -> MinimapSnapshot:
+        """
+        等待快照内容变化
+
+        Args:
+            after_seq: 只在序号大于它时返回
+            timeout: 超时时间（秒），None 表示一直等待
+
+        Returns:
+            最新快照，超时时序号可能仍不大于 after_seq
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._snapshot.seq > after_seq or self._stop_event.is_set(), timeout)
+            return self._snapshot
+
+    def wait_ready(self, timeout: Optional[float] = None) -> MinimapSnapshot:
+        """等待布局分析成功（找到了 boss 房间和当前房间），超时返回当时的快照"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._snapshot.ready or self._stop_event.is_set(), timeout)
+            return self._snapshot
+
+    def run(self):
+        while not self._stop_event.is_set():
+            start = time.monotonic()
+            try:
+                self._analyse(self.grab())
+            except Exception as e:
+                # 单次截图/分析出错不退出线程，沿用上一次的快照
+                self.errors += 1
+                logger.debug(f"小地图后台分析出错: {e}")
+            self.busy_seconds += time.monotonic() - start
+            self.reads += 1
+            remaining = self.interval - (time.monotonic() - start)
+            if remaining > 0:
+                self._stop_event.wait(remaining)
+
+    def _analyse(self, map_img: np.ndarray):
+        with self._cond:
+            if self._reset_requested:
+                self._reset_requested = False
+                self.state.clear()
+        state = self.state
+        if state.ready:
+            state.update(map_img)
+        else:
+            state.analyse(map_img)
+        ready = state.ready
+        directions = tuple(state.allow_directions()) if ready else ()
+        graph = state.room_graph() if ready else None
+        with self._cond:
+            if self._reset_requested:
+                # 分析期间进入了新的地下城，这次的结果作废
+                return
+            previous = self._snapshot
+            snapshot = MinimapSnapshot(previous.seq, time.monotonic(), ready, state.rows, state.cols,
+                                       state.boss_room, state.current_room, directions, graph)
+            if replace(snapshot, timestamp=previous.timestamp) != previous:
+                snapshot = replace(snapshot, seq=previous.seq + 1)
+                self._snapshot = snapshot
+                self._cond.notify_all()
+            else:
+                self._snapshot = snapshot
+
+    def stop(self, timeout: float = 2.0):
+        """停止线程，可重复调用"""
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def summary(self) -> str:
+        mean_ms = self.busy_seconds / self.reads * 1000 if self.reads else 0.0
+        return f"读取{self.reads}次 平均{mean_ms:.2f}ms 出错{self.errors}次; {self.state.summary()}"
+
+
+if __name__ == '__main__':
+    import map_util
+
+    # 用底图拼出 5x7 的小地图，蓝色标志每 0.3 秒换一个房间；截图模拟 3ms 的耗时。
+    # 对比打怪循环现场截图分析和读后台快照的耗时，以及换房间后快照更新的延迟
+    rng = np.random.default_rng(0)
+    tiles = [tile for item in map_util.npy_list for tile in item['img_num']]
+    rows, cols, cell = 5, 7, 18
+    frame = np.full((200, 200, 3), 30, dtype=np.uint8)
+    x0, y0 = 200 - 11 - cols * cell, 52
+    frame[y0 - 19:y0 - 1, x0:200 - 11] = (90, 90, 90)  # 行列数计算用到的上边框和右边框
+    frame[y0:y0 + rows * cell, 200 - 10:200 - 7] = (90, 90, 90)
+    for r in range(rows):
+        for c in range(cols):
+            frame[y0 + r * cell:y0 + (r + 1) * cell, x0 + c * cell:x0 + (c + 1) * cell] = tiles[rng.integers(len(tiles))]
+    frame[y0 + 4 * cell + 5:y0 + 4 * cell + 13, x0 + 6 * cell + 5:x0 + 6 * cell + 13] = (0, 0, 230)
+    route = [(0, c) for c in range(cols)] + [(r, cols - 1) for r in range(1, rows)]
+    t_start = time.monotonic()
+
+    def true_room():
+        return route[min(int((time.monotonic() - t_start) / 0.3), len(route) - 1)]
+
+    def grab():
+        time.sleep(0.003)
+        img = frame.copy()
+        y, x = y0 + true_room()[0] * cell, x0 + true_room()[1] * cell
+        img[y + 4:y + 14, x + 4:x + 14] = (230, 120, 20)
+        return img
+
+    inline_s, inline_n = 0.0, 0
+    state = MinimapState()
+    state.analyse(grab())
+    while true_room() != route[-1]:
+        t0 = time.perf_counter()
+        state.update(grab())
+        state.allow_directions()
+        inline_s += time.perf_counter() - t0
+        inline_n += 1
+        time.sleep(0.02)
+
+    t_start = time.monotonic()
+    lags, snap_s, snap_n = [], 0.0, 0
+    with MinimapWatcher(grab, fps=30) as watcher:
+        snap = watcher.wait_ready(timeout=2)
+        last_room, changed_at = snap.current_room, None
+        while true_room() != route[-1] or snap.current_room != route[-1]:
+            room = true_room()
+            if room != last_room and changed_at is None:
+                changed_at = time.monotonic()
+            t0 = time.perf_counter()
+            snap = watcher.snapshot()
+            snap.allow_directions()
+            snap_s += time.perf_counter() - t0
+            snap_n += 1
+            if changed_at is not None and snap.current_room == room:
+                lags.append(time.monotonic() - changed_at)
+                last_room, changed_at = room, None
+            time.sleep(0.005)
+        print(f'现场分析 每次 {inline_s / inline_n * 1000:.2f}ms; 读快照 每次 {snap_s / snap_n * 1e6:.1f}us; '
+              f'换房间后快照更新延迟 均值 {np.mean(lags) * 1000:.0f}ms 最大 {np.max(lags) * 1000:.0f}ms; '
+              f'{watcher.summary()}')
@@ -3,6 +3,8 @@
 __author__ = "723323692"
 __version__ = '1.0'
 
+from dnf.stronger.room_graph import DIRECTION_STEPS, OPPOSITE, shortest_route, step
+
 
 class PathFinder:
     # def __init__(self, rows, cols, start_pos, target_pos):
@@ -13,6 +15,14 @@ class PathFinder:
         self.visited = {}  # 记录已访问格子的联通方向
         self.path_stack = []  # 用于回溯的路径栈
         self.visited_diff_cnt = {}
+        self.map_links = {}  # 小地图一次识别出的房间连通关系，能连到终点时直接按最短路线走
+
+    def set_map_graph(self, links):
+        """
+        设置小地图识别出的房间连通关系
+        :param links: 房间 -> 能走的方向，见 room_graph.RoomGraph.links
+        """
+        self.map_links = {pos: list(directions) for pos, directions in links.items()}
 
     def get_next_direction(self, current_pos, directions):
         """
@@ -41,6 +51,15 @@ class PathFinder:
                     if self.visited_diff_cnt[current_pos] > 8:
                         self.visited_diff_cnt[current_pos] = 0
                         self.visited[current_pos] = directions
+
+        # 小地图上已经能看出到终点的路线，第一步必须是当前房间实际识别出的门，否则按原来的逻辑探索
+        if self.map_links:
+            path = self._plan_route(current_pos, directions)
+            if path and len(path) > 1:
+                direction = self._get_direction(current_pos, path[1])
+                if direction in directions:
+                    return direction
+
         # 收集全局候选方向
         candidates = self._collect_all_candidates()
 
@@ -66,6 +85,25 @@ class PathFinder:
         # 最后进行回溯
         return self._backtrack(current_pos)
 
+    def _plan_route(self, current_pos, directions):
+        """
+        BFS 到终点的最短路线
+        走过的房间（包括当前房间）以实际识别出的门为准，其余房间用小地图的连通关系；
+        相邻房间指向走过的房间、但走过的房间自己没有的门会被去掉
+        """
+        links = {pos: set(d) for pos, d in self.map_links.items()}
+        observed = {pos: d for pos, d in self.visited.items() if d}
+        if directions:
+            observed[current_pos] = directions
+        for pos, d in observed.items():
+            links[pos] = set(d)
+        for pos, d in observed.items():
+            for direction in DIRECTION_STEPS:
+                neighbor = step(pos, direction)
+                if direction not in d and neighbor in links:
+                    links[neighbor].discard(OPPOSITE[direction])
+        return shortest_route(links, current_pos, self.target_pos)
+
     def _collect_all_candidates(self):
         """收集所有已知的未探索相邻格子"""
         candidates = set()
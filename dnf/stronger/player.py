@@ -406,15 +406,20 @@ for i in range(10):
     pl_i = cv2.cvtColor(pl_i, cv2.COLOR_BGR2GRAY)
     pl_num_images[i] = pl_i
 
+# 疲劳值数字区域 (x, y, width, height)，可直接用于区域截图
+FATIGUE_ROI = (842, 592, 15, 5)
 
-def do_recognize_fatigue(img):
+
+def do_recognize_fatigue(img, origin=(0, 0)):
     """
     识别疲劳值
-    :param img: 截图图像 (BGR格式)
+    :param img: 截图图像 (BGR格式)，整窗截图或包含 FATIGUE_ROI 的区域截图
+    :param origin: img 左上角在窗口中的坐标，整窗截图为 (0, 0)
     :return: 疲劳值 (0-999)
     """
     # 5*5 *3
-    x1, y1, x2, y2 = 842, 592, 856 + 1, 596 + 1
+    x1, y1 = FATIGUE_ROI[0] - origin[0], FATIGUE_ROI[1] - origin[1]
+    x2, y2 = x1 + FATIGUE_ROI[2], y1 + FATIGUE_ROI[3]
     fatigue_region = img[y1:y2, x1:x2]
 
     # cv2.imwrite('./fatigue_region.png', fatigue_region)
@@ -0,0 +1,180 @@
+# -*- coding:utf-8 -*-
+"""
+地下城房间图模块 - 由小地图上所有已显示的格子一次建出完整的房间连通图
+
+小地图上已显示的房间都能从底图看出开门的方向，问号房间和 boss 房间看不到底图，
+由相邻房间开向它的门推断出来。进图时就能规划到 boss 房间的路线，
+不需要像 PathFinder 原来那样边走边试探。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+Room = Tuple[int, int]
+
+# 方向对应的 (行, 列) 偏移
+DIRECTION_STEPS = {
+    'UP': (-1, 0),
+    'DOWN': (1, 0),
+    'LEFT': (0, -1),
+    'RIGHT': (0, 1),
+}
+OPPOSITE = {'UP': 'DOWN', 'DOWN': 'UP', 'LEFT': 'RIGHT', 'RIGHT': 'LEFT'}
+
+
+def step(room: Room, direction: str) -> Room:
+    dr, dc = DIRECTION_STEPS[direction]
+    return room[0] + dr, room[1] + dc
+
+
+@dataclass
+class RoomGraph:
+    """
+    房间连通图
+
+    Attributes:
+        rows: 小地图行数
+        cols: 小地图列数
+        boss_room: boss 房间
+        tiles: 识别出底图的房间 -> 底图允许的方向
+        question_rooms: 显示问号的房间
+        links: 房间 -> 可能能走的方向（两侧任一侧识别出门就算连通，包含由相邻房间推断出的房间）。
+            一侧底图识别错了会多出一扇不存在的门，使用时要以实际进入房间后识别出的门为准
+    """
+    rows: int
+    cols: int
+    boss_room: Room
+    tiles: Dict[Room, List[str]] = field(default_factory=dict)
+    question_rooms: Set[Room] = field(default_factory=set)
+    links: Dict[Room, List[str]] = field(default_factory=dict)
+
+    def in_bounds(self, room: Room) -> bool:
+        return 0 <= room[0] < self.rows and 0 <= room[1] < self.cols
+
+    @property
+    def inferred_rooms(self) -> Set[Room]:
+        """没有识别出底图、只由相邻房间推断出来的房间（问号房间、boss 房间等），它们可能还有别的门"""
+        return set(self.links) - set(self.tiles)
+
+    def route(self, start: Room, target: Optional[Room] = None) -> Optional[List[Room]]:
+        """
+        BFS 最短路线
+
+        Returns:
+            从 start 到 target（默认 boss 房间）经过的房间列表（含首尾），不连通时返回None
+        """
+        target = self.boss_room if target is None else target
+        return shortest_route(self.links, start, target)
+
+    def summary(self) -> str:
+        return (f"{self.rows}x{self.cols} 识别底图{len(self.tiles)}个 问号{len(self.question_rooms)}个 "
+                f"推断{len(self.inferred_rooms)}个")
+
+
+def shortest_route(links: Dict[Room, Iterable[str]], start: Room, target: Room) -> Optional[List[Room]]:
+    """
+    在连通关系上 BFS
+
+    Args:
+        links: 房间 -> 能走的方向
+        start: 起点
+        target: 终点
+
+    Returns:
+        经过的房间列表（含首尾），不连通时返回None
+    """
+    if start == target:
+        return [start]
+    previous = {start: None}
+    queue = deque([start])
+    while queue:
+        current = queue.popleft()
+        for direction in links.get(current, ()):
+            next_room = step(current, direction)
+            if next_room in previous:
+                continue
+            previous[next_room] = current
+            if next_room == target:
+                path = [next_room]
+                while previous[path[-1]] is not None:
+                    path.append(previous[path[-1]])
+                return path[::-1]
+            queue.append(next_room)
+    return None
+
+
+def build_room_graph(rows: int, cols: int, boss_room: Room, tiles: Dict[Room, List[str]],
+                     question_rooms: Iterable[Room] = ()) -> RoomGraph:
+    """
+    由每个格子的底图分类结果建图
+
+    Args:
+        rows: 小地图行数
+        cols: 小地图列数
+        boss_room: boss 房间
+        tiles: 房间 -> 底图允许的方向，没有识别出底图的格子不要放进来
+        question_rooms: 显示问号的房间
+
+    Returns:
+        RoomGraph
+    """
+    graph = RoomGraph(rows, cols, boss_room, {room: list(d) for room, d in tiles.items() if d},
+                      set(question_rooms))
+    links: Dict[Room, Set[str]] = {room: set() for room in graph.question_rooms}
+    if graph.in_bounds(boss_room):
+        links.setdefault(boss_room, set())
+    for room, directions in graph.tiles.items():
+        links.setdefault(room, set())
+        for direction in directions:
+            next_room = step(room, direction)
+            if not graph.in_bounds(next_room):
+                continue
+            # 门两侧的格子任一侧识别出门就算连通，问号房间、boss 房间才能由相邻房间推断出来；
+            # 代价是一侧识别错时会多出不存在的门，PathFinder 会用走过房间实际识别出的门修正
+            links[room].add(direction)
+            links.setdefault(next_room, set()).add(OPPOSITE[direction])
+    order = list(DIRECTION_STEPS)
+    graph.links = {room: sorted(d, key=order.index) for room, d in links.items()}
+    return graph
+
+
+if __name__ == '__main__':
+    import random
+
+    from dnf.stronger.path_finder import PathFinder
+
+    # 随机生成 200 张 5x7 的地图（随机生成树 + 几条额外的门），对比 PathFinder 边走边试探
+    # 和进图时拿到完整房间图两种情况下，走到 boss 房间经过的房间数
+    rng = random.Random(0)
+    rows, cols = 5, 7
+    walked = {'试探': [], '房间图': []}
+    for _ in range(200):
+        rooms = [(r, c) for r in range(rows) for c in range(cols)]
+        tiles = {room: [] for room in rooms}
+        seen = {rng.choice(rooms)}
+        while len(seen) < len(rooms):
+            room = rng.choice(sorted(seen))
+            direction = rng.choice(list(DIRECTION_STEPS))
+            next_room = step(room, direction)
+            if next_room in tiles and (next_room not in seen or rng.random() < 0.03):
+                if direction not in tiles[room]:
+                    tiles[room].append(direction)
+                    tiles[next_room].append(OPPOSITE[direction])
+                seen.add(next_room)
+        start, boss = rng.sample(rooms, 2)
+        graph = build_room_graph(rows, cols, boss, tiles)
+        for name in walked:
+            finder = PathFinder(rows, cols, boss)
+            if name == '房间图':
+                finder.set_map_graph(graph.links)
+            room, count = start, 0
+            while room != boss and count < 200:
+                room = step(room, finder.get_next_direction(room, tiles[room]))
+                count += 1
+            walked[name].append(count)
+    for name, counts in walked.items():
+        print(f'{name}: 平均经过 {sum(counts) / len(counts):.1f} 个房间, 最多 {max(counts)} 个')
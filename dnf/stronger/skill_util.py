@@ -20,6 +20,8 @@ from utils import keyboard_utils as kbu
 # x2, y2 = 770, 712
 x1, y1 = 434, 534
 x2, y2 = 648, 593
+# 技能栏区域 (x, y, width, height)，可直接用于区域截图
+SKILL_BAR_ROI = (x1, y1, x2 - x1, y2 - y1)
 
 # skill_height = int((y2 - y1) / 2)
 # skill_width = int((x2 - x1) / 7)
@@ -153,8 +155,9 @@ def is_warm_color(hue, saturation):
     return False
 
 
-def skill_ready_warm_colors(skill_name, img):
+def skill_ready_warm_colors(skill_name, img, origin=(0, 0)):
     # 都>0.4 都小于0.3
+    # origin: img 左上角在窗口中的坐标，技能栏区域截图时为 SKILL_BAR_ROI[:2]
     if skill_name == "x":
         return True
     current_skill_dict = get_skill_dict()
@@ -162,8 +165,8 @@ def skill_ready_warm_colors(skill_name, img):
     if skill_name not in keys_list:
         return False
     index = keys_list.index(skill_name)
-    x = 434 + (28 + 3) * (index % 7)
-    y = 534 + (28 + 3) * (index // 7)
+    x = 434 + (28 + 3) * (index % 7) - origin[0]
+    y = 534 + (28 + 3) * (index // 7) - origin[1]
     skill_img = img[y:y + skill_height, x:x + skill_width]
     # 扣去顶部和底部带字的部分
     # skill_img = skill_img[7:-7, :]
@@ -198,7 +201,8 @@ def suggest_skill(role: RoleConfig, img0):
     return skill_name
 
 
-def check_one_skill_cd(skill_key, img, skill_images):
+def check_one_skill_cd(skill_key, img, skill_images, origin=(0, 0)):
+    # origin: img 左上角在窗口中的坐标，技能栏区域截图时为 SKILL_BAR_ROI[:2]
     if skill_key == "x":
         return True
     current_skill_dict = get_skill_dict()
@@ -206,8 +210,8 @@ def check_one_skill_cd(skill_key, img, skill_images):
     if skill_key not in keys_list:
         return False
     index = keys_list.index(skill_key)
-    x = 434 + (28 + 3) * (index % 7)
-    y = 534 + (28 + 3) * (index // 7)
+    x = 434 + (28 + 3) * (index % 7) - origin[0]
+    y = 534 + (28 + 3) * (index // 7) - origin[1]
     skill_img = img[y:y + skill_height, x:x + skill_width]
     init_skill_img = skill_images[skill_key]
     gray = cv2.cvtColor(skill_img, cv2.COLOR_BGR2GRAY)
@@ -346,18 +350,19 @@ def cast_skill(s):
         time.sleep(0.6)
 
 
-def get_skill_initial_images(full_image):
+def get_skill_initial_images(full_image, origin=(0, 0)):
     """
     初始化技能图片
-    :param full_image:
+    :param full_image: 整窗截图或技能栏区域截图
+    :param origin: full_image 左上角在窗口中的坐标，技能栏区域截图时为 SKILL_BAR_ROI[:2]
     :return:
     """
     skill_images = {}
     current_skill_dict = get_skill_dict()
     # 遍历技能快捷栏
     for index, key in enumerate(current_skill_dict.keys()):
-        _x = 434 + (28 + 3) * (index % 7)
-        _y = 534 + (28 + 3) * (index // 7)
+        _x = 434 + (28 + 3) * (index % 7) - origin[0]
+        _y = 534 + (28 + 3) * (index // 7) - origin[1]
         # print()
 
         # 扣出技能格子图片
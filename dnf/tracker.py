@@ -0,0 +1,244 @@
+# -*- coding:utf-8 -*-
+"""
+多目标跟踪模块 - 在检测结果上做 SORT 式跟踪（匀速预测 + IoU 匈牙利匹配）
+
+给怪物、掉落物、门和角色分配稳定的编号，没有运行检测的帧按速度外推位置，
+走向门口、捡材料时可以隔帧运行 YOLO，决策代码仍然拿到最新的位置。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import itertools
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from dnf.detection import box_iou
+
+# 参与跟踪的 DetResult 属性，hero_xywh 为单个坐标，其余为坐标列表
+TRACKED_ATTRS = (
+    'hero_xywh',
+    'monster_xywh_list',
+    'elite_monster_xywh_list',
+    'boss_xywh_list',
+    'loot_xywh_list',
+    'gold_xywh_list',
+    'door_xywh_list',
+    'door_boss_xywh_list',
+    'obstacle_xywh_list',
+)
+
+# 不参与跟踪的 DetResult 标志位（翻牌、菜单、商店、结算），跳过检测的帧沿用上一次检测的值
+FLAG_ATTRS = (
+    'card_num',
+    'continue_exist',
+    'shop_exist',
+    'menu_exist',
+    'shop_mystery_exist',
+    'sss_exist',
+)
+
+
+def xywh2xyxy(xywh: np.ndarray) -> np.ndarray:
+    xyxy = np.empty_like(xywh)
+    xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    xyxy[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+    return xyxy
+
+
+class Track:
+    """单个目标：最近一次匹配到的框 (cx, cy, w, h) 和中心点速度（像素/秒）"""
+
+    __slots__ = ('id', 'box', 'velocity', 'timestamp', 'hits')
+
+    def __init__(self, track_id: int, box: np.ndarray, timestamp: float):
+        self.id = track_id
+        self.box = box.astype(np.float64)
+        self.velocity = np.zeros(2)
+        self.timestamp = timestamp
+        self.hits = 1
+
+    def predict(self, timestamp: float) -> np.ndarray:
+        """外推到 timestamp 时刻的框"""
+        box = self.box.copy()
+        box[:2] += self.velocity * (timestamp - self.timestamp)
+        return box
+
+
+class MultiTracker:
+    """
+    检测结果跟踪
+
+    每个属性（怪物、掉落物、门……）单独维护一组轨迹。
+    update() 用新的检测结果更新轨迹并给每个框分配编号，写入 det.track_ids；
+    predict() 在没有运行检测的帧上，用轨迹外推出一份同格式的检测结果。
+    没有匹配到的轨迹只在内部保留（保持编号稳定），predict() 只输出最近一次 update 匹配到的目标，
+    已经捡走的掉落物、上一个房间的门不会再出现在外推结果里。
+
+    Args:
+        attrs: 参与跟踪的 DetResult 属性
+        iou_threshold: 预测框与检测框匹配的最小 IoU
+        max_age: 轨迹多久（秒）没有匹配到就删除
+        smoothing: 速度的平滑系数，越大越相信最新的位移
+        max_speed: 速度上限（像素/秒），防止误匹配造成的跳变被外推放大
+    """
+
+    def __init__(self, attrs: Sequence[str] = TRACKED_ATTRS, iou_threshold: float = 0.3, max_age: float = 0.5,
+                 smoothing: float = 0.5, max_speed: float = 2000.0):
+        self.attrs = tuple(attrs)
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.smoothing = smoothing
+        self.max_speed = max_speed
+        self._tracks: Dict[str, List[Track]] = {attr: [] for attr in self.attrs}
+        self._ids = itertools.count(1)
+        self.timestamp: Optional[float] = None  # 最近一次 update 的时间
+
+    def has_tracks(self, attr: Optional[str] = None) -> bool:
+        if attr is not None:
+            return bool(self._tracks[attr])
+        return any(self._tracks.values())
+
+    def tracks(self, attr: str) -> List[Track]:
+        return self._tracks[attr]
+
+    def _associate(self, tracks: List[Track], boxes: np.ndarray, timestamp: float) -> List[int]:
+        """匈牙利算法匹配，返回每个检测框对应的轨迹下标，没有匹配为-1"""
+        matches = [-1] * len(boxes)
+        if not tracks or not len(boxes):
+            return matches
+        predicted = np.stack([t.predict(timestamp) for t in tracks])
+        iou = box_iou(xywh2xyxy(predicted), xywh2xyxy(boxes))
+        rows, cols = linear_sum_assignment(-iou)
+        for r, c in zip(rows, cols):
+            if iou[r, c] >= self.iou_threshold:
+                matches[c] = r
+        return matches
+
+    def _update_attr(self, attr: str, boxes: np.ndarray, timestamp: float) -> List[int]:
+        tracks = self._tracks[attr]
+        matches = self._associate(tracks, boxes, timestamp)
+        ids, kept = [], []
+        matched = set()
+        for box, m in zip(boxes, matches):
+            if m < 0:
+                track = Track(next(self._ids), box, timestamp)
+            else:
+                track = tracks[m]
+                matched.add(m)
+                dt = timestamp - track.timestamp
+                if dt > 0:
+                    measured = (box[:2] - track.box[:2]) / dt
+                    velocity = self.smoothing * measured + (1 - self.smoothing) * track.velocity
+                    speed = np.hypot(*velocity)
+                    track.velocity = velocity if speed <= self.max_speed else velocity * (self.max_speed / speed)
+                track.box = box.astype(np.float64)
+                track.timestamp = timestamp
+                track.hits += 1
+            ids.append(track.id)
+            kept.append(track)
+        # 没有匹配到的轨迹保留到 max_age，短暂漏检时编号不变
+        kept.extend(t for i, t in enumerate(tracks)
+                    if i not in matched and timestamp - t.timestamp <= self.max_age)
+        self._tracks[attr] = kept
+        return ids
+
+    def update(self, det, timestamp: float):
+        """
+        用检测结果更新轨迹
+
+        Args:
+            det: analyse_det_result 返回的 DetResult
+            timestamp: 帧时间戳（time.monotonic）
+
+        Returns:
+            det，增加 track_ids: {属性名: 与坐标列表一一对应的编号列表}
+        """
+        track_ids = {}
+        for attr in self.attrs:
+            value = getattr(det, attr, None)
+            if value is None:
+                value = []
+            elif attr == 'hero_xywh':
+                value = [value]
+            boxes = np.asarray(value, dtype=np.float64).reshape(-1, 4)
+            track_ids[attr] = self._update_attr(attr, boxes, timestamp)
+        det.track_ids = track_ids
+        self.timestamp = timestamp
+        return det
+
+    def predict(self, timestamp: float, det, previous=None):
+        """
+        没有运行检测的帧：用最近一次 update 匹配到的轨迹外推各目标的位置
+
+        Args:
+            timestamp: 当前帧时间戳
+            det: 空的 DetResult，外推结果写入其中
+            previous: 上一次的检测结果，FLAG_ATTRS 中的标志位从它复制；None 时保持 det 的默认值
+
+        Returns:
+            det
+        """
+        if previous is not None:
+            for attr in FLAG_ATTRS:
+                if hasattr(previous, attr):
+                    setattr(det, attr, getattr(previous, attr))
+        track_ids = {}
+        for attr in self.attrs:
+            tracks = [t for t in self._tracks[attr]
+                      if t.timestamp == self.timestamp and timestamp - t.timestamp <= self.max_age]
+            boxes = [t.predict(timestamp).tolist() for t in tracks]
+            if attr == 'hero_xywh':
+                # 同一时刻只有一个角色，取最近匹配到的轨迹
+                best = max(tracks, key=lambda t: t.timestamp, default=None)
+                setattr(det, attr, best.predict(timestamp).tolist() if best else None)
+                track_ids[attr] = [best.id] if best else []
+            else:
+                setattr(det, attr, boxes)
+                track_ids[attr] = [t.id for t in tracks]
+        det.track_ids = track_ids
+        return det
+
+    def reset(self):
+        """清除所有轨迹（换房间、换地图时调用）"""
+        for attr in self.attrs:
+            self._tracks[attr] = []
+        self.timestamp = None
+
+
+if __name__ == '__main__':
+    import time
+
+    class _Det:
+        hero_xywh = None
+
+    # 模拟角色和怪物匀速移动（30 FPS），每3帧检测一次，统计外推误差和单次更新耗时
+    rng = np.random.default_rng(0)
+    n_monsters, fps, frames = 20, 30.0, 300
+    start = rng.uniform([100, 150], [900, 500], (n_monsters, 2))
+    speed = rng.uniform(-150, 150, (n_monsters, 2))
+    tracker = MultiTracker()
+    errors, update_s, n_updates = [], 0.0, 0
+    for f in range(frames):
+        t = f / fps
+        pos = start + speed * t
+        truth = [[x, y, 60.0, 90.0] for x, y in pos]
+        if f % 3 == 0:
+            det = _Det()
+            det.monster_xywh_list = [[x + rng.normal(0, 1.5), y + rng.normal(0, 1.5), w, h] for x, y, w, h in truth]
+            det.hero_xywh = [500 + 200 * t, 300.0, 50.0, 110.0]
+            t0 = time.perf_counter()
+            tracker.update(det, t)
+            update_s += time.perf_counter() - t0
+            n_updates += 1
+        else:
+            det = tracker.predict(t, _Det())
+            if f > 6:
+                pred = np.asarray(det.monster_xywh_list)
+                gt = np.asarray(truth)
+                d = np.hypot(*(pred[:, None, :2] - gt[None, :, :2]).transpose(2, 0, 1)).min(axis=1)
+                errors.extend(d.tolist())
+    print(f'{n_monsters} 个目标，单次 update {update_s / n_updates * 1e6:.0f}us，'
+          f'跳过检测的帧外推误差 均值 {np.mean(errors):.1f}px，最大 {np.max(errors):.1f}px')
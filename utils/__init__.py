@@ -21,6 +21,10 @@ from utils.custom_thread_pool_executor import (
     SingleTaskThreadPool,
     LimitedTaskThreadPool,
 )
+from utils.frame_ring import (
+    Frame,
+    FrameRing,
+)
 from utils.window_utils import (
     WindowCapture,
     get_window_handle,
@@ -29,6 +33,24 @@ from utils.window_utils import (
     capture_window_BGRX,
     crop_image,
 )
+from utils.capture_thread import CaptureThread
+from utils.roi_capture import RegionCapture
+from utils.frame_change import FrameChangeDetector
+from utils.frame_source import (
+    FrameSource,
+    ReplayFrameSource,
+)
+from utils.session_recorder import (
+    SessionRecorder,
+    RecordingReader,
+)
+from utils.performance import FrameRateGovernor
+from utils.shm_ring import SharedArrayRing
+from utils.pipeline import (
+    LatestSlot,
+    PipelineStage,
+    StageStats,
+)
 
 __all__ = [
     # utilities
@@ -44,6 +66,9 @@ __all__ = [
     # thread pool
     'SingleTaskThreadPool',
     'LimitedTaskThreadPool',
+    # frame ring
+    'Frame',
+    'FrameRing',
     # window utils
     'WindowCapture',
     'get_window_handle',
@@ -51,4 +76,24 @@ __all__ = [
     'capture_window_image',
     'capture_window_BGRX',
     'crop_image',
+    # capture thread
+    'CaptureThread',
+    # region capture
+    'RegionCapture',
+    # frame change
+    'FrameChangeDetector',
+    # frame source
+    'FrameSource',
+    'ReplayFrameSource',
+    # session recorder
+    'SessionRecorder',
+    'RecordingReader',
+    # performance
+    'FrameRateGovernor',
+    # shared memory ring
+    'SharedArrayRing',
+    # pipeline
+    'LatestSlot',
+    'PipelineStage',
+    'StageStats',
 ]
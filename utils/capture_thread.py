@@ -0,0 +1,171 @@
+# -*- coding:utf-8 -*-
+"""
+后台截图线程 - 持续截图并发布最新帧，让截图和模型推理重叠执行
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from utils.frame_ring import Frame
+
+logger = logging.getLogger(__name__)
+
+
+class CaptureThread(threading.Thread):
+    """
+    后台截图线程
+
+    不断调用 source.acquire() 截图，只保留最新一帧，并打上单调递增的序号；
+    帧来源没有给出时间戳时打上 time.monotonic() 时间戳（回放帧保留录制时的时间戳）。
+    消费方用 get_latest() 取比上次更新的帧，旧帧直接丢弃。
+
+    支持上下文管理器协议（进入时启动，退出时停止）
+    """
+
+    def __init__(self, source, max_fps: float = 30.0, name: str = 'CaptureThread'):
+        """
+        Args:
+            source: 帧来源，需实现 acquire()（WindowCapture / ReplayFrameSource）
+            max_fps: 最大截图帧率，0 表示不限制
+            name: 线程名
+        """
+        super().__init__(name=name, daemon=True)
+        self.source = source
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._latest: Optional[Frame] = None
+        self._seq = 0
+        self._finished = False  # 帧来源已结束（回放结束）
+        self._error: Optional[BaseException] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    @property
+    def latest_seq(self) -> int:
+        """最新帧序号，还没有帧时为-1"""
+        with self._cond:
+            return self._latest.seq if self._latest is not None else -1
+
+    def run(self):
+        while not self._stop_event.is_set():
+            start = time.monotonic()
+            try:
+                frame = self.source.acquire()
+            except StopIteration:
+                with self._cond:
+                    self._finished = True
+                    self._cond.notify_all()
+                return
+            except Exception as e:
+                # 截图偶发失败（窗口最小化等）不退出线程
+                logger.debug(f"截图失败: {e}")
+                with self._cond:
+                    self._error = e
+                self._stop_event.wait(0.05)
+                continue
+
+            frame.seq = self._seq
+            if not frame.timestamp:
+                frame.timestamp = time.monotonic()
+            self._seq += 1
+            with self._cond:
+                old, self._latest = self._latest, frame
+                self._error = None
+                self._cond.notify_all()
+            if old is not None:
+                old.release()
+
+            if self.min_interval:
+                wait_time = self.min_interval - (time.monotonic() - start)
+                if wait_time > 0:
+                    self._stop_event.wait(wait_time)
+
+    def get_latest(self, after_seq: int = -1, timeout: Optional[float] = None) -> Optional[Frame]:
+        """
+        取最新帧
+
+        Args:
+            after_seq: 只返回序号大于它的帧（传入上次拿到的序号，保证不会重复处理同一帧）
+            timeout: 等待新帧的超时时间（秒），None 表示一直等待
+
+        Returns:
+            持有的帧引用，用完调用 release()；超时返回None
+
+        Raises:
+            StopIteration: 帧来源已结束（与用户停止脚本走同一条退出路径）
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._latest is None or self._latest.seq <= after_seq:
+                if self._finished:
+                    raise StopIteration("帧来源已结束")
+                if self._stop_event.is_set():
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._latest.retain()
+
+    def stop(self, timeout: float = 1.0):
+        """停止线程并释放持有的帧，可重复调用"""
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        with self._cond:
+            old, self._latest = self._latest, None
+        if old is not None:
+            old.release()
+
+
+if __name__ == '__main__':
+    import numpy as np
+
+    from utils.frame_ring import FrameRing
+
+    class _SlowSource:
+        """模拟截图耗时的帧来源"""
+
+        def __init__(self, grab_ms: float):
+            self.grab_ms = grab_ms
+            self.ring = FrameRing((600, 1067, 3), slots=4)
+            self.img = np.zeros((600, 1067, 3), dtype=np.uint8)
+
+        def acquire(self):
+            time.sleep(self.grab_ms / 1000)
+            slot = self.ring.acquire_write()
+            self.ring.publish(slot, self.img)
+            return self.ring.acquire_latest()
+
+    # 对比同步截图与后台截图的单帧耗时（截图 8ms + 推理 25ms）
+    grab_ms, infer_ms, n = 8, 25, 40
+    src = _SlowSource(grab_ms)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with src.acquire():
+            time.sleep(infer_ms / 1000)
+    sync_ms = (time.perf_counter() - t0) / n * 1000
+
+    last_seq = -1
+    with CaptureThread(_SlowSource(grab_ms), max_fps=0) as capture_thread:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            with capture_thread.get_latest(last_seq) as f:
+                last_seq = f.seq
+                time.sleep(infer_ms / 1000)
+        async_ms = (time.perf_counter() - t0) / n * 1000
+    print(f'同步截图: {sync_ms:.1f}ms/帧, 后台截图: {async_ms:.1f}ms/帧')
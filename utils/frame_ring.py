@@ -0,0 +1,189 @@
+# -*- coding:utf-8 -*-
+"""
+帧槽位环模块 - 预分配多个帧缓冲区，截图写入空闲槽位，读取方持有期间槽位不会被覆盖
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class Frame:
+    """
+    帧引用
+
+    通过 FrameRing.acquire_latest() 获得时持有槽位，用完必须 release()，
+    支持上下文管理器协议。不属于任何环的帧 release() 为空操作。
+    """
+
+    __slots__ = ('img', 'seq', 'timestamp', '_ring', '_slot', '_released')
+
+    def __init__(self, img: np.ndarray, seq: int = -1, timestamp: float = 0.0,
+                 ring: Optional['FrameRing'] = None, slot: int = -1):
+        self.img = img
+        self.seq = seq
+        self.timestamp = timestamp
+        self._ring = ring
+        self._slot = slot
+        self._released = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+        return False
+
+    def retain(self) -> 'Frame':
+        """再持有一次同一帧，返回新的帧引用，需要单独 release()"""
+        if self._ring is None:
+            return Frame(self.img, self.seq, self.timestamp)
+        return self._ring.acquire(self._slot, self.seq, self.timestamp)
+
+    def release(self, *_):
+        """释放槽位，可重复调用；多余的参数便于直接作为 Future 的完成回调"""
+        if self._released:
+            return
+        self._released = True
+        if self._ring is not None:
+            self._ring.release(self._slot)
+
+
+class FrameRing:
+    """
+    预分配的帧槽位环
+
+    写入方: acquire_write() 取一个空闲槽位 -> 写入 buffer(slot) 或直接给出外部数组 -> publish()
+    读取方: acquire_latest() 持有最新帧 -> 使用 -> Frame.release()
+
+    空闲槽位指未被持有、且不是最新帧的槽位，因此最新帧和所有被持有的帧都不会被覆盖。
+    所有槽位都被占用时自动扩容一个槽位，不阻塞截图。
+    """
+
+    def __init__(self, shape: Tuple[int, ...], slots: int = 3, dtype=np.uint8):
+        """
+        Args:
+            shape: 帧形状，如 (600, 1067, 3)
+            slots: 槽位数量，默认3（写入中/最新/被持有）
+            dtype: 数据类型
+        """
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._buffers: List[np.ndarray] = [np.zeros(self.shape, dtype=dtype) for _ in range(slots)]
+        self._frames: List[Optional[np.ndarray]] = [None] * slots  # 槽位当前发布的图像
+        self._refs = [0] * slots
+        self._seqs = [-1] * slots
+        self._timestamps = [0.0] * slots
+        self._writing = [False] * slots
+        self._latest = -1
+        self._next_seq = 0
+        self._cursor = 0
+
+    @property
+    def slots(self) -> int:
+        return len(self._buffers)
+
+    def acquire_write(self) -> int:
+        """取一个空闲槽位用于写入"""
+        with self._lock:
+            n = len(self._buffers)
+            for i in range(n):
+                slot = (self._cursor + i) % n
+                if slot != self._latest and self._refs[slot] == 0 and not self._writing[slot]:
+                    self._cursor = (slot + 1) % n
+                    self._writing[slot] = True
+                    return slot
+            # 所有槽位都被占用，扩容
+            self._buffers.append(np.zeros(self.shape, dtype=self.dtype))
+            self._frames.append(None)
+            self._refs.append(0)
+            self._seqs.append(-1)
+            self._timestamps.append(0.0)
+            self._writing.append(True)
+            return n
+
+    def buffer(self, slot: int) -> np.ndarray:
+        """槽位的预分配缓冲区"""
+        return self._buffers[slot]
+
+    def publish(self, slot: int, img: Optional[np.ndarray] = None, timestamp: Optional[float] = None) -> np.ndarray:
+        """
+        发布写入完成的槽位为最新帧
+
+        Args:
+            slot: acquire_write() 得到的槽位
+            img: 外部图像（零拷贝引用），None 表示使用已写入的预分配缓冲区
+            timestamp: 帧时间戳（time.monotonic），默认当前时间
+
+        Returns:
+            发布的图像
+        """
+        with self._lock:
+            frame = self._buffers[slot] if img is None else img
+            self._frames[slot] = frame
+            self._seqs[slot] = self._next_seq
+            self._timestamps[slot] = time.monotonic() if timestamp is None else timestamp
+            self._next_seq += 1
+            self._writing[slot] = False
+            self._latest = slot
+            return frame
+
+    def cancel(self, slot: int):
+        """放弃写入中的槽位"""
+        with self._lock:
+            self._writing[slot] = False
+
+    def acquire_latest(self) -> Optional[Frame]:
+        """持有最新帧，没有帧时返回None"""
+        with self._lock:
+            slot = self._latest
+            if slot < 0:
+                return None
+            self._refs[slot] += 1
+            return Frame(self._frames[slot], self._seqs[slot], self._timestamps[slot], self, slot)
+
+    def acquire(self, slot: int, seq: int, timestamp: float) -> Frame:
+        """再持有一次已被持有的槽位"""
+        with self._lock:
+            self._refs[slot] += 1
+            return Frame(self._frames[slot], seq, timestamp, self, slot)
+
+    def latest_seq(self) -> int:
+        """最新帧序号，没有帧时为-1"""
+        with self._lock:
+            return self._seqs[self._latest] if self._latest >= 0 else -1
+
+    def release(self, slot: int):
+        with self._lock:
+            if self._refs[slot] > 0:
+                self._refs[slot] -= 1
+
+
+if __name__ == '__main__':
+    # 对比: 每帧 copyto 到共享缓冲区再 .copy() 给工作线程 vs 环形槽位持有
+    shape = (600, 1067, 3)
+    src = np.random.randint(0, 255, shape, dtype=np.uint8)
+    n = 200
+
+    shared = np.zeros(shape, dtype=np.uint8)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        np.copyto(shared, src)
+        _ = shared.copy()
+    old_ms = (time.perf_counter() - t0) / n * 1000
+
+    ring = FrameRing(shape)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        s = ring.acquire_write()
+        ring.publish(s, src)
+        with ring.acquire_latest():
+            pass
+    new_ms = (time.perf_counter() - t0) / n * 1000
+    print(f'共享缓冲区+copy: {old_ms:.3f}ms/帧, 槽位环零拷贝: {new_ms:.3f}ms/帧, 槽位数 {ring.slots}')
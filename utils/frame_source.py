@@ -0,0 +1,224 @@
+# -*- coding:utf-8 -*-
+"""
+帧来源模块 - 统一实时截图与录制回放的接口
+
+WindowCapture 只能在 Windows 上截取真实窗口，ReplayFrameSource 从磁盘按原始时间戳
+回放录制好的帧，便于在 Linux 上无界面地跑基准测试和回归测试。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import csv
+import os
+import threading
+import time
+from typing import List, Protocol, Tuple, runtime_checkable
+
+import cv2
+import numpy as np
+
+from utils.frame_ring import Frame
+from utils.session_recorder import RecordingReader
+
+# 回放会话的索引文件名，每行: seq,timestamp,filename
+SESSION_INDEX_FILE = 'index.csv'
+# 支持的帧文件格式（.npy 为原始像素，无需解码）
+FRAME_EXTENSIONS = ('.npy', '.png', '.bmp', '.jpg', '.jpeg')
+
+
+@runtime_checkable
+class FrameSource(Protocol):
+    """
+    帧来源协议
+
+    capture() 返回 BGR 格式的 (H, W, 3) uint8 图像，
+    acquire() 截图并返回持有的帧引用（跨线程使用时避免被后续截图覆盖），
+    capture_region() 只截取一个区域（小地图、技能栏等），
+    last_timestamp 为最近一帧的时间戳（秒，实时截图为 time.monotonic()，回放为录制时的时间戳）
+    """
+    width: int
+    height: int
+    last_timestamp: float
+
+    def capture(self) -> np.ndarray:
+        ...
+
+    def acquire(self) -> Frame:
+        ...
+
+    def capture_region(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        ...
+
+    def release(self) -> None:
+        ...
+
+
+class ReplayFrameSource:
+    """
+    录制会话回放
+
+    会话目录结构:
+        index.csv          seq,timestamp,filename（可选，没有时按文件名排序）
+        000000.npy ...     帧文件，支持 .npy/.png/.bmp/.jpg
+    也可以直接回放 SessionRecorder 的录制目录（meta.json + frames.bin）
+
+    支持上下文管理器协议
+    """
+
+    def __init__(self, session_dir: str, realtime: bool = True, loop: bool = False,
+                 default_fps: float = 10.0):
+        """
+        初始化回放
+
+        Args:
+            session_dir: 会话目录
+            realtime: 是否按原始时间间隔回放，False 则尽可能快地回放（基准测试用）
+            loop: 回放结束后是否从头开始
+            default_fps: 没有索引文件时使用的帧率
+        """
+        self.session_dir = session_dir
+        self.realtime = realtime
+        self.loop = loop
+        self.recording = None
+        if RecordingReader.is_recording(session_dir):
+            self.recording = RecordingReader(session_dir)
+            self._entries = [(self.recording.timestamp(i), i) for i in range(len(self.recording))]
+        else:
+            self._entries = self._load_index(session_dir, default_fps)
+        if not self._entries:
+            raise Exception(f"回放会话'{session_dir}'中没有找到帧文件.")
+
+        self._pos = 0
+        self._replay_start = None  # 回放开始的本地时间
+        self._session_start = self._entries[0][0]  # 会话第一帧的原始时间
+        self._released = False
+        self._lock = threading.Lock()  # 后台截图线程和主线程可能同时读取
+        self.last_timestamp = 0.0
+        self.last_seq = -1
+        self._last_frame = None
+
+        first = self._read(self._entries[0][1])
+        self.height, self.width = first.shape[:2]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+        return False
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _load_index(session_dir: str, default_fps: float) -> List[Tuple[float, str]]:
+        """读取索引，返回 [(timestamp, path), ...]"""
+        index_path = os.path.join(session_dir, SESSION_INDEX_FILE)
+        entries = []
+        if os.path.exists(index_path):
+            with open(index_path, newline='', encoding='utf-8') as f:
+                for row in csv.reader(f):
+                    if not row or row[0] == 'seq':
+                        continue
+                    entries.append((int(row[0]), float(row[1]), os.path.join(session_dir, row[2])))
+            entries.sort(key=lambda e: e[0])
+            return [(ts, path) for _, ts, path in entries]
+
+        names = sorted(n for n in os.listdir(session_dir) if n.lower().endswith(FRAME_EXTENSIONS))
+        interval = 1.0 / default_fps if default_fps else 0.0
+        return [(i * interval, os.path.join(session_dir, n)) for i, n in enumerate(names)]
+
+    def _read(self, key) -> np.ndarray:
+        if self.recording is not None:
+            return np.array(self.recording.frame(key))
+        return self._read_frame(key)
+
+    @staticmethod
+    def _read_frame(path: str) -> np.ndarray:
+        if path.lower().endswith('.npy'):
+            img = np.load(path)
+        else:
+            img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            raise Exception(f"读取回放帧失败: {path}")
+        if img.ndim == 3 and img.shape[2] == 4:
+            img = img[..., :3]
+        return np.ascontiguousarray(img)
+
+    def capture(self) -> np.ndarray:
+        """
+        读取下一帧
+
+        Returns:
+            BGR 图像
+
+        Raises:
+            StopIteration: 回放结束（与用户停止脚本走同一条退出路径）
+        """
+        with self._lock:
+            return self._capture()
+
+    def _capture(self) -> np.ndarray:
+        if self._pos >= len(self._entries):
+            if not self.loop:
+                raise StopIteration("回放会话已结束")
+            self._pos = 0
+            self._replay_start = None
+
+        timestamp, key = self._entries[self._pos]
+        if self.realtime:
+            now = time.perf_counter()
+            if self._replay_start is None:
+                self._replay_start = now - (timestamp - self._session_start)
+            wait_time = (timestamp - self._session_start) - (now - self._replay_start)
+            if wait_time > 0:
+                time.sleep(wait_time)
+
+        frame = self._read(key)
+        self._last_frame = frame
+        self.last_timestamp = timestamp
+        self.last_seq = self._pos
+        self._pos += 1
+        return frame
+
+    def acquire(self) -> Frame:
+        """读取下一帧，每帧都是新数组，release() 为空操作"""
+        with self._lock:
+            frame = self._capture()
+            return Frame(frame, self.last_seq, self.last_timestamp)
+
+    def capture_region(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """从最近一帧中裁剪区域，不推进回放位置；还没有读过帧时先读一帧"""
+        with self._lock:
+            if self._last_frame is None:
+                self._capture()
+            return self._last_frame[y:y + height, x:x + width].copy()
+
+    def rewind(self):
+        """回到第一帧"""
+        self._pos = 0
+        self._replay_start = None
+
+    def release(self):
+        """释放资源，可重复调用"""
+        self._released = True
+
+
+if __name__ == '__main__':
+    import sys
+
+    # 用法: python -m utils.frame_source <会话目录>
+    # 不按时间间隔回放，测量读取吞吐
+    source = ReplayFrameSource(sys.argv[1], realtime=False)
+    t0 = time.perf_counter()
+    count = 0
+    try:
+        while True:
+            source.capture()
+            count += 1
+    except StopIteration:
+        pass
+    elapsed = time.perf_counter() - t0
+    print(f'{count} 帧 ({source.width}x{source.height})，耗时 {elapsed:.2f}s，'
+          f'{count / elapsed if elapsed > 0 else 0:.1f} FPS')
@@ -1,6 +1,6 @@
 # -*- coding:utf-8 -*-
 """
-性能监控工具模块
+性能监控工具模块 - 帧率统计、计时、限速、按阶段的帧率调度
 """
 
 __author__ = "723323692"
@@ -8,7 +8,7 @@ __version__ = '1.0'
 
 import time
 from functools import wraps
-from typing import Callable, Any
+from typing import Callable, Any, Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -104,3 +104,143 @@ class RateLimiter:
     def can_execute(self) -> bool:
         """检查是否可以执行（不等待）"""
         return time.time() - self.last_time >= self.min_interval
+
+
+class FrameRateGovernor:
+    """
+    按阶段调整处理帧率
+
+    打怪需要高帧率，走向门口、捡材料、结算/商店只需要很低的帧率。
+    每个阶段有自己的目标帧率；推理耗时（滑动平均）超过帧间隔的预算时逐步拉长帧间隔，
+    耗时恢复后再逐步回到目标帧率。各阶段的帧数、降频次数等记录在 stats() 中。
+
+    Example:
+        governor = FrameRateGovernor({'attack': 20, 'next_room': 8}, default_fps=10)
+        while True:
+            governor.wait()
+            ...
+            governor.record_inference(infer_seconds)
+            governor.set_phase('attack' if monsters else 'next_room')
+    """
+
+    def __init__(self, phase_fps: Dict[str, float], default_fps: float = 10.0, budget: float = 0.8,
+                 backoff: float = 1.25, max_backoff: float = 4.0, recover: float = 0.95, smoothing: float = 0.2):
+        """
+        Args:
+            phase_fps: 各阶段的目标帧率，0 表示不限制
+            default_fps: 未列出的阶段使用的帧率
+            budget: 推理耗时占帧间隔的比例上限，超过时降频
+            backoff: 每次超出预算时帧间隔放大的倍数
+            max_backoff: 帧间隔最多放大的倍数
+            recover: 耗时回到预算内时每帧恢复的比例
+            smoothing: 推理耗时滑动平均的系数
+        """
+        self.phase_fps = dict(phase_fps)
+        self.default_fps = default_fps
+        self.budget = budget
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.recover = recover
+        self.smoothing = smoothing
+        self.phase = 'default'
+        self.multiplier = 1.0  # 当前降频倍数
+        self.inference_time = 0.0  # 推理耗时滑动平均（秒）
+        self._last_frame = 0.0
+        self._phase_frames: Dict[str, int] = {}
+        self._phase_seconds: Dict[str, float] = {}
+        self._backoff_events = 0
+        self._phase_changes = 0
+
+    def target_fps(self, phase: Optional[str] = None) -> float:
+        return self.phase_fps.get(self.phase if phase is None else phase, self.default_fps)
+
+    @property
+    def interval(self) -> float:
+        """当前帧间隔（秒），0 表示不限制"""
+        fps = self.target_fps()
+        return self.multiplier / fps if fps else 0.0
+
+    def set_phase(self, phase: str):
+        """切换阶段（在本帧的决策确定后调用，影响下一帧的等待时间）"""
+        if phase != self.phase:
+            self.phase = phase
+            self._phase_changes += 1
+
+    def record_inference(self, seconds: float):
+        """记录一次推理耗时，超出预算时降频，否则逐步恢复"""
+        if self.inference_time:
+            self.inference_time += self.smoothing * (seconds - self.inference_time)
+        else:
+            self.inference_time = seconds
+        fps = self.target_fps()
+        if fps and self.inference_time > self.budget * self.multiplier / fps:
+            if self.multiplier < self.max_backoff:
+                self.multiplier = min(self.max_backoff, self.multiplier * self.backoff)
+                self._backoff_events += 1
+        else:
+            self.multiplier = max(1.0, self.multiplier * self.recover)
+
+    def wait(self) -> float:
+        """等到下一帧的时间，返回实际等待的秒数"""
+        now = time.monotonic()
+        waited = 0.0
+        interval = self.interval
+        if interval and self._last_frame:
+            remaining = interval - (now - self._last_frame)
+            if remaining > 0:
+                time.sleep(remaining)
+                waited = remaining
+                now = time.monotonic()
+        if self._last_frame:
+            self._phase_seconds[self.phase] = self._phase_seconds.get(self.phase, 0.0) + now - self._last_frame
+        self._phase_frames[self.phase] = self._phase_frames.get(self.phase, 0) + 1
+        self._last_frame = now
+        return waited
+
+    def stats(self) -> Dict[str, Any]:
+        """当前状态和各阶段统计"""
+        return {
+            'phase': self.phase,
+            'target_fps': self.target_fps(),
+            'effective_fps': 1.0 / self.interval if self.interval else 0.0,
+            'backoff': self.multiplier,
+            'inference_ms': self.inference_time * 1000,
+            'backoff_events': self._backoff_events,
+            'phase_changes': self._phase_changes,
+            'phase_frames': dict(self._phase_frames),
+            'phase_fps': {phase: self._phase_frames.get(phase, 0) / seconds
+                          for phase, seconds in self._phase_seconds.items() if seconds > 0},
+        }
+
+    def summary(self) -> str:
+        """一行文字的统计，用于日志"""
+        s = self.stats()
+        phases = ', '.join(f'{phase} {frames}帧/{s["phase_fps"].get(phase, 0):.1f}FPS'
+                           for phase, frames in s['phase_frames'].items())
+        return (f'{phases}; 推理 {s["inference_ms"]:.1f}ms, 降频 {s["backoff_events"]} 次, '
+                f'当前 {s["phase"]} {s["effective_fps"]:.1f}FPS')
+
+    def reset(self):
+        """清空统计（新的一局）"""
+        self.phase = 'default'
+        self.multiplier = 1.0
+        self._last_frame = 0.0
+        self._phase_frames.clear()
+        self._phase_seconds.clear()
+        self._backoff_events = 0
+        self._phase_changes = 0
+
+
+if __name__ == '__main__':
+    # 模拟一局：打怪 -> 捡材料 -> 走向门口 -> 结算，打怪阶段推理偶尔变慢
+    governor = FrameRateGovernor({'attack': 20, 'pickup': 10, 'next_room': 6, 'settlement': 3}, default_fps=10)
+    plan = [('attack', 1.0, 0.03), ('attack', 0.5, 0.07), ('pickup', 0.6, 0.03),
+            ('next_room', 0.8, 0.03), ('settlement', 1.0, 0.03)]
+    for phase, duration, infer_s in plan:
+        governor.set_phase(phase)
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            governor.wait()
+            time.sleep(infer_s)
+            governor.record_inference(infer_s)
+    print(governor.summary())
@@ -0,0 +1,268 @@
+# -*- coding:utf-8 -*-
+"""
+流水线模块 - 截图 -> 推理/分析 -> 决策/按键 分阶段在各自线程上运行
+
+阶段之间用只保留最新一项的单槽队列连接：下游处理不过来时旧的结果直接丢弃，
+决策阶段按键时的 sleep 不会拖慢截图和推理，拿到的始终是最新的检测结果。
+每个阶段记录处理耗时、产出数和丢弃数，便于对比流水线前后的效果。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StageStats:
+    """单个阶段的耗时统计（最近 window 次）"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.count = 0  # 处理次数
+        self.dropped = 0  # 没被下游取走就被新结果覆盖的次数
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.count += 1
+
+    def record_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        """{'count', 'dropped', 'mean_ms', 'p50_ms', 'p99_ms'}"""
+        with self._lock:
+            values = sorted(self._latencies)
+            count, dropped = self.count, self.dropped
+        if not values:
+            return {'count': count, 'dropped': dropped, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0}
+        return {
+            'count': count,
+            'dropped': dropped,
+            'mean_ms': sum(values) / len(values) * 1000,
+            'p50_ms': values[len(values) // 2] * 1000,
+            'p99_ms': values[min(len(values) - 1, int(len(values) * 0.99))] * 1000,
+        }
+
+    def summary(self) -> str:
+        s = self.snapshot()
+        return (f"{s['count']}次 均值{s['mean_ms']:.1f}ms p50 {s['p50_ms']:.1f}ms p99 {s['p99_ms']:.1f}ms "
+                f"丢弃{s['dropped']}")
+
+
+class LatestSlot:
+    """
+    只保留最新一项的单槽队列
+
+    put() 直接覆盖没被取走的旧项（旧项交给 on_drop 处理，比如释放帧引用），
+    get_latest() 用序号保证同一项不会被重复取走。用法与 CaptureThread.get_latest 一致。
+    """
+
+    def __init__(self, on_drop: Optional[Callable[[Any], None]] = None, stats: Optional[StageStats] = None):
+        """
+        Args:
+            on_drop: 旧项被覆盖或队列关闭时的回调
+            stats: 记录丢弃次数的统计对象
+        """
+        self.on_drop = on_drop
+        self.stats = stats
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = -1
+        self._taken = True
+        self._closed = False
+        self._finished = False
+
+    def put(self, item: Any) -> int:
+        """放入一项，返回它的序号"""
+        with self._cond:
+            if self._closed:
+                dropped = item
+                seq = self._seq
+            else:
+                dropped = None if self._taken else self._item
+                self._item = item
+                self._seq += 1
+                self._taken = False
+                seq = self._seq
+                self._cond.notify_all()
+        if dropped is not None:
+            if self.stats is not None and dropped is not item:
+                self.stats.record_drop()
+            if self.on_drop is not None:
+                self.on_drop(dropped)
+        return seq
+
+    def get_latest(self, after_seq: int = -1, timeout: Optional[float] = None):
+        """
+        取最新一项
+
+        Args:
+            after_seq: 只返回序号大于它的项
+            timeout: 等待的超时时间（秒），None 表示一直等待
+
+        Returns:
+            (序号, 项)；超时或队列已关闭返回 (after_seq, None)
+
+        Raises:
+            StopIteration: 上游已结束（回放结束）
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._taken or self._seq <= after_seq:
+                if self._finished:
+                    raise StopIteration("上游阶段已结束")
+                if self._closed:
+                    return after_seq, None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return after_seq, None
+                self._cond.wait(remaining)
+            self._taken = True
+            return self._seq, self._item
+
+    def finish(self):
+        """上游结束，之后的 get_latest 抛出 StopIteration"""
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    def close(self):
+        """关闭队列，丢弃没被取走的项"""
+        with self._cond:
+            self._closed = True
+            dropped = None if self._taken else self._item
+            self._item = None
+            self._taken = True
+            self._cond.notify_all()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+
+class PipelineStage(threading.Thread):
+    """
+    流水线的一个阶段：循环从上游取一项 -> work(item) -> 放入 output
+
+    Args:
+        name: 阶段名（线程名、日志）
+        source: 取上游项的函数，参数为超时秒数，没有新项时返回None，上游结束时抛出 StopIteration
+        work: 处理函数，返回None表示本项没有产出
+        output: 下游队列
+        on_skip: work 返回None或抛出异常时对输入项的回调（比如释放帧引用）
+    """
+
+    def __init__(self, name: str, source: Callable[[float], Any], work: Callable[[Any], Any],
+                 output: LatestSlot, on_skip: Optional[Callable[[Any], None]] = None):
+        super().__init__(name=name, daemon=True)
+        self.source = source
+        self.work = work
+        self.output = output
+        self.on_skip = on_skip
+        self.stats = StageStats()
+        if output.stats is None:
+            output.stats = self.stats
+        self._stop_event = threading.Event()
+        self.error: Optional[BaseException] = None
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                item = self.source(0.2)
+            except StopIteration:
+                self.output.finish()
+                return
+            if item is None or self._stop_event.is_set():
+                if item is not None and self.on_skip is not None:
+                    self.on_skip(item)
+                continue
+            start = time.perf_counter()
+            try:
+                out = self.work(item)
+            except StopIteration:
+                if self.on_skip is not None:
+                    self.on_skip(item)
+                self.output.finish()
+                return
+            except Exception as e:
+                # 单帧出错不退出线程，下游照常等待下一项
+                logger.error(f"{self.name} 处理出错: {e}")
+                self.error = e
+                if self.on_skip is not None:
+                    self.on_skip(item)
+                continue
+            self.stats.record(time.perf_counter() - start)
+            if out is None:
+                if self.on_skip is not None:
+                    self.on_skip(item)
+                continue
+            self.output.put(out)
+
+    def stop(self, timeout: float = 2.0):
+        """停止线程并清空下游队列，可重复调用"""
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        self.output.close()
+
+
+if __name__ == '__main__':
+    # 模拟一局：截图 8ms，推理 30ms，决策后按键 sleep 0.1 秒
+    # 对比串行执行和流水线执行时每秒的决策次数、决策时检测结果距截图的时间，以及推理的帧率
+    grab_s, infer_s, act_s, duration = 0.008, 0.03, 0.1, 3.0
+
+    def grab():
+        time.sleep(grab_s)
+        return time.monotonic()
+
+    def infer(captured_at):
+        time.sleep(infer_s)
+        return captured_at
+
+    ages, inferred = [], 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        captured = infer(grab())
+        inferred += 1
+        ages.append(time.monotonic() - captured)
+        time.sleep(act_s)
+    print(f'串行: 决策 {len(ages) / duration:.1f}次/秒, 推理 {inferred / duration:.1f}FPS, '
+          f'决策时结果的延迟 均值 {sum(ages) / len(ages) * 1000:.0f}ms')
+
+    frames = LatestSlot()
+    detections = LatestSlot()
+    stop = threading.Event()
+
+    def capture_loop():
+        while not stop.is_set():
+            frames.put(grab())
+
+    capturer = threading.Thread(target=capture_loop, daemon=True)
+    capturer.start()
+    last = {'seq': -1}
+
+    def next_frame(timeout):
+        last['seq'], item = frames.get_latest(last['seq'], timeout)
+        return item
+
+    stage = PipelineStage('infer', next_frame, infer, detections)
+    stage.start()
+    ages, seq = [], -1
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        seq, captured = detections.get_latest(seq, timeout=1.0)
+        if captured is None:
+            continue
+        ages.append(time.monotonic() - captured)
+        time.sleep(act_s)
+    stop.set()
+    stage.stop()
+    print(f'流水线: 决策 {len(ages) / duration:.1f}次/秒, 推理 {stage.stats.count / duration:.1f}FPS, 决策时结果的延迟 均值 {sum(ages) / len(ages) * 1000:.0f}ms, '
+          f'推理阶段 {stage.stats.summary()}')
@@ -0,0 +1,125 @@
+# -*- coding:utf-8 -*-
+"""
+区域截图模块 - 只截取命名的小区域（小地图、技能栏、疲劳值），每个区域按各自的频率刷新
+
+小区域不需要整窗截图：BitBlt 只拷贝区域内的像素，dxcam 模式下从后台截图线程的最新帧裁剪，
+轮询小地图、技能栏时不必再付出整帧截图的开销，也可以比 YOLO 循环更频繁。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+Region = Tuple[int, int, int, int]  # (x, y, width, height)，相对窗口客户区
+
+
+class _RegionState:
+    __slots__ = ('region', 'interval', 'img', 'timestamp')
+
+    def __init__(self, region: Region, interval: float):
+        self.region = region
+        self.interval = interval
+        self.img: Optional[np.ndarray] = None
+        self.timestamp = 0.0
+
+
+class RegionCapture:
+    """
+    多区域、多频率截图
+
+    Example:
+        regions = RegionCapture(capturer)
+        regions.add('minimap', (capturer.width - 200, 0, 200, 200), fps=10)
+        crop = regions.get('minimap')   # 距上次截取不足 1/fps 秒时返回缓存
+        crop = regions.grab('minimap')  # 强制重新截取
+    """
+
+    def __init__(self, source):
+        """
+        Args:
+            source: 帧来源，优先使用 capture_region()，没有时从整帧 capture() 中裁剪
+        """
+        self.source = source
+        self._regions: Dict[str, _RegionState] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, region: Region, fps: float = 0.0):
+        """
+        注册区域
+
+        Args:
+            name: 区域名
+            region: (x, y, width, height)
+            fps: 刷新频率，0 表示每次 get() 都重新截取
+        """
+        with self._lock:
+            self._regions[name] = _RegionState(tuple(region), 1.0 / fps if fps else 0.0)
+
+    def region(self, name: str) -> Region:
+        return self._regions[name].region
+
+    def origin(self, name: str) -> Tuple[int, int]:
+        """区域左上角在窗口中的坐标"""
+        return self._regions[name].region[:2]
+
+    def grab(self, name: str) -> np.ndarray:
+        """立即截取区域并更新缓存"""
+        state = self._regions[name]
+        img = self._capture(state.region)
+        with self._lock:
+            if img is None:
+                # 截图失败时沿用上一次的结果
+                if state.img is None:
+                    raise Exception(f"区域'{name}'截图失败")
+                return state.img
+            state.img = img
+            state.timestamp = time.monotonic()
+            return img
+
+    def get(self, name: str) -> np.ndarray:
+        """按区域的刷新频率返回截图，未到刷新时间时返回缓存"""
+        state = self._regions[name]
+        with self._lock:
+            if state.img is not None and time.monotonic() - state.timestamp < state.interval:
+                return state.img
+        return self.grab(name)
+
+    def age(self, name: str) -> float:
+        """缓存的截图距今多少秒，没有缓存时为无穷大"""
+        state = self._regions[name]
+        return time.monotonic() - state.timestamp if state.img is not None else float('inf')
+
+    def invalidate(self, name: Optional[str] = None):
+        """清除缓存（切换房间/地图后调用）"""
+        with self._lock:
+            for key, state in self._regions.items():
+                if name is None or key == name:
+                    state.img = None
+
+    def _capture(self, region: Region) -> Optional[np.ndarray]:
+        x, y, w, h = region
+        if hasattr(self.source, 'capture_region'):
+            return self.source.capture_region(x, y, w, h)
+        return self.source.capture()[y:y + h, x:x + w].copy()
+
+
+if __name__ == '__main__':
+    # 用 BGRA -> BGR 拷贝近似 BitBlt 取位图数据的开销，对比整帧与各区域
+    rois = {'minimap': (867, 0, 200, 200), 'skill_bar': (434, 534, 214, 59), 'fatigue': (842, 592, 15, 5)}
+    n = 200
+
+    def _bench(w, h):
+        bgra = np.random.randint(0, 255, (h, w, 4), dtype=np.uint8)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            _ = bgra[..., :3].copy()
+        return (time.perf_counter() - t0) / n * 1000
+
+    print(f'整帧 1067x600: {_bench(1067, 600):.3f}ms')
+    for name, (_, _, w, h) in rois.items():
+        print(f'{name} {w}x{h}: {_bench(w, h):.3f}ms')
@@ -0,0 +1,261 @@
+# -*- coding:utf-8 -*-
+"""
+会话录制模块 - 将原始帧和检测结果写入预分配的内存映射环形文件
+
+录制过程不做任何图像编码，每帧只是一次内存拷贝，可以常驻在打怪循环中，
+保留最近 N 帧，在卡住/死亡时再把环形文件导出到磁盘用于回放分析。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Tuple, List, Any
+
+import numpy as np
+
+# 录制文件
+META_FILE = 'meta.json'
+FRAMES_FILE = 'frames.bin'
+INDEX_FILE = 'index.bin'
+BOXES_FILE = 'boxes.bin'
+
+# 每帧的索引记录，seq为-1表示该槽位无效
+INDEX_DTYPE = np.dtype([
+    ('seq', '<i8'),
+    ('timestamp', '<f8'),
+    ('room_row', '<i2'),
+    ('room_col', '<i2'),
+    ('num_boxes', '<i2'),
+    ('hero_height', '<i2'),
+])
+
+# 每个检测框: x1, y1, x2, y2, conf, cls（与 results[0].boxes.data 布局一致）
+BOX_FIELDS = 6
+
+
+class SessionRecorder:
+    """
+    内存映射环形录制器
+
+    Args:
+        record_dir: 环形文件所在目录
+        width: 帧宽度
+        height: 帧高度
+        capacity: 环形槽位数（保留的帧数）
+        max_boxes: 每帧最多保存的检测框数量
+    """
+
+    def __init__(self, record_dir: str, width: int = 1067, height: int = 600,
+                 capacity: int = 600, max_boxes: int = 64):
+        os.makedirs(record_dir, exist_ok=True)
+        self.record_dir = record_dir
+        self.width = width
+        self.height = height
+        self.capacity = capacity
+        self.max_boxes = max_boxes
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+        with open(os.path.join(record_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'width': width,
+                'height': height,
+                'capacity': capacity,
+                'max_boxes': max_boxes,
+            }, f)
+
+        # 预分配文件，mode='w+' 会创建完整大小的文件
+        self._frames = np.memmap(os.path.join(record_dir, FRAMES_FILE), dtype=np.uint8, mode='w+',
+                                 shape=(capacity, height, width, 3))
+        self._index = np.memmap(os.path.join(record_dir, INDEX_FILE), dtype=INDEX_DTYPE, mode='w+',
+                                shape=(capacity,))
+        self._boxes = np.memmap(os.path.join(record_dir, BOXES_FILE), dtype=np.float32, mode='w+',
+                                shape=(capacity, max_boxes, BOX_FIELDS))
+        self._index['seq'] = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    @property
+    def frame_count(self) -> int:
+        """已录制的总帧数"""
+        return self._seq
+
+    def record(self, img: np.ndarray, boxes: Any = None, room: Optional[Tuple[int, int]] = None,
+               hero_height: int = 0, timestamp: Optional[float] = None) -> int:
+        """
+        录制一帧
+
+        Args:
+            img: BGR 图像，尺寸需与录制器一致
+            boxes: 检测框 (N, 6)，支持 torch.Tensor 或 np.ndarray
+            room: 当前房间 (row, col)
+            hero_height: 角色高度偏移，回放时用于还原 DetResult
+            timestamp: 时间戳，默认当前时间
+
+        Returns:
+            帧序号，录制器已关闭或尺寸不符时返回-1
+        """
+        if self._closed or img is None or img.shape[:2] != (self.height, self.width):
+            return -1
+
+        if boxes is not None and hasattr(boxes, 'cpu'):
+            boxes = boxes.cpu().numpy()
+
+        with self._lock:
+            seq = self._seq
+            slot = seq % self.capacity
+            entry = self._index[slot]
+            # 先标记无效，写完再写入seq，导出时不会读到写了一半的帧
+            entry['seq'] = -1
+            np.copyto(self._frames[slot], img[..., :3])
+
+            num_boxes = 0
+            if boxes is not None and len(boxes):
+                num_boxes = min(len(boxes), self.max_boxes)
+                self._boxes[slot, :num_boxes] = boxes[:num_boxes, :BOX_FIELDS]
+
+            entry['timestamp'] = time.time() if timestamp is None else timestamp
+            entry['room_row'], entry['room_col'] = room if room else (-1, -1)
+            entry['num_boxes'] = num_boxes
+            entry['hero_height'] = hero_height
+            entry['seq'] = seq
+            self._seq = seq + 1
+        return seq
+
+    def dump(self, reason: str = '', dump_root: Optional[str] = None) -> Optional[str]:
+        """
+        导出当前环形文件，可以直接用 ReplayFrameSource 回放
+
+        Args:
+            reason: 导出原因，会拼到目录名中
+            dump_root: 导出根目录，默认为录制目录的上级目录
+
+        Returns:
+            导出目录，失败返回None
+        """
+        if self._closed:
+            return None
+        dump_root = dump_root or os.path.dirname(os.path.abspath(self.record_dir))
+        name = f'dump_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+        if reason:
+            name = f'{name}_{reason}'
+        dump_dir = os.path.join(dump_root, name)
+        os.makedirs(dump_dir, exist_ok=True)
+
+        with self._lock:
+            self._frames.flush()
+            self._boxes.flush()
+            index = np.array(self._index)
+            seq_start = self._seq
+
+        # 拷贝大文件时不加锁，录制继续进行
+        shutil.copyfile(os.path.join(self.record_dir, FRAMES_FILE), os.path.join(dump_dir, FRAMES_FILE))
+        shutil.copyfile(os.path.join(self.record_dir, BOXES_FILE), os.path.join(dump_dir, BOXES_FILE))
+        shutil.copyfile(os.path.join(self.record_dir, META_FILE), os.path.join(dump_dir, META_FILE))
+
+        # 拷贝期间被覆盖的槽位，帧内容和索引对不上，标记为无效
+        with self._lock:
+            seq_end = self._seq
+        for seq in range(seq_start, min(seq_end, seq_start + self.capacity)):
+            index[seq % self.capacity]['seq'] = -1
+        index.tofile(os.path.join(dump_dir, INDEX_FILE))
+        return dump_dir
+
+    def close(self):
+        """刷盘并释放内存映射，可重复调用"""
+        if self._closed:
+            return
+        with self._lock:
+            self._closed = True
+            for mm in (self._frames, self._index, self._boxes):
+                try:
+                    mm.flush()
+                except Exception:
+                    pass
+            self._frames = self._index = self._boxes = None
+
+
+class RecordingReader:
+    """读取 SessionRecorder 的录制目录（环形文件或导出目录），按帧序号排序"""
+
+    def __init__(self, record_dir: str):
+        with open(os.path.join(record_dir, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.width = meta['width']
+        self.height = meta['height']
+        capacity = meta['capacity']
+        max_boxes = meta['max_boxes']
+
+        self._frames = np.memmap(os.path.join(record_dir, FRAMES_FILE), dtype=np.uint8, mode='r',
+                                 shape=(capacity, self.height, self.width, 3))
+        self._index = np.fromfile(os.path.join(record_dir, INDEX_FILE), dtype=INDEX_DTYPE, count=capacity)
+        self._boxes = np.memmap(os.path.join(record_dir, BOXES_FILE), dtype=np.float32, mode='r',
+                                shape=(capacity, max_boxes, BOX_FIELDS))
+
+        valid = np.flatnonzero(self._index['seq'] >= 0)
+        self._slots: List[int] = valid[np.argsort(self._index['seq'][valid])].tolist()
+
+    def __len__(self):
+        return len(self._slots)
+
+    @staticmethod
+    def is_recording(record_dir: str) -> bool:
+        """目录是否为录制目录"""
+        return os.path.exists(os.path.join(record_dir, META_FILE)) and \
+            os.path.exists(os.path.join(record_dir, FRAMES_FILE))
+
+    def timestamp(self, i: int) -> float:
+        return float(self._index[self._slots[i]]['timestamp'])
+
+    def frame(self, i: int) -> np.ndarray:
+        """第i帧（只读内存映射视图）"""
+        return self._frames[self._slots[i]]
+
+    def entry(self, i: int) -> Tuple[int, float, Tuple[int, int], np.ndarray, int]:
+        """
+        第i帧的索引信息
+
+        Returns:
+            (seq, timestamp, room, boxes(N,6), hero_height)
+        """
+        slot = self._slots[i]
+        e = self._index[slot]
+        boxes = np.array(self._boxes[slot, :e['num_boxes']])
+        return int(e['seq']), float(e['timestamp']), (int(e['room_row']), int(e['room_col'])), \
+            boxes, int(e['hero_height'])
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    # 测量录制一帧的耗时
+    with tempfile.TemporaryDirectory() as tmp:
+        frame = np.random.randint(0, 255, (600, 1067, 3), dtype=np.uint8)
+        dets = np.random.rand(40, 6).astype(np.float32)
+        with SessionRecorder(os.path.join(tmp, 'live'), capacity=100) as recorder:
+            n = 300
+            t0 = time.perf_counter()
+            for _ in range(n):
+                recorder.record(frame, dets, (1, 2), 50)
+            elapsed = time.perf_counter() - t0
+            print(f'录制 {n} 帧，平均 {elapsed / n * 1000:.3f}ms/帧')
+
+            t0 = time.perf_counter()
+            out = recorder.dump('bench')
+            print(f'导出耗时 {time.perf_counter() - t0:.2f}s -> {out}')
+
+        reader = RecordingReader(out)
+        seq, ts, room, boxes, hh = reader.entry(len(reader) - 1)
+        print(f'导出 {len(reader)} 帧，最后一帧 seq={seq} room={room} boxes={len(boxes)}')
@@ -0,0 +1,70 @@
+# -*- coding:utf-8 -*-
+"""
+共享内存槽位环模块 - 多个进程通过 multiprocessing.shared_memory 读写同一组定长数组
+
+图像和检测框直接写进共享内存，进程之间只传递槽位号、序号这样的小元组，不需要序列化图像。
+"""
+
+__author__ = "723323692"
+__version__ = '1.0'
+
+from multiprocessing import shared_memory
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SharedArrayRing:
+    """
+    共享内存中的一组定长数组（槽位）
+
+    创建方负责 unlink()；其他进程用 attach(*ring.spec) 打开同一块内存。
+    槽位的分配和归还由调用方通过消息协调，这里只负责内存布局。
+
+    Args:
+        slots: 槽位数
+        shape: 每个槽位的数组形状
+        dtype: 数组类型
+        name: 共享内存名，None 时创建新的共享内存
+    """
+
+    def __init__(self, slots: int, shape: Sequence[int], dtype=np.uint8, name: Optional[str] = None):
+        self.slots = slots
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        nbytes = slots * int(np.prod(self.shape)) * self.dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray((slots, *self.shape), dtype=self.dtype, buffer=self._shm.buf)
+
+    @property
+    def spec(self) -> Tuple[int, Tuple[int, ...], str, str]:
+        """在其他进程打开这块内存所需的参数：(slots, shape, dtype, name)"""
+        return self.slots, self.shape, self.dtype.str, self._shm.name
+
+    @classmethod
+    def attach(cls, slots: int, shape: Sequence[int], dtype: str, name: str) -> 'SharedArrayRing':
+        return cls(slots, shape, dtype, name)
+
+    def __getitem__(self, slot: int) -> np.ndarray:
+        return self.array[slot]
+
+    def close(self):
+        """释放本进程的映射，可重复调用"""
+        if self.array is None:
+            return
+        self.array = None
+        self._shm.close()
+
+    def unlink(self):
+        """删除共享内存（只由创建方调用）"""
+        self.close()
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            self.owner = False
@@ -3,12 +3,23 @@
 __author__ = "723323692"
 __version__ = '1.0'
 
+import threading
+import time
+
 import numpy as np
-import pyautogui
-import win32con
-import win32gui
-import win32ui
-from ctypes import windll
+
+from utils.frame_ring import Frame, FrameRing
+
+# Windows 截图依赖，非 Windows 平台（如 Linux 上回放录制会话）可以缺失
+try:
+    import pyautogui
+    import win32con
+    import win32gui
+    import win32ui
+    from ctypes import windll
+    WIN32_AVAILABLE = True
+except ImportError:
+    WIN32_AVAILABLE = False
 
 # 尝试导入 dxcam（DX11/DX12 截图支持）
 try:
@@ -140,9 +151,13 @@ class WindowCapture:
     2. PrintWindow - Windows原生，支持DX窗口化
     3. BitBlt - 传统GDI截图，不支持DX硬件加速
     
-    支持上下文管理器协议
+    截图写入预分配的槽位环（默认3个槽位），最新帧和被持有的帧不会被覆盖，
+    capture() 返回的图像在下一次截图后仍然有效；需要跨线程持有时用 acquire()
+    取得帧引用，用完 release()。
+
+    支持上下文管理器协议，实现 utils.frame_source.FrameSource 协议
     """
-    def __init__(self, hwnd, use_printwindow=False, use_dxcam=True):
+    def __init__(self, hwnd, use_printwindow=False, use_dxcam=True, ring_slots=3, region_max_age=0.1):
         """
         初始化窗口截图
         
@@ -150,12 +165,19 @@ class WindowCapture:
             hwnd: 窗口句柄
             use_printwindow: 是否使用PrintWindow，默认False
             use_dxcam: 是否使用dxcam（DX11支持），默认True
+            ring_slots: 帧槽位数量，默认3
+            region_max_age: dxcam 模式下区域截图直接裁剪最新帧时，最新帧的最大时长（秒）
         """
         self.hwnd = hwnd
+        self.ring_slots = ring_slots
+        self._capture_lock = threading.RLock()
         self.use_printwindow = use_printwindow
         self.use_dxcam = use_dxcam and DXCAM_AVAILABLE
         self._released = False
         self._dxcam_camera = None
+        self._region_dcs = {}  # 区域截图的位图，按 (width, height) 缓存
+        self.region_max_age = region_max_age
+        self.last_timestamp = 0.0
         self._init_resources()
 
     def __enter__(self):
@@ -204,18 +226,88 @@ class WindowCapture:
         self.bitmap.CreateCompatibleBitmap(self.dc, self.width, self.height)
         self.mem_dc.SelectObject(self.bitmap)
 
-        # 预分配numpy数组内存
-        self.buffer = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        # 预分配帧槽位环
+        self.ring = FrameRing((self.height, self.width, 3), slots=self.ring_slots)
 
     def capture(self):
-        if self.use_dxcam and self._dxcam_camera:
-            return self._capture_dxcam()
-        elif self.use_printwindow:
-            return self._capture_printwindow()
-        else:
-            return self._capture_bitblt()
-    
-    def _capture_dxcam(self):
+        """
+        截图并发布为最新帧
+
+        Returns:
+            BGR 图像，下一次截图不会覆盖它
+        """
+        with self._capture_lock:
+            self.last_timestamp = time.monotonic()
+            slot = self.ring.acquire_write()
+            try:
+                if self.use_dxcam and self._dxcam_camera:
+                    img = self._capture_dxcam(slot)
+                elif self.use_printwindow:
+                    img = self._capture_printwindow(slot)
+                else:
+                    img = self._capture_bitblt(slot)
+            except BaseException:
+                self.ring.cancel(slot)
+                raise
+            return self.ring.publish(slot, img, self.last_timestamp)
+
+    def acquire(self) -> Frame:
+        """
+        截图并持有该帧，持有期间槽位不会被后续截图覆盖
+
+        Returns:
+            帧引用，用完调用 release()（可直接作为 Future 的完成回调）
+        """
+        with self._capture_lock:
+            self.capture()
+            return self.ring.acquire_latest()
+
+    def acquire_latest(self) -> Frame:
+        """持有最近一次截图的帧，还没有截过图时返回None"""
+        return self.ring.acquire_latest()
+
+    def capture_region(self, x, y, width, height):
+        """
+        只截取客户区内的一个区域，不写入帧槽位环
+
+        Args:
+            x, y: 区域左上角（相对客户区）
+            width, height: 区域尺寸
+
+        Returns:
+            BGR 图像（新数组）
+        """
+        with self._capture_lock:
+            if self.use_dxcam and self._dxcam_camera:
+                # 区域截图不调用 dxcam 的 grab：每次 grab 都会取走桌面复制的新画面，
+                # 紧接着的整帧 grab 拿不到新画面就只能退回 PrintWindow。
+                # 后台截图线程在运行时最新帧足够新，直接裁剪；否则截一次整帧再裁剪
+                latest = self.ring.acquire_latest()
+                if latest is not None:
+                    with latest:
+                        if time.monotonic() - latest.timestamp <= self.region_max_age:
+                            return latest.img[y:y + height, x:x + width].copy()
+                return self.capture()[y:y + height, x:x + width].copy()
+            if self.use_printwindow:
+                # PrintWindow 只能整窗渲染，截整帧后裁剪
+                return self.capture()[y:y + height, x:x + width].copy()
+            return self._capture_region_bitblt(x, y, width, height)
+
+    def _capture_region_bitblt(self, x, y, width, height):
+        """BitBlt 只拷贝区域内的像素"""
+        key = (width, height)
+        if key not in self._region_dcs:
+            mem_dc = self.dc.CreateCompatibleDC()
+            bitmap = win32ui.CreateBitmap()
+            bitmap.CreateCompatibleBitmap(self.dc, width, height)
+            mem_dc.SelectObject(bitmap)
+            self._region_dcs[key] = (mem_dc, bitmap)
+        mem_dc, bitmap = self._region_dcs[key]
+        mem_dc.BitBlt((0, 0), (width, height), self.dc, (x, y), win32con.SRCCOPY)
+        bits = bitmap.GetBitmapBits(True)
+        return np.frombuffer(bits, dtype=np.uint8).reshape((height, width, 4))[..., :3].copy()
+
+    def _capture_dxcam(self, slot):
         """使用 dxcam 截图，支持 DX11/DX12"""
         try:
             # 使用预计算的region，避免每帧重复计算
@@ -228,16 +320,16 @@ class WindowCapture:
                 )
             frame = self._dxcam_camera.grab(region=self._dxcam_region)
             if frame is not None:
-                np.copyto(self.buffer, frame)
-                return self.buffer
+                # grab 每次返回新数组且已是 BGR，直接放入槽位，无需拷贝
+                return frame
             else:
                 # dxcam 返回 None，回退到其他方式
-                return self._capture_printwindow()
+                return self._capture_printwindow(slot)
         except Exception as e:
             print(f"[WindowCapture] dxcam 截图失败: {e}")
-            return self._capture_printwindow()
+            return self._capture_printwindow(slot)
 
-    def _capture_printwindow(self):
+    def _capture_printwindow(self, slot):
         """使用 PrintWindow 截图，支持 DX11 窗口化模式"""
         # PW_CLIENTONLY (1) 只截取客户区，不包含标题栏和边框
         # PW_RENDERFULLCONTENT (2) 可以捕获 DX 渲染内容 (Win8.1+)
@@ -258,16 +350,18 @@ class WindowCapture:
         
         if result == 0:
             # 都失败了，回退到 BitBlt
-            return self._capture_bitblt()
+            return self._capture_bitblt(slot)
 
         # 获取位图数据
         bits = self.bitmap.GetBitmapBits(True)
         img = np.frombuffer(bits, dtype=np.uint8).reshape(
             (self.height, self.width, 4))[..., :3]
-        np.copyto(self.buffer, img)
-        return self.buffer
+        # BGRA -> BGR 需要一次拷贝，写入槽位的预分配缓冲区
+        buffer = self.ring.buffer(slot)
+        np.copyto(buffer, img)
+        return buffer
 
-    def _capture_bitblt(self):
+    def _capture_bitblt(self, slot):
         """传统 BitBlt 截图"""
         self.mem_dc.BitBlt((0, 0), (self.width, self.height),
                            self.dc, (0, 0), win32con.SRCCOPY)
@@ -275,8 +369,10 @@ class WindowCapture:
         bits = self.bitmap.GetBitmapBits(True)
         img = np.frombuffer(bits, dtype=np.uint8).reshape(
             (self.height, self.width, 4))[..., :3]
-        np.copyto(self.buffer, img)
-        return self.buffer
+        # BGRA -> BGR 需要一次拷贝，写入槽位的预分配缓冲区
+        buffer = self.ring.buffer(slot)
+        np.copyto(buffer, img)
+        return buffer
 
     def release(self):
         """释放资源，可重复调用"""
@@ -292,6 +388,13 @@ class WindowCapture:
                 self._dxcam_camera = None
             
             # 释放 GDI 资源
+            for mem_dc, bitmap in self._region_dcs.values():
+                try:
+                    win32gui.DeleteObject(bitmap.GetHandle())
+                    mem_dc.DeleteDC()
+                except:
+                    pass
+            self._region_dcs.clear()
             try:
                 win32gui.DeleteObject(self.bitmap.GetHandle())
             except: